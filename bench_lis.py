@@ -0,0 +1,736 @@
+# Micro-benchmarks for the lis6.py data layer.
+# Usage: python bench_lis.py [name ...]   (no names = run everything)
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import lis6
+from fake_printer import LoopbackPrinter
+from test_code128 import decode_code128, random_barcodes
+from test_scan_detector import key_stream
+
+# === Config ===
+N_OPS = 10_000
+N_TEST_ROWS = 1_000_000       # synthetic tests table size for index benchmarks
+N_PATIENTS = 50_000
+N_LABELS = 200                # stickers per label-rendering benchmark
+N_VERIFY = 100_000            # random barcodes decoded by the code128 check
+N_LEGACY_ROWS = 2_000_000     # synthetic lab_info.db size for the migration benchmark
+N_SEARCH_PATIENTS = 500_000   # patients table size for the search benchmark
+
+
+# ===== HELPERS =====
+def fresh_db(tmpdir, name="bench.db"):
+    lis6.close_conn()
+    lis6.DB_PATH = os.path.join(tmpdir, name)
+    lis6.init_db()
+    return lis6.DB_PATH
+
+def report(label, n, seconds):
+    print(f"{label:<40} {n:>9,} ops  {seconds * 1e6 / n:9.1f} us/op  {n / seconds:12,.0f} ops/s")
+
+def timed(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return time.perf_counter() - t0
+
+# Connect-per-call helpers as they were before the shared connection layer.
+def legacy_get_patient(barcode_data):
+    conn = sqlite3.connect(lis6.DB_PATH)
+    cur = conn.cursor()
+    cur.execute("SELECT barcode_data, ward, name, ic_number FROM patients WHERE barcode_data=?", (barcode_data,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def legacy_add_test(barcode_data, test_name, test_date, result, price_snapshot):
+    conn = sqlite3.connect(lis6.DB_PATH)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO tests (barcode_data, test_name, test_date, result, price)
+        VALUES (?,?,?,?,?)
+    """, (barcode_data, test_name, test_date, result, price_snapshot))
+    conn.commit()
+    conn.close()
+
+
+# ===== BENCHMARKS =====
+def bench_connection(tmpdir):
+    """Per-call latency of connect-per-call vs the pooled per-thread connection."""
+    fresh_db(tmpdir, "legacy.db")
+    lis6.close_conn()
+    # Legacy path runs against a rollback-journal DB, as the old init_db created it.
+    conn = sqlite3.connect(lis6.DB_PATH)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.execute("INSERT INTO patients (barcode_data, ward, name, ic_number) VALUES ('B1', 'W1', 'NAME', 'IC')")
+    conn.commit()
+    conn.close()
+    report("get_patient (connect per call)", N_OPS, timed(lambda i: legacy_get_patient("B1"), N_OPS))
+    report("add_test (connect per call)", N_OPS,
+           timed(lambda i: legacy_add_test("B1", "GSH", "2025-01-01", "", 1.0), N_OPS))
+
+    fresh_db(tmpdir, "pooled.db")
+    lis6.upsert_patient("B1", "W1", "NAME", "IC")
+    report("get_patient (pooled)", N_OPS, timed(lambda i: lis6.get_patient("B1"), N_OPS))
+    report("add_test (pooled)", N_OPS,
+           timed(lambda i: lis6.add_test("B1", "GSH", "2025-01-01", "", 1.0), N_OPS))
+
+def fill_tests(n_rows=N_TEST_ROWS, n_patients=N_PATIENTS):
+    """Bulk-load a synthetic patients/tests history into the current DB_PATH."""
+    import random
+    rnd = random.Random(42)
+    conn = lis6.get_conn()
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO patients (barcode_data, ward, name, ic_number) "
+                         "VALUES (?, ?, ?, ?)",
+                         ((f"B{p:07d}", f"Ward {p % 20}", f"PATIENT {p}", f"IC{p:012d}")
+                          for p in range(n_patients)))
+        conn.executemany("""
+            INSERT INTO tests (barcode_data, test_name, test_date, result, price)
+            VALUES (?,?,?,?,?)
+        """, ((f"B{rnd.randrange(n_patients):07d}", rnd.choice(lis6.TEST_CHOICES),
+               f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", "", 10.0)
+              for _ in range(n_rows)))
+
+def bench_tests_index(tmpdir):
+    """list_tests() latency on a 1M-row tests table with and without the covering index."""
+    fresh_db(tmpdir)
+    fill_tests()
+    conn = lis6.get_conn()
+    barcodes = [f"B{p:07d}" for p in range(0, N_PATIENTS, N_PATIENTS // 200)]
+    sql = "SELECT id, test_name, test_date, result, price FROM tests WHERE barcode_data=? ORDER BY test_date DESC, id DESC"
+
+    def show_plan(label):
+        # Separate connection: the pooled one caches the EXPLAIN statement across the DROP.
+        plan_conn = sqlite3.connect(lis6.DB_PATH)
+        plan = plan_conn.execute("EXPLAIN QUERY PLAN " + sql, ("B0000000",)).fetchall()
+        plan_conn.close()
+        print(f"  plan ({label}): " + "; ".join(r[-1] for r in plan))
+
+    show_plan("indexed")
+    report("list_tests (indexed)", len(barcodes),
+           timed(lambda i: lis6.list_tests(barcodes[i]), len(barcodes)))
+
+    with conn:
+        conn.execute("DROP INDEX idx_tests_barcode_date")
+        conn.execute("DROP INDEX idx_tests_date_report")
+    show_plan("no indexes")
+    report("list_tests (no indexes)", 20, timed(lambda i: lis6.list_tests(barcodes[i]), 20))
+
+def bench_dpl(tmpdir):
+    """Per-sticker generation time: DPL command stream vs the DOCX document."""
+    import io
+    rec = ("508020005", "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354")
+
+    def docx_label(i):
+        buf = io.BytesIO()
+        lis6.build_sticker_doc([rec]).save(buf)
+        return buf.getvalue()
+
+    print(f"  docx: {len(docx_label(0)):,} bytes/label   dpl: {len(lis6.build_sticker_dpl(*rec)):,} bytes/label")
+    report("DOCX sticker (build + save)", N_LABELS, timed(docx_label, N_LABELS))
+    report("DPL sticker", N_OPS, timed(lambda i: lis6.build_sticker_dpl(*rec), N_OPS))
+
+def bench_docx_template(tmpdir):
+    """1,000 DOCX stickers: python-docx build per label vs the compiled template."""
+    import io
+    n = 1000
+    records = [(f"5{i:08d}", f"Ward {i % 20}", f"PATIENT {i}", f"IC{i:012d}") for i in range(n)]
+
+    def docx_label(i):
+        buf = io.BytesIO()
+        lis6.build_sticker_doc([records[i]]).save(buf)
+        return buf.getvalue()
+
+    lis6.clear_sticker_cache()
+    report("DOCX sticker, python-docx per label", n, timed(docx_label, n))
+    lis6.clear_sticker_cache()
+    t0 = time.perf_counter()
+    lis6.sticker_template()
+    print(f"  template compiled once in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    report("DOCX sticker, compiled template", n, timed(lambda i: lis6.build_sticker_docx([records[i]]), n))
+    report("DOCX sticker, template, reprint", n, timed(lambda i: lis6.build_sticker_docx([records[i]]), n))
+    report("DOCX stickers, template, 50 per job", n,
+           timed(lambda j: lis6.build_sticker_docx(records[j * 50:(j + 1) * 50]), n // 50))
+    print(f"  size: python-docx {len(docx_label(0)):,} bytes, template {len(lis6.build_sticker_docx(records[:1])):,} bytes")
+
+def bench_parallel_stickers(tmpdir):
+    """50 distinct stickers built in parallel threads (correctness: test_stickers.py)."""
+    from concurrent.futures import ThreadPoolExecutor
+    records = [(f"{500000000 + i}", "Ward 8", f"PATIENT {i}", f"IC{i}") for i in range(50)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda rec: lis6.build_sticker_doc([rec]), records))
+    report("DOCX sticker (8 threads)", len(records), time.perf_counter() - t0)
+
+def bench_code128(tmpdir):
+    """Direct Code128 rasterizer vs ImageWriter (correctness: test_code128.py)."""
+    from barcode import Code128
+    differ = upstream_wrong = 0
+    for data in random_barcodes(N_VERIFY):
+        reference = Code128(data).build()[0]
+        if lis6.code128_modules(data) != reference:
+            differ += 1
+            upstream_wrong += decode_code128(reference) != data
+    print(f"  module sequence differs from python-barcode on {differ:,} of {N_VERIFY:,} "
+          f"(python-barcode itself misencodes {upstream_wrong} of those)")
+
+    data = "508020005"
+    report("ImageWriter PNG + crop", N_LABELS, timed(lambda i: lis6.render_barcode_png(data), N_LABELS))
+    report("render_code128 (1-bit image)", N_OPS, timed(lambda i: lis6.render_code128(data), N_OPS))
+    report("barcode_png (1-bit PNG)", N_OPS, timed(lambda i: lis6.barcode_png(data), N_OPS))
+
+def bench_sticker_cache(tmpdir):
+    """Reprints: distinct barcodes (all misses) vs the same barcode again (all hits)."""
+    lis6.clear_sticker_cache()
+    rec = ("508020005", "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354")
+    report("barcode_png, new barcodes", N_OPS, timed(lambda i: lis6.barcode_png(f"5{i:08d}"), N_OPS))
+    report("barcode_png, reprint", N_OPS, timed(lambda i: lis6.barcode_png(rec[0]), N_OPS))
+    report("DPL sticker, new barcodes", N_OPS,
+           timed(lambda i: lis6.build_sticker_dpl(f"6{i:08d}", *rec[1:]), N_OPS))
+    report("DPL sticker, reprint", N_OPS, timed(lambda i: lis6.build_sticker_dpl(*rec), N_OPS))
+    for name, info in lis6.sticker_cache_info().items():
+        print(f"  {name}: {info}")
+
+def legacy_compose_label(barcode_data, ward, name, ic_number, dpi=300):
+    """barcodelabel4.compose_label_image()'s pipeline: RGBA canvas, ImageWriter
+    PNG, crop, LANCZOS resize, convert to RGB (PNG kept in memory, not a temp dir)."""
+    import io
+    from barcode import Code128
+    from barcode.writer import ImageWriter
+    from PIL import Image, ImageDraw
+    w, h = int(round(5.5 / 2.54 * dpi)), int(round(2.0 / 2.54 * dpi))
+    img = Image.new("RGBA", (w, h), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    raw = io.BytesIO()
+    Code128(barcode_data, writer=ImageWriter()).write(
+        raw, options={"write_text": False, "module_height": 50, "module_width": 0.25, "quiet_zone": 1})
+    raw.seek(0)
+    bimg = Image.open(raw).convert("L")
+    bw, bh = bimg.size
+    bimg = bimg.crop((0, 0, bw, bh // 2))
+    target_h = int(round(1.0 / 2.54 * dpi))
+    target_w = min(int(target_h * bw / (bh // 2)), int(w * 0.73))
+    bimg = bimg.resize((target_w, target_h), Image.LANCZOS)
+    img.paste(bimg.convert("RGBA"), ((w - target_w) // 2, 0))
+    y = target_h
+    for text, pt in ((f"{barcode_data} ({ward})", 10), (name, 8), (f"18/10 - 09:00 - IC: {ic_number}", 8)):
+        font = lis6.sticker_font(pt, dpi)
+        tw, th = draw.textbbox((0, 0), text, font=font)[2:]
+        draw.text(((w - tw) // 2, y), text, fill="black", font=font)
+        y += th
+    return img.convert("RGB")
+
+def bench_raster_sticker(tmpdir):
+    """1-bit printer-DPI sticker renderer vs the barcodelabel4 compositor: renders/sec."""
+    rec = ("508020005", "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354")
+    n = 1000
+    lis6.clear_sticker_cache()
+    report("barcodelabel4 compose (300 dpi RGB)", N_LABELS,
+           timed(lambda i: legacy_compose_label(f"5{i:08d}", *rec[1:]), N_LABELS))
+    for dpi in (203, 300):
+        report(f"render_sticker_image {dpi} dpi, new", n,
+               timed(lambda i: lis6.render_sticker_image(f"5{i:08d}", *rec[1:], dpi=dpi), n))
+        report(f"render_sticker_image {dpi} dpi, reprint", n,
+               timed(lambda i: lis6.render_sticker_image(*rec, dpi=dpi), n))
+    report("sticker_png 203 dpi (preview)", n, timed(lambda i: lis6.sticker_png(*rec), n))
+    print(f"  sizes: 203 dpi {lis6.render_sticker_image(*rec).size}, "
+          f"300 dpi {lis6.render_sticker_image(*rec, dpi=300).size}, preview PNG {len(lis6.sticker_png(*rec)):,} bytes")
+
+def bench_print_worker(tmpdir):
+    """500 jobs through PrintWorker against a fake printer (correctness: test_print_worker.py)."""
+    worker = lis6.PrintWorker(backend=lambda records: time.sleep(0.001))  # stand-in for spooling
+    t0 = time.perf_counter()
+    ids = [worker.submit([(f"B{i:05d}", "W", "N", "IC")]) for i in range(500)]
+    submit_s = time.perf_counter() - t0
+    worker.stop()
+    total_s = time.perf_counter() - t0
+    report("PrintWorker.submit (caller side)", len(ids), submit_s)
+    report("PrintWorker jobs printed", len(ids), total_s)
+
+def bench_transport(tmpdir):
+    """DPL stickers through print_stickers() to the loopback printer and a file sink."""
+    saved = lis6.STICKER_FORMAT, lis6.PRINTER_URI
+    lis6.STICKER_FORMAT = "dpl"
+    records = [(f"5{i:08d}", "Ward 8", f"PATIENT {i}", f"IC{i}") for i in range(N_LABELS)]
+    with LoopbackPrinter() as printer:
+        lis6.PRINTER_URI = printer.uri
+        t0 = time.perf_counter()
+        for rec in records:
+            lis6.print_stickers([rec])
+        printer.wait_for_labels(len(records))
+        report("tcp, one job per sticker", len(records), time.perf_counter() - t0)
+        print(f"  {printer.connections} connections, {len(printer.data):,} bytes recorded")
+
+    lis6.PRINTER_URI = "file:" + os.path.join(tmpdir, "spool.prn")
+    report("file sink, one job per sticker", len(records),
+           timed(lambda i: lis6.print_stickers([records[i]]), len(records)))
+    lis6.STICKER_FORMAT, lis6.PRINTER_URI = saved
+
+def bench_printer_session(tmpdir):
+    """Pipelined PrinterSession vs one connection per label, against the loopback printer."""
+    n = N_OPS
+    labels = [lis6.build_sticker_dpl(f"5{i:08d}", "Ward 8", f"PATIENT {i}", f"IC{i}") for i in range(n)]
+    with LoopbackPrinter() as printer:
+        transport = lis6.open_transport(printer.uri)
+        t0 = time.perf_counter()
+        for label in labels:
+            transport.send(label)
+        printer.wait_for_labels(n)
+        elapsed = time.perf_counter() - t0
+        report("connection per label", n, elapsed)
+        print(f"  {len(printer.data) / elapsed / 1e6:.2f} MB/s over {printer.connections:,} connections")
+
+    for max_bytes in (4 * 1024, 64 * 1024):
+        with LoopbackPrinter() as printer:
+            t0 = time.perf_counter()
+            with lis6.PrinterSession(printer.uri, max_bytes=max_bytes) as session:
+                for label in labels:
+                    session.add(label)
+            printer.wait_for_labels(n)
+            report(f"PrinterSession (flush at {max_bytes // 1024} KiB)", n, time.perf_counter() - t0)
+            m = session.metrics()
+            print(f"  {m['bytes_per_sec'] / 1e6:.2f} MB/s, {m['labels_per_sec']:,.0f} labels/s, "
+                  f"{m['flushes']} flushes over {printer.connections} connection(s)")
+
+def bench_tree_refresh(tmpdir):
+    """LISApp.refresh_tests for a patient with 5,000 tests: full rebuild vs windowed diff after one edit."""
+    import tkinter as tk
+    fresh_db(tmpdir)
+    lis6.upsert_patient("B1", "W1", "LONG STAY", "IC")
+    conn = lis6.get_conn()
+    with conn:
+        conn.executemany("INSERT INTO tests (barcode_data, test_name, test_date, result, price) VALUES (?,?,?,?,?)",
+                         (("B1", "GSH", f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "", 10.0) for i in range(5000)))
+    try:
+        app = lis6.LISApp()
+    except tk.TclError as e:
+        print(f"  skipped: no display ({e})")
+        return
+    app.withdraw()
+    app.e_barcode.insert(0, "B1")
+    tree = app.tests_tree
+
+    def full_rebuild(i):
+        # refresh_tests as it was: delete everything, reinsert everything
+        for row in tree.get_children():
+            tree.delete(row)
+        total = 0.0
+        for rid, name, date, result, price in lis6.list_tests("B1"):
+            total += float(price or 0.0)
+            tree.insert("", "end", values=(rid, name, date, result, f"{price:.2f}"))
+        app.total_label.configure(text=f"Total: RM {total:.2f}")
+        app.update_idletasks()
+
+    report("full rebuild, 5,000 rows", 5, timed(full_rebuild, 5))
+    tree.delete(*tree.get_children())
+    app.refresh_tests()
+    test_ids = [r[0] for r in lis6.list_tests("B1")]
+
+    def edit_and_refresh(i):
+        lis6.update_test(test_ids[i], "GXM", "2025-06-15", f"edit {i}", 12.5)
+        app.refresh_tests()
+        app.update_idletasks()
+
+    report("diff refresh after one edit", 50, timed(edit_and_refresh, 50))
+    print(f"  rows shown: {len(tree.get_children())}  {app.total_label.cget('text')}")
+    app.printer.stop()
+    app.destroy()
+
+def bench_tests_paging(tmpdir):
+    """Open time for a patient's test list: everything vs the first keyset page."""
+    fresh_db(tmpdir)
+    conn = lis6.get_conn()
+    for size in (1_000, 10_000, 100_000):
+        b = f"P{size}"
+        with conn:
+            conn.executemany("INSERT INTO tests (barcode_data, test_name, test_date, result, price) VALUES (?,?,?,?,?)",
+                             ((b, "GSH", f"20{i % 20 + 5:02d}-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "", 10.0)
+                              for i in range(size)))
+        report(f"list_tests, {size:,} tests", 20, timed(lambda i: lis6.list_tests(b), 20))
+        report(f"list_tests_page (first), {size:,} tests", 2_000, timed(lambda i: lis6.list_tests_page(b), 2_000))
+        rows = lis6.list_tests(b)
+        deep = rows[len(rows) // 2]
+        report(f"list_tests_page (middle), {size:,} tests", 2_000,
+               timed(lambda i: lis6.list_tests_page(b, after=(deep[2], deep[0])), 2_000))
+
+def bench_test_summary(tmpdir):
+    """Patient total: SUM over tests vs the trigger-maintained summary row."""
+    fresh_db(tmpdir)
+    fill_tests(200_000, 1_000)
+    conn = lis6.get_conn()
+    sum_sql = "SELECT COUNT(*), COALESCE(SUM(price), 0) FROM tests WHERE barcode_data=?"
+    report("SUM(price) over tests (~200 rows)", 2_000,
+           timed(lambda i: conn.execute(sum_sql, (f"B{i % 1000:07d}",)).fetchone(), 2_000))
+    report("test_totals (summary row)", N_OPS, timed(lambda i: lis6.test_totals(f"B{i % 1000:07d}"), N_OPS))
+    report("add_test incl. summary trigger", N_OPS,
+           timed(lambda i: lis6.add_test(f"B{i % 1000:07d}", "GSH", "2025-06-01", "", 5.0), N_OPS))
+    t0 = time.perf_counter()
+    bad = lis6.check_test_summary()
+    print(f"  check_test_summary over {conn.execute('SELECT COUNT(*) FROM tests').fetchone()[0]:,} tests: "
+          f"{len(bad)} mismatches in {time.perf_counter() - t0:.2f}s")
+
+def bench_import_patients(tmpdir):
+    """Bulk census import: 100k-row CSV (and a 20k-row XLSX if openpyxl is present)."""
+    import csv
+    fresh_db(tmpdir)
+    path = os.path.join(tmpdir, "census.csv")
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["Barcode", "Ward", "Name", "IC"])
+        for i in range(100_000):
+            w.writerow(["" if i % 10_000 == 0 else f"C{i:08d}", f"Ward {i % 20}", f"PATIENT {i}", f"{i:012d}"])
+    res = lis6.import_patients(path)
+    report("import_patients (CSV)", res["imported"], res["seconds"])
+    print(f"  rejected: {res['rejected']} -> {res['rejects_path']}")
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        print("  xlsx: skipped (openpyxl not installed)")
+        return
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["barcode", "ward", "name", "ic_number"])
+    for i in range(20_000):
+        ws.append([9_000_000_000 + i, f"Ward {i % 20}", f"PATIENT {i}", 870101_00_0000 + i])
+    xpath = os.path.join(tmpdir, "census.xlsx")
+    wb.save(xpath)
+    res = lis6.import_patients(xpath)
+    report("import_patients (XLSX)", res["imported"], res["seconds"])
+    print(f"  sample row: {lis6.get_patient('9000000007')}")
+
+def bench_bulk_order(tmpdir):
+    """Morning round: one test for 200 barcodes, per-row add_test vs add_tests_bulk."""
+    fresh_db(tmpdir)
+    barcodes = [f"R{i:05d}" for i in range(200)]
+    for b in barcodes:
+        lis6.upsert_patient(b, "Ward 3", "PATIENT", "IC")
+
+    def one_by_one(i):
+        for b in barcodes:
+            lis6.add_test(b, "GXM", "2025-06-01", "", lis6.get_current_price("GXM"))
+
+    report("200 x add_test (+ price lookup)", 20, timed(one_by_one, 20))
+    report("add_tests_bulk, 200 barcodes", 20,
+           timed(lambda i: lis6.add_tests_bulk(barcodes, "GXM", "2025-06-01"), 20))
+
+def bench_price_cache(tmpdir):
+    """get_current_price: SELECT per call vs the throttled data_version-checked memory cache."""
+    fresh_db(tmpdir)
+    conn = lis6.get_conn()
+    sql = "SELECT price FROM test_prices WHERE test_name=?"
+    report("SELECT from test_prices", N_OPS, timed(lambda i: conn.execute(sql, ("GXM",)).fetchone(), N_OPS))
+    report("get_current_price (cached)", N_OPS, timed(lambda i: lis6.get_current_price("GXM"), N_OPS))
+
+def bench_legacy_migration(tmpdir):
+    """migrate_legacy.py on a synthetic multi-million-row lab_info.db, interrupted once."""
+    import random
+    import migrate_legacy
+    legacy_path = os.path.join(tmpdir, "lab_info.db")
+    legacy = sqlite3.connect(legacy_path)
+    legacy.executescript("""
+        CREATE TABLE patient_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, barcode TEXT, ward TEXT, name TEXT, ic TEXT,
+            test_name TEXT, test_date TEXT, result TEXT, price REAL);
+        CREATE TABLE test_prices (test_name TEXT PRIMARY KEY, price REAL);
+    """)
+    rnd = random.Random(5)
+    with legacy:
+        legacy.executemany("INSERT INTO test_prices VALUES (?, ?)", [(t, 0.0) for t in lis6.TEST_CHOICES])
+        legacy.executemany("""
+            INSERT INTO patient_tests (barcode, ward, name, ic, test_name, test_date, result, price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((f"L{p:07d}", f"Ward {p % 20}", f"PATIENT {p}", f"{p:012d}", rnd.choice(lis6.TEST_CHOICES),
+               f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", "", rnd.choice((40.0, 80.0, 120.0)))
+              for p in (rnd.randrange(N_LEGACY_ROWS // 10) for _ in range(N_LEGACY_ROWS))))
+    legacy.close()
+    fresh_db(tmpdir)
+
+    class Interrupted(Exception):
+        pass
+
+    def stop_after_three_chunks(done, total, seconds):
+        if done >= 3 * migrate_legacy.CHUNK_ROWS:
+            raise Interrupted
+
+    try:
+        migrate_legacy.migrate(legacy_path, progress=stop_after_three_chunks)
+    except Interrupted:
+        pass
+    copied, seconds = migrate_legacy.migrate(legacy_path)
+    report(f"resumed migration ({copied:,} rows left)", copied, seconds)
+    t0 = time.perf_counter()
+    problems, legacy_count, migrated_count = migrate_legacy.verify(legacy_path)
+    print(f"  verify: {legacy_count:,} legacy vs {migrated_count:,} migrated rows, "
+          f"{len(problems)} problems, {time.perf_counter() - t0:.1f}s")
+
+def bench_reports(tmpdir):
+    """revenue_report over a year of data (~1M tests) for each grouping."""
+    fresh_db(tmpdir)
+    fill_tests(1_000_000, 50_000)  # fill_tests spreads test_date over 2025
+    conn = lis6.get_conn()
+    with conn:  # tests without a patient row must still be counted
+        conn.executemany("INSERT INTO tests (barcode_data, test_name, test_date, price) VALUES (?, ?, ?, ?)",
+                         [(None, "FBC", "2025-03-01", 5.0), ("NO-PATIENT", "FBC", "2025-03-02", 7.0)])
+    conn.execute("ANALYZE")
+    for group_by in (("test",), ("day",), ("month",), ("ward",), ("month", "ward", "test")):
+        t0 = time.perf_counter()
+        header, rows = lis6.revenue_report("2025-01-01", "2025-12-31", group_by)
+        elapsed = time.perf_counter() - t0
+        print(f"  {'+'.join(group_by):<18} {len(rows):>6} groups  {sum(r[-2] for r in rows):>9,} tests  {elapsed:.3f}s")
+    header, rows = lis6.revenue_report("2025-01-01", "2025-12-31", ("month", "ward", "test"))
+    t0 = time.perf_counter()
+    lis6.export_report_csv(os.path.join(tmpdir, "report.csv"), header, rows)
+    print(f"  CSV export of {len(rows):,} rows: {time.perf_counter() - t0:.3f}s")
+
+def bench_patient_search(tmpdir):
+    """search_patients() on 500k patients: name/IC/barcode prefixes, and index sync."""
+    import random
+    rnd = random.Random(7)
+    first = ["AHMAD", "MUHAMMAD", "SITI", "NUR", "TAN", "LIM", "RAJ", "KUMAR", "WONG", "AISYAH",
+             "FARID", "MEI LING", "ARUN", "HAFIZ", "CHONG", "DEVI", "ISMAIL", "NORA", "WEI", "ZAINAB"]
+    last = ["ABDULLAH", "HASSAN", "IBRAHIM", "LEE", "NG", "SUBRAMANIAM", "OTHMAN", "YUSOF", "CHAN",
+            "KRISHNAN", "RAHMAN", "O'NEILL", "SALLEH", "GOH", "MOHD NOR", "TEH", "PILLAI", "AZIZ"]
+    fresh_db(tmpdir)
+    conn = lis6.get_conn()
+    t0 = time.perf_counter()
+    with conn:
+        conn.executemany("INSERT INTO patients (barcode_data, ward, name, ic_number) "
+                         "VALUES (?, ?, ?, ?)",
+                         ((f"B{p:07d}", f"Ward {p % 20}",
+                           f"{rnd.choice(first)} {rnd.choice(['BIN', 'BINTI', ''])} {rnd.choice(last)}",
+                           f"{rnd.randint(40, 99):02d}{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}"
+                           f"-{rnd.randint(1, 16):02d}-{rnd.randint(0, 9999):04d}")
+                          for p in range(N_SEARCH_PATIENTS)))
+    report("patient insert (incl. FTS trigger)", N_SEARCH_PATIENTS, time.perf_counter() - t0)
+    sample = lis6.get_patient("B0123456")
+    print(f"  sample patient: {sample}")
+    ic = sample[3]
+    for text in ("ah", "ahm", "siti binti", "siti n", "o'neill", "tan lee", ic[:6], ic[:9], ic[:9].replace("-", ""),
+                 ic, "B01234", "B0123456", "nobody", "x"):
+        lis6.search_patients(text)  # warm the page cache
+        n = 20
+        t0 = time.perf_counter()
+        for _ in range(n):
+            rows = lis6.search_patients(text)
+        ms = (time.perf_counter() - t0) / n * 1000
+        print(f"  {text!r:<18} {len(rows):>3} hits  {ms:7.2f} ms   first: {rows[0] if rows else None}")
+
+    lis6.upsert_patient("B0123456", "Ward 1", "ZZTOP RENAMED", sample[3])
+    renamed = [r[0] for r in lis6.search_patients("zztop")]
+    with conn:
+        conn.execute("DELETE FROM patients WHERE barcode_data = 'B0123456'")
+    gone = lis6.search_patients("zztop")
+    print(f"  sync: rename found {renamed}, after delete {gone}")
+
+
+def bench_group_commit(tmpdir):
+    """Durable add_test throughput: commit per call vs TestWriter group commit."""
+    import threading
+    n_threads = 16
+    fresh_db(tmpdir)
+    conn = lis6.get_conn()
+    report("add_test, commit per call (NORMAL)", 2000,
+           timed(lambda i: lis6.add_test("B1", "GSH", "2025-06-01", "", 5.0), 2000))
+    conn.execute("PRAGMA synchronous=FULL")
+    report("add_test, commit per call (FULL)", 2000,
+           timed(lambda i: lis6.add_test("B1", "GSH", "2025-06-01", "", 5.0), 2000))
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    for max_batch, max_delay in ((1, 0), (8, 0), (64, 0), (256, 0), (1024, 0), (256, 0.005)):
+        writer = lis6.start_test_writer(max_batch, max_delay)
+
+        def entry_station(k):
+            for i in range(N_OPS // n_threads):
+                lis6.add_test(f"B{k:07d}", "GSH", "2025-06-01", str(i), 5.0)
+        threads = [threading.Thread(target=entry_station, args=(k,)) for k in range(n_threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        blocking = time.perf_counter() - t0
+        avg_blocking = writer.metrics()["avg_batch"]
+        lis6.stop_test_writer()
+
+        writer = lis6.start_test_writer(max_batch, max_delay)
+        t0 = time.perf_counter()
+        futures = [writer.submit(*lis6.add_test_statement("FEED", "GSH", "2025-06-01", str(i), 5.0))
+                   for i in range(N_OPS)]
+        for fut in futures:
+            fut.result()
+        pipelined = time.perf_counter() - t0
+        avg_pipelined = writer.metrics()["avg_batch"]
+        lis6.stop_test_writer()
+        label = f"batch<={max_batch}" + (f", {max_delay * 1000:g}ms" if max_delay else "")
+        report(f"{label}: {n_threads} blocking threads", N_OPS, blocking)
+        report(f"{label}: pipelined feed", N_OPS, pipelined)
+        print(f"  avg statements per commit: {avg_blocking:.1f} blocking, {avg_pipelined:.1f} pipelined")
+
+
+def bench_print_spooler(tmpdir):
+    """print_spooler.py feeding two loopback printers from 10 clients: sustained labels/min."""
+    import subprocess
+    import threading
+    n_clients, seconds = 10, 10
+    here = os.path.dirname(os.path.abspath(lis6.__file__))
+    with LoopbackPrinter() as a, LoopbackPrinter() as b:
+        proc = subprocess.Popen([sys.executable, os.path.join(here, "print_spooler.py"), "0",
+                                 f"a={a.uri}", f"b={b.uri}"],
+                                stdout=subprocess.PIPE, text=True, cwd=here)
+        try:
+            address = "127.0.0.1:" + proc.stdout.readline().split("port ", 1)[1].split(",")[0]
+            submitted = [0] * n_clients
+
+            def client(k):
+                with lis6.SpoolerClient(address) as c:
+                    deadline = time.monotonic() + seconds
+                    i = 0
+                    while time.monotonic() < deadline:
+                        records = [(f"S{k:02d}{i + j:06d}", "Ward 8", f"PATIENT {k}", f"IC{i}") for j in range(1 + i % 3)]
+                        c.submit(records, printer="ab"[i % 2])
+                        submitted[k] += len(records)
+                        i += len(records)
+
+            threads = [threading.Thread(target=client, args=(k,)) for k in range(n_clients)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            total = sum(submitted)
+            deadline = time.monotonic() + 60
+            while a.labels + b.labels < total and time.monotonic() < deadline:
+                time.sleep(0.05)
+            span = max(a.last_byte_at, b.last_byte_at) - min(a.first_byte_at, b.first_byte_at)
+            print(f"  {total:,} labels submitted, {a.labels + b.labels:,} printed in {span:.1f}s: "
+                  f"{(a.labels + b.labels) / span * 60:,.0f} labels/min over 2 printers")
+
+            # closed loop: each client waits for its job to print before the next
+            waits = []
+
+            def waiting_client(k):
+                with lis6.SpoolerClient(address) as c:
+                    deadline = time.monotonic() + 3
+                    while time.monotonic() < deadline:
+                        t0 = time.perf_counter()
+                        c.submit([(f"W{k:02d}", "Ward 8", "PATIENT", "IC")], printer="ab"[k % 2], wait=True)
+                        waits.append(time.perf_counter() - t0)
+
+            threads = [threading.Thread(target=waiting_client, args=(k,)) for k in range(n_clients)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            waits.sort()
+            print(f"  submit-to-printed with wait=True: {len(waits):,} jobs, "
+                  f"p50 {waits[len(waits) // 2] * 1000:.2f} ms, p99 {waits[int(len(waits) * 0.99)] * 1000:.2f} ms")
+
+            with lis6.SpoolerClient(address) as c:
+                status = c.status()
+            print(f"  status: latency p50 {status['latency_ms']['p50']} ms, p99 {status['latency_ms']['p99']} ms "
+                  f"(last {status['latency_ms']['jobs']} jobs), {status['labels_last_min']:,} labels in the last minute")
+            for name, p in sorted(status["printers"].items()):
+                print(f"    {name}: queued {p['queued']}, done {p['jobs_done']:,}, failed {p['jobs_failed']}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def bench_scan_loop(tmpdir):
+    """Barcode scan detection accuracy, and scan-to-loaded / scan-to-spooled latency."""
+    import random
+    rnd = random.Random(7)
+    detector = lis6.ScanDetector()
+    t = 0.0
+    found = missed = false_scans = 0
+    for i in range(2000):
+        barcode = f"5080{rnd.randrange(10**6):06d}" if i % 3 else f"LAB{rnd.randrange(10**5):05d}X"
+        kind = i % 4
+        if kind < 2:    # scanners: 2-15 ms per key, Enter or Tab suffix
+            events, t = key_stream(barcode, rnd.uniform(2, 15), rnd, t, 1.5, ("Return", "Tab")[kind])
+        elif kind == 2:  # a fast typist: 60-150 ms per key
+            events, t = key_stream(barcode, rnd.uniform(60, 150), rnd, t, 40)
+        else:            # a person typing a barcode the scanner could not read, then Enter
+            events, t = key_stream(barcode[:5], 120, rnd, t, 60)
+        results = [r for r in (detector.key(*e) for e in events) if r]
+        if kind < 2:
+            ok = len(results) == 1 and results[0][0] == barcode
+            found += ok
+            missed += not ok
+        else:
+            false_scans += len(results)
+        t += rnd.uniform(300, 3000)
+    print(f"  detector: {found}/1000 scans recognised, {missed} missed, {false_scans} false scans in 1000 typed entries")
+
+    fresh_db(tmpdir)
+    fill_tests(n_rows=300_000)
+    saved = lis6.STICKER_FORMAT, lis6.PRINTER_URI
+    lis6.STICKER_FORMAT = "dpl"
+    stats = lis6.LatencyStats()
+    with LoopbackPrinter() as printer:
+        lis6.PRINTER_URI = printer.uri
+        worker = lis6.PrintWorker()
+        loader = lis6.PatientLoader()
+        n = 200
+        for i in range(n):
+            barcode = f"B{rnd.randrange(N_PATIENTS):07d}"
+            # the detector fires on the terminator: the scanner's own typing
+            # time (8 keys + Enter at ~5 ms) is part of the latency
+            started = time.perf_counter() - 9 * 0.005
+
+            def printed(job_id, error, started=started):
+                stats.record("scan_to_spooled", time.perf_counter() - started)
+
+            loader.submit(barcode, started, worker, printed)
+            while True:  # the GUI polls the loader every 10 ms
+                time.sleep(0.010)
+                done = loader.poll()
+                if done:
+                    break
+            stats.record("scan_to_loaded", time.perf_counter() - started)
+            time.sleep(0.05)
+        worker.stop()
+        loader.stop()
+        printer.wait_for_labels(n)
+    lis6.STICKER_FORMAT, lis6.PRINTER_URI = saved
+    for stage, s in stats.summary().items():
+        print(f"  {stage:<16} {s['n']} scans  p50 {s['p50_ms']:6.1f} ms  p99 {s['p99_ms']:6.1f} ms  max {s['max_ms']:6.1f} ms")
+
+
+BENCHMARKS = {
+    "connection": bench_connection,
+    "tests_index": bench_tests_index,
+    "dpl": bench_dpl,
+    "docx_template": bench_docx_template,
+    "parallel_stickers": bench_parallel_stickers,
+    "code128": bench_code128,
+    "sticker_cache": bench_sticker_cache,
+    "raster_sticker": bench_raster_sticker,
+    "print_worker": bench_print_worker,
+    "transport": bench_transport,
+    "printer_session": bench_printer_session,
+    "tree_refresh": bench_tree_refresh,
+    "tests_paging": bench_tests_paging,
+    "test_summary": bench_test_summary,
+    "import_patients": bench_import_patients,
+    "bulk_order": bench_bulk_order,
+    "price_cache": bench_price_cache,
+    "legacy_migration": bench_legacy_migration,
+    "reports": bench_reports,
+    "patient_search": bench_patient_search,
+    "group_commit": bench_group_commit,
+    "print_spooler": bench_print_spooler,
+    "scan_loop": bench_scan_loop,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            BENCHMARKS[name](tmpdir)
+            lis6.close_conn()
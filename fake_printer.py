@@ -0,0 +1,100 @@
+# Loopback stand-in for the Datamax's raw TCP port (9100).
+# Accepts connections, records every byte received and counts DPL labels,
+# so the print path can be exercised and benchmarked without a printer.
+#
+# Usage: python fake_printer.py [port] [output file]
+#        then set PRINTER_URI = "tcp://127.0.0.1:<port>" in lis6.py
+
+import socketserver
+import sys
+import threading
+import time
+
+LABEL_END = b"\r\nE\r\n"   # end of a DPL label format
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128  # the default 5 drops SYNs under one-connection-per-label load
+
+
+class LoopbackPrinter:
+    """Threaded TCP listener that records what a raw-port printer would receive."""
+
+    def __init__(self, host="127.0.0.1", port=0, sink=None):
+        printer = self
+        self.lock = threading.Lock()
+        self.data = bytearray()
+        self.connections = 0
+        self.first_byte_at = None
+        self.last_byte_at = None
+        self.sink = sink
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                with printer.lock:
+                    printer.connections += 1
+                while True:
+                    chunk = self.request.recv(65536)
+                    if not chunk:
+                        return
+                    printer._record(chunk)
+
+        self.server = _Server((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.uri = f"tcp://{self.host}:{self.port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _record(self, chunk):
+        now = time.perf_counter()
+        with self.lock:
+            if self.first_byte_at is None:
+                self.first_byte_at = now
+            self.last_byte_at = now
+            self.data += chunk
+            if self.sink:
+                self.sink.write(chunk)
+
+    @property
+    def labels(self):
+        with self.lock:
+            return self.data.count(LABEL_END)
+
+    def wait_for_labels(self, count, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while self.labels < count:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"received {self.labels} of {count} labels")
+            time.sleep(0.005)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9100
+    out = open(sys.argv[2], "ab") if len(sys.argv) > 2 else None
+    printer = LoopbackPrinter("0.0.0.0", port, sink=out).start()
+    print(f"Fake printer listening on port {printer.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{printer.connections} connections, {len(printer.data):,} bytes, {printer.labels} labels")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        printer.stop()
+        if out:
+            out.close()
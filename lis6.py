@@ -1,20 +1,47 @@
 import os
+import csv
+import select
+import socket
 import sqlite3
+import subprocess
+import sys
+import threading
+import queue
+import itertools
+import json
+import re
+import zipfile
+import time
+import http.client
+from urllib.parse import urlsplit
+from functools import lru_cache
+from concurrent.futures import Future
 from datetime import datetime
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from tkinter import font as tkfont  # NEW: for reliable bold font
 
 # Sticker libs (used by your print function)
 from barcode import Code128
 from barcode.writer import ImageWriter
-from PIL import Image
+from barcode.charsets import code128
+from PIL import Image, ImageDraw, ImageFont
 from docx import Document
 from docx.shared import Cm, Pt
 from docx.oxml.ns import qn
+from docx.enum.style import WD_STYLE_TYPE
+from xml.sax.saxutils import escape
 from tempfile import NamedTemporaryFile
+from io import BytesIO
+import numpy as np
 
 DB_PATH = "lis.db"
+PRINTER_NAME = "Datamax-O'Neil E-4204B Mark III"
+PRINTER_DPI = 203
+STICKER_CACHE_SIZE = 512  # reprinted barcodes kept pre-rendered (per cache)
+
+TESTS_PAGE_SIZE = 100     # rows fetched per scroll step in the tests list
+TESTS_WINDOW_ROWS = 300   # most rows kept in the tests list at once
 
 TEST_CHOICES = [
     "GSH",
@@ -27,160 +54,1043 @@ TEST_CHOICES = [
 # =========================
 # Database Setup / Helpers
 # =========================
+# patients_fts sync triggers, by name (see migration 4). import_patients()
+# drops them for the length of an import and indexes each chunk in bulk.
+PATIENT_SEARCH_TRIGGERS = {
+    "trg_patients_fts_insert": """
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients
+    BEGIN
+        INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        VALUES (NEW.rowid, NEW.barcode_data, NEW.name,
+                replace(replace(NEW.ic_number, '-', ''), ' ', ''));
+    END""",
+    "trg_patients_fts_delete": """
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients
+    BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, barcode_data, name, ic_number)
+        VALUES ('delete', OLD.rowid, OLD.barcode_data, OLD.name,
+                replace(replace(OLD.ic_number, '-', ''), ' ', ''));
+    END""",
+    "trg_patients_fts_update": """
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update
+        AFTER UPDATE OF barcode_data, name, ic_number ON patients
+    BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, barcode_data, name, ic_number)
+        VALUES ('delete', OLD.rowid, OLD.barcode_data, OLD.name,
+                replace(replace(OLD.ic_number, '-', ''), ' ', ''));
+        INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        VALUES (NEW.rowid, NEW.barcode_data, NEW.name,
+                replace(replace(NEW.ic_number, '-', ''), ' ', ''));
+    END""",
+}
+
+# test_rollup: tests and revenue per (date, test, ward) for revenue_report().
+# Ward is the patient's current ward, '' for tests without a patient row, so
+# the triggers on patients move a patient's tests between wards as well.
+def _rollup_test(row, sign):
+    """Trigger statement counting one tests row (NEW/OLD) in or out of test_rollup."""
+    return f"""
+        INSERT INTO test_rollup (test_date, test_name, ward, test_count, revenue)
+        VALUES (COALESCE({row}.test_date, ''), COALESCE({row}.test_name, ''),
+                COALESCE((SELECT ward FROM patients WHERE barcode_data = {row}.barcode_data), ''),
+                {sign}, {sign} * COALESCE({row}.price, 0))
+        ON CONFLICT (test_date, test_name, ward) DO UPDATE SET
+            test_count = test_count + excluded.test_count, revenue = revenue + excluded.revenue;"""
+
+def _rollup_patient_tests(barcode, ward, sign, where=""):
+    """Trigger statement counting all tests of one barcode in or out of test_rollup under ward."""
+    return f"""
+        INSERT INTO test_rollup (test_date, test_name, ward, test_count, revenue)
+        SELECT COALESCE(test_date, ''), COALESCE(test_name, ''), COALESCE({ward}, ''),
+               {sign} * COUNT(*), {sign} * COALESCE(SUM(price), 0)
+        FROM tests WHERE barcode_data = {barcode}{where}
+        GROUP BY 1, 2
+        ON CONFLICT (test_date, test_name, ward) DO UPDATE SET
+            test_count = test_count + excluded.test_count, revenue = revenue + excluded.revenue;"""
+
+# the triggers on patients, by name; import_patients() drops these too
+PATIENT_ROLLUP_TRIGGERS = {
+    "trg_patients_rollup_insert": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_insert AFTER INSERT ON patients
+    BEGIN {_rollup_patient_tests("NEW.barcode_data", "''", -1)}
+        {_rollup_patient_tests("NEW.barcode_data", "NEW.ward", 1)}
+    END""",
+    "trg_patients_rollup_delete": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_delete AFTER DELETE ON patients
+    BEGIN {_rollup_patient_tests("OLD.barcode_data", "OLD.ward", -1)}
+        {_rollup_patient_tests("OLD.barcode_data", "''", 1)}
+    END""",
+    "trg_patients_rollup_update": f"""
+    CREATE TRIGGER IF NOT EXISTS trg_patients_rollup_update AFTER UPDATE OF barcode_data, ward ON patients
+        WHEN OLD.barcode_data IS NOT NEW.barcode_data OR OLD.ward IS NOT NEW.ward
+    BEGIN {_rollup_patient_tests("OLD.barcode_data", "OLD.ward", -1)}
+        {_rollup_patient_tests("OLD.barcode_data", "''", 1, " AND OLD.barcode_data IS NOT NEW.barcode_data")}
+        {_rollup_patient_tests("NEW.barcode_data", "''", -1, " AND OLD.barcode_data IS NOT NEW.barcode_data")}
+        {_rollup_patient_tests("NEW.barcode_data", "NEW.ward", 1)}
+    END""",
+}
+
+_ROLLUP_FROM_TESTS = """
+    SELECT COALESCE(t.test_date, ''), COALESCE(t.test_name, ''), COALESCE(p.ward, ''),
+           COUNT(*), COALESCE(SUM(t.price), 0)
+    FROM tests t LEFT JOIN patients p ON p.barcode_data = t.barcode_data
+    GROUP BY 1, 2, 3
+"""
+
+# Schema migrations, applied in order by init_db(); PRAGMA user_version
+# records how many have run. Append new steps, never edit old ones.
+MIGRATIONS = [
+    # 1: list_tests() lookup – covering index in (barcode_data, test_date, id) order
+    #    so the ORDER BY is a backwards index scan with no table lookups.
+    """
+    CREATE INDEX IF NOT EXISTS idx_tests_barcode_date
+        ON tests (barcode_data, test_date, id, test_name, result, price);
+    -- date-range reporting by day / test
+    CREATE INDEX IF NOT EXISTS idx_tests_date_name
+        ON tests (test_date, test_name, price);
+    """,
+    # 2: per-patient billing summary, kept current by triggers on tests
+    """
+    CREATE TABLE IF NOT EXISTS test_summary (
+        barcode_data   TEXT PRIMARY KEY,
+        test_count     INTEGER NOT NULL DEFAULT 0,
+        total_price    REAL NOT NULL DEFAULT 0,
+        last_test_date TEXT
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_tests_summary_insert AFTER INSERT ON tests
+    BEGIN
+        INSERT OR IGNORE INTO test_summary (barcode_data) VALUES (NEW.barcode_data);
+        UPDATE test_summary SET
+            test_count = test_count + 1,
+            total_price = total_price + COALESCE(NEW.price, 0),
+            last_test_date = (SELECT MAX(test_date) FROM tests WHERE barcode_data = NEW.barcode_data)
+        WHERE barcode_data = NEW.barcode_data;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tests_summary_delete AFTER DELETE ON tests
+    BEGIN
+        UPDATE test_summary SET
+            test_count = test_count - 1,
+            total_price = total_price - COALESCE(OLD.price, 0),
+            last_test_date = (SELECT MAX(test_date) FROM tests WHERE barcode_data = OLD.barcode_data)
+        WHERE barcode_data = OLD.barcode_data;
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tests_summary_update
+    AFTER UPDATE OF barcode_data, test_date, price ON tests
+    BEGIN
+        UPDATE test_summary SET
+            test_count = test_count - 1,
+            total_price = total_price - COALESCE(OLD.price, 0),
+            last_test_date = (SELECT MAX(test_date) FROM tests WHERE barcode_data = OLD.barcode_data)
+        WHERE barcode_data = OLD.barcode_data;
+        INSERT OR IGNORE INTO test_summary (barcode_data) VALUES (NEW.barcode_data);
+        UPDATE test_summary SET
+            test_count = test_count + 1,
+            total_price = total_price + COALESCE(NEW.price, 0),
+            last_test_date = (SELECT MAX(test_date) FROM tests WHERE barcode_data = NEW.barcode_data)
+        WHERE barcode_data = NEW.barcode_data;
+    END;
+    DELETE FROM test_summary;
+    INSERT INTO test_summary (barcode_data, test_count, total_price, last_test_date)
+        SELECT barcode_data, COUNT(*), COALESCE(SUM(price), 0), MAX(test_date)
+        FROM tests GROUP BY barcode_data;
+    """,
+    # 3: revenue/workload reports – date-range scans that also group by ward
+    #    need barcode_data, so widen the reporting index to cover it
+    """
+    DROP INDEX IF EXISTS idx_tests_date_name;
+    CREATE INDEX IF NOT EXISTS idx_tests_date_report
+        ON tests (test_date, test_name, price, barcode_data);
+    """,
+    # 4: patient search – contentless FTS5 index over barcode, name and IC
+    #    (IC without dashes/spaces), keyed by patients.rowid and kept in sync
+    #    by triggers. A contentless table can only forget a row given the
+    #    values it was indexed with, hence the OLD.* "delete" rows.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts
+        USING fts5(barcode_data, name, ic_number, content='', prefix='2 3');
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert AFTER INSERT ON patients
+    BEGIN
+        INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        VALUES (NEW.rowid, NEW.barcode_data, NEW.name,
+                replace(replace(NEW.ic_number, '-', ''), ' ', ''));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete AFTER DELETE ON patients
+    BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, barcode_data, name, ic_number)
+        VALUES ('delete', OLD.rowid, OLD.barcode_data, OLD.name,
+                replace(replace(OLD.ic_number, '-', ''), ' ', ''));
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update
+        AFTER UPDATE OF barcode_data, name, ic_number ON patients
+    BEGIN
+        INSERT INTO patients_fts (patients_fts, rowid, barcode_data, name, ic_number)
+        VALUES ('delete', OLD.rowid, OLD.barcode_data, OLD.name,
+                replace(replace(OLD.ic_number, '-', ''), ' ', ''));
+        INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        VALUES (NEW.rowid, NEW.barcode_data, NEW.name,
+                replace(replace(NEW.ic_number, '-', ''), ' ', ''));
+    END;
+    INSERT INTO patients_fts (patients_fts) VALUES ('delete-all');
+    INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        SELECT rowid, barcode_data, name, replace(replace(ic_number, '-', ''), ' ', '')
+        FROM patients;
+    """,
+    # 5: patients gets an INTEGER PRIMARY KEY. patients_fts is keyed by the
+    #    rowid, and an implicit rowid may be renumbered by VACUUM, pointing
+    #    search hits at the wrong patient; an explicit one never changes.
+    #    The rebuild drops the sync triggers, so recreate them and reindex.
+    """
+    CREATE TABLE patients_new (
+        id           INTEGER PRIMARY KEY,
+        barcode_data TEXT UNIQUE,
+        ward         TEXT,
+        name         TEXT,
+        ic_number    TEXT
+    );
+    INSERT INTO patients_new (id, barcode_data, ward, name, ic_number)
+        SELECT rowid, barcode_data, ward, name, ic_number FROM patients;
+    DROP TABLE patients;
+    ALTER TABLE patients_new RENAME TO patients;
+    """ + ";".join(PATIENT_SEARCH_TRIGGERS.values()) + """;
+    INSERT INTO patients_fts (patients_fts) VALUES ('delete-all');
+    INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        SELECT id, barcode_data, name, replace(replace(ic_number, '-', ''), ' ', '')
+        FROM patients;
+    """,
+    # 6: revenue_report() rollup (see _rollup_test), kept current by triggers
+    #    on tests and on patients' barcode/ward
+    f"""
+    CREATE TABLE IF NOT EXISTS test_rollup (
+        test_date  TEXT NOT NULL,
+        test_name  TEXT NOT NULL,
+        ward       TEXT NOT NULL,
+        test_count INTEGER NOT NULL DEFAULT 0,
+        revenue    REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (test_date, test_name, ward)
+    ) WITHOUT ROWID;
+    CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_insert AFTER INSERT ON tests
+    BEGIN {_rollup_test("NEW", 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_delete AFTER DELETE ON tests
+    BEGIN {_rollup_test("OLD", -1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_update
+        AFTER UPDATE OF barcode_data, test_name, test_date, price ON tests
+    BEGIN {_rollup_test("OLD", -1)} {_rollup_test("NEW", 1)}
+    END;
+    {";".join(PATIENT_ROLLUP_TRIGGERS.values())};
+    DELETE FROM test_rollup;
+    INSERT INTO test_rollup (test_date, test_name, ward, test_count, revenue) {_ROLLUP_FROM_TESTS};
+    """,
+]
+
+_local = threading.local()
+
+def get_conn():
+    """Return this thread's long-lived connection to DB_PATH (opened on first use)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    _local.prices = None
+    conn = sqlite3.connect(DB_PATH, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _local.conn = conn
+    _local.path = DB_PATH
+    return conn
+
+def close_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+    _local.prices = None
+
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS patients (
-            barcode_data TEXT PRIMARY KEY,
-            ward         TEXT,
-            name         TEXT,
-            ic_number    TEXT
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS tests (
-            id           INTEGER PRIMARY KEY AUTOINCREMENT,
-            barcode_data TEXT,
-            test_name    TEXT,
-            test_date    TEXT,   -- ISO 'YYYY-MM-DD'
-            result       TEXT,
-            price        REAL DEFAULT 0,
-            FOREIGN KEY (barcode_data) REFERENCES patients(barcode_data)
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS test_prices (
-            test_name TEXT PRIMARY KEY,
-            price     REAL NOT NULL
-        )
-    """)
-    # Ensure all test choices exist in the price table (default 0.0)
-    for t in TEST_CHOICES:
-        cur.execute("INSERT OR IGNORE INTO test_prices (test_name, price) VALUES (?, 0.0)", (t,))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with conn:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS patients (
+                id           INTEGER PRIMARY KEY,
+                barcode_data TEXT UNIQUE,
+                ward         TEXT,
+                name         TEXT,
+                ic_number    TEXT
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tests (
+                id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                barcode_data TEXT,
+                test_name    TEXT,
+                test_date    TEXT,   -- ISO 'YYYY-MM-DD'
+                result       TEXT,
+                price        REAL DEFAULT 0,
+                FOREIGN KEY (barcode_data) REFERENCES patients(barcode_data)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS test_prices (
+                test_name TEXT PRIMARY KEY,
+                price     REAL NOT NULL
+            )
+        """)
+        # Ensure all test choices exist in the price table (default 0.0)
+        for t in TEST_CHOICES:
+            cur.execute("INSERT OR IGNORE INTO test_prices (test_name, price) VALUES (?, 0.0)", (t,))
+    migrate_db(conn)
+    invalidate_price_cache()
+    _price_table()  # load the price cache up front
+
+def migrate_db(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for step, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        # executescript() commits first and runs outside the implicit transaction,
+        # so wrap each step and its version bump explicitly.
+        conn.executescript(f"BEGIN; {script}; PRAGMA user_version={step}; COMMIT;")
+    if version < len(MIGRATIONS):
+        analyze_tables(conn)
+
+def analyze_tables(conn):
+    """ANALYZE the ordinary tables, leaving virtual tables' shadow tables alone.
+
+    Stats taken while an FTS5 table is nearly empty (patients_fts_data at two
+    rows) make FTS5's own segment deletes plan as full scans, and inserts
+    through the sync triggers then slow down as the index grows.
+    """
+    names = conn.execute(
+        "SELECT name, sql LIKE 'CREATE VIRTUAL TABLE%' FROM sqlite_schema "
+        "WHERE type='table' AND name NOT LIKE 'sqlite!_%' ESCAPE '!'").fetchall()
+    virtual = [name for name, is_virtual in names if is_virtual]
+    for name, is_virtual in names:
+        if not is_virtual and not any(name.startswith(v + "_") for v in virtual):
+            conn.execute(f'ANALYZE "{name}"')
+
+# How long another connection's price edit may go unseen: PRAGMA data_version
+# costs as much as the SELECT it saves, so it is checked at most this often.
+PRICE_RECHECK_SECONDS = 0.5
+
+def _price_table():
+    """This thread's in-memory copy of test_prices.
+
+    Reloaded only when PRAGMA data_version shows another connection (another
+    thread or process) has committed since it was read, checked at most every
+    PRICE_RECHECK_SECONDS; this connection's own writes go through
+    set_all_prices(), which drops the copy.
+    """
+    now = time.monotonic()
+    prices = getattr(_local, "prices", None)
+    if prices is not None and _local.path == DB_PATH and now < _local.prices_checked:
+        return prices
+    conn = get_conn()
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, "prices", None) is None or _local.prices_key != (id(conn), version):
+        _local.prices = dict(conn.execute("SELECT test_name, price FROM test_prices").fetchall())
+        _local.prices_key = (id(conn), version)
+    _local.prices_checked = now + PRICE_RECHECK_SECONDS
+    return _local.prices
+
+def invalidate_price_cache():
+    _local.prices = None
 
 def get_current_price(test_name):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT price FROM test_prices WHERE test_name=?", (test_name,))
-    row = cur.fetchone()
-    conn.close()
-    return float(row[0]) if row else 0.0
+    return float(_price_table().get(test_name, 0.0))
 
 def get_all_prices():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT test_name, price FROM test_prices")
-    data = dict(cur.fetchall())
-    conn.close()
-    return data
+    return dict(_price_table())
+
+# Each write is one SQL statement, built by a *_statement() helper, so the
+# same write can run here, through a TestWriter, or inside lis_server.py.
+def set_prices_statement(price_dict):
+    return ("""
+        UPDATE test_prices SET price = (SELECT value FROM json_each(?1) WHERE key = test_name)
+        WHERE test_name IN (SELECT key FROM json_each(?1))
+    """, (json.dumps(price_dict),))
 
 def set_all_prices(price_dict):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    for name, price in price_dict.items():
-        cur.execute("UPDATE test_prices SET price=? WHERE test_name=?", (price, name))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with conn:
+        conn.execute(*set_prices_statement(price_dict))
+    invalidate_price_cache()
+
+_UPSERT_PATIENT_SQL = """
+    INSERT INTO patients (barcode_data, ward, name, ic_number)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(barcode_data) DO UPDATE SET
+        ward=excluded.ward, name=excluded.name, ic_number=excluded.ic_number
+"""
+
+def upsert_patient_statement(barcode_data, ward, name, ic_number):
+    return _UPSERT_PATIENT_SQL, (barcode_data, ward, name, ic_number)
 
 def upsert_patient(barcode_data, ward, name, ic_number):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO patients (barcode_data, ward, name, ic_number)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(barcode_data) DO UPDATE SET
-            ward=excluded.ward, name=excluded.name, ic_number=excluded.ic_number
-    """, (barcode_data, ward, name, ic_number))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with conn:
+        conn.execute(*upsert_patient_statement(barcode_data, ward, name, ic_number))
 
 def get_patient(barcode_data):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT barcode_data, ward, name, ic_number FROM patients WHERE barcode_data=?", (barcode_data,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    return get_conn().execute(
+        "SELECT barcode_data, ward, name, ic_number FROM patients WHERE barcode_data=?",
+        (barcode_data,)).fetchone()
 
-def add_test(barcode_data, test_name, test_date, result, price_snapshot):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
+def add_test_statement(barcode_data, test_name, test_date, result, price_snapshot):
+    return ("""
         INSERT INTO tests (barcode_data, test_name, test_date, result, price)
         VALUES (?,?,?,?,?)
     """, (barcode_data, test_name, test_date, result, price_snapshot))
-    conn.commit()
-    conn.close()
 
-def update_test(test_id, test_name, test_date, result, price_snapshot=None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def add_test(barcode_data, test_name, test_date, result, price_snapshot):
+    """Insert one test and return its id; goes through the group-commit
+    writer when one is running (see start_test_writer)."""
+    stmt = add_test_statement(barcode_data, test_name, test_date, result, price_snapshot)
+    if _test_writer is not None:
+        return _test_writer.submit(*stmt).result()
+    conn = get_conn()
+    with conn:
+        return conn.execute(*stmt).lastrowid
+
+def get_patients(barcodes):
+    """{barcode: (barcode, ward, name, ic)} for the given barcodes that exist."""
+    rows = get_conn().execute("""
+        SELECT barcode_data, ward, name, ic_number FROM patients
+        WHERE barcode_data IN (SELECT value FROM json_each(?))
+    """, (json.dumps(list(barcodes)),)).fetchall()
+    return {row[0]: row for row in rows}
+
+def add_tests_bulk(barcodes, test_name, test_date, result=""):
+    """Order one test for many patients in a single transaction.
+
+    The price is snapshotted once for the whole batch. Barcodes with no
+    patient record are skipped. Returns (patients ordered for, missing
+    barcodes, price snapshot).
+    """
+    barcodes = list(dict.fromkeys(b for b in barcodes if b))  # dedupe, keep scan order
+    patients = get_patients(barcodes)
+    price = get_current_price(test_name)
+    ordered = [patients[b] for b in barcodes if b in patients]
+    conn = get_conn()
+    with conn:
+        conn.execute(*add_tests_bulk_statement([p[0] for p in ordered], test_name, test_date, result, price))
+    return ordered, [b for b in barcodes if b not in patients], price
+
+def add_tests_bulk_statement(barcodes, test_name, test_date, result, price_snapshot):
+    return ("""
+        INSERT INTO tests (barcode_data, test_name, test_date, result, price)
+        SELECT value, ?, ?, ?, ? FROM json_each(?) ORDER BY key
+    """, (test_name, test_date, result, price_snapshot, json.dumps(list(barcodes))))
+
+def update_test_statement(test_id, test_name, test_date, result, price_snapshot=None):
     if price_snapshot is None:
-        cur.execute("""
-            UPDATE tests SET test_name=?, test_date=?, result=? WHERE id=?
-        """, (test_name, test_date, result, test_id))
-    else:
-        cur.execute("""
-            UPDATE tests SET test_name=?, test_date=?, result=?, price=? WHERE id=?
-        """, (test_name, test_date, result, price_snapshot, test_id))
-    conn.commit()
-    conn.close()
+        return ("UPDATE tests SET test_name=?, test_date=?, result=? WHERE id=?",
+                (test_name, test_date, result, test_id))
+    return ("UPDATE tests SET test_name=?, test_date=?, result=?, price=? WHERE id=?",
+            (test_name, test_date, result, price_snapshot, test_id))
+
+def update_test(test_id, test_name, test_date, result, price_snapshot=None):
+    stmt = update_test_statement(test_id, test_name, test_date, result, price_snapshot)
+    if _test_writer is not None:
+        _test_writer.submit(*stmt).result()
+        return
+    conn = get_conn()
+    with conn:
+        conn.execute(*stmt)
+
+def delete_test_statement(test_id):
+    return "DELETE FROM tests WHERE id=?", (test_id,)
 
 def delete_test(test_id):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM tests WHERE id=?", (test_id,))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with conn:
+        conn.execute(*delete_test_statement(test_id))
 
 def list_tests(barcode_data):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
+    return get_conn().execute("""
         SELECT id, test_name, test_date, result, price
         FROM tests
         WHERE barcode_data=?
         ORDER BY test_date DESC, id DESC
-    """, (barcode_data,))
-    rows = cur.fetchall()
-    conn.close()
+    """, (barcode_data,)).fetchall()
+
+def list_tests_page(barcode_data, after=None, before=None, limit=TESTS_PAGE_SIZE):
+    """One page of list_tests(), by keyset on (test_date, id).
+
+    after=(test_date, id) gives the rows that follow that row, before=...
+    the rows just ahead of it (still in list order). Either way it is a
+    range seek on idx_tests_barcode_date, however deep into the history.
+    Tests without a date list last, as in list_tests(); a NULL never
+    compares in the (test_date, id) key, so those are paged by id alone.
+    """
+    conn = get_conn()
+    select = "SELECT id, test_name, test_date, result, price FROM tests WHERE barcode_data=?"
+    if before is not None:
+        date, test_id = before
+        if date is None:
+            rows = conn.execute(f"{select} AND test_date IS NULL AND id > ? ORDER BY id LIMIT ?",
+                                (barcode_data, test_id, limit)).fetchall()
+            if len(rows) < limit:
+                rows += conn.execute(f"{select} AND test_date IS NOT NULL ORDER BY test_date, id LIMIT ?",
+                                     (barcode_data, limit - len(rows))).fetchall()
+        else:
+            rows = conn.execute(f"{select} AND (test_date, id) > (?, ?) ORDER BY test_date, id LIMIT ?",
+                                (barcode_data, date, test_id, limit)).fetchall()
+        return rows[::-1]
+    if after is not None:
+        date, test_id = after
+        if date is None:
+            return conn.execute(f"{select} AND test_date IS NULL AND id < ? ORDER BY id DESC LIMIT ?",
+                                (barcode_data, test_id, limit)).fetchall()
+        rows = conn.execute(f"{select} AND (test_date, id) < (?, ?) ORDER BY test_date DESC, id DESC LIMIT ?",
+                            (barcode_data, date, test_id, limit)).fetchall()
+        if len(rows) < limit:
+            rows += conn.execute(f"{select} AND test_date IS NULL ORDER BY id DESC LIMIT ?",
+                                 (barcode_data, limit - len(rows))).fetchall()
+        return rows
+    return conn.execute(f"{select} ORDER BY test_date DESC, id DESC LIMIT ?", (barcode_data, limit)).fetchall()
+
+def get_test_summary(barcode_data):
+    """(test count, total price, last test date) from the trigger-maintained summary."""
+    row = get_conn().execute(
+        "SELECT test_count, total_price, last_test_date FROM test_summary WHERE barcode_data=?",
+        (barcode_data,)).fetchone()
+    return (row[0], float(row[1]), row[2]) if row else (0, 0.0, None)
+
+def test_totals(barcode_data):
+    """(number of tests, sum of price) for a patient."""
+    count, total, _ = get_test_summary(barcode_data)
+    return count, total
+
+# tests without a barcode (legacy orphans) belong to no patient: the
+# triggers' "WHERE barcode_data = NULL" never matches them either
+_SUMMARY_FROM_TESTS = """
+    SELECT barcode_data, COUNT(*), COALESCE(SUM(price), 0), MAX(test_date)
+    FROM tests WHERE barcode_data IS NOT NULL GROUP BY barcode_data
+"""
+
+def check_test_summary():
+    """Compare test_summary with a fresh aggregate of tests.
+
+    Returns {barcode: (stored, expected)} for every patient that disagrees;
+    an empty dict means the summary is consistent.
+    """
+    conn = get_conn()
+    expected = {b: (n, round(t, 2), d) for b, n, t, d in conn.execute(_SUMMARY_FROM_TESTS)}
+    stored = {b: (n, round(t, 2), d) for b, n, t, d in conn.execute(
+        "SELECT barcode_data, test_count, total_price, last_test_date FROM test_summary WHERE test_count != 0")}
+    return {b: (stored.get(b), expected.get(b))
+            for b in expected.keys() | stored.keys() if stored.get(b) != expected.get(b)}
+
+def rebuild_test_summary():
+    conn = get_conn()
+    with conn:
+        conn.execute("DELETE FROM test_summary")
+        conn.execute("INSERT INTO test_summary (barcode_data, test_count, total_price, last_test_date) "
+                     + _SUMMARY_FROM_TESTS)
+
+def rebuild_test_rollup():
+    conn = get_conn()
+    with conn:
+        conn.execute("DELETE FROM test_rollup")
+        conn.execute("INSERT INTO test_rollup (test_date, test_name, ward, test_count, revenue) "
+                     + _ROLLUP_FROM_TESTS)
+
+# =========================
+# Group Commit
+# =========================
+# add_test()/update_test() normally commit one transaction each. With a
+# TestWriter running they instead queue their statement and block until the
+# transaction holding it has committed: concurrent callers (analyzer feeds,
+# bulk entry, service threads) share one commit, and so one fsync, per batch.
+TEST_WRITE_BATCH = 256  # statements per transaction at most
+TEST_WRITE_DELAY = 0.0  # extra seconds to wait for more; 0 = commit what is queued,
+                        # and what arrives during that commit forms the next batch
+
+_test_writer = None
+
+class TestWriter:
+    """Single writer thread that applies queued statements in group commits.
+
+    submit() returns a concurrent.futures.Future that resolves once the
+    statement's transaction is committed with synchronous=FULL, so an
+    acknowledged write survives a crash or power cut; anything not yet
+    acknowledged may be lost and is the submitter's to retry. The result is
+    the new row id for an INSERT, the changed row count otherwise. Each
+    statement runs under its own savepoint: one that fails gets the
+    exception and is left out, the rest of its batch still commits.
+    """
+
+    def __init__(self, max_batch=TEST_WRITE_BATCH, max_delay=TEST_WRITE_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.ops = queue.Queue()
+        self.batches = 0
+        self.statements = 0
+        self._thread = threading.Thread(target=self._run, name="test-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params=()):
+        fut = Future()
+        self.ops.put((fut, sql, params))
+        return fut
+
+    def metrics(self):
+        return {"batches": self.batches, "statements": self.statements,
+                "avg_batch": self.statements / self.batches if self.batches else 0.0}
+
+    def stop(self):
+        """Commit everything already submitted, then end the thread."""
+        self.ops.put(None)
+        self._thread.join()
+
+    def _run(self):
+        conn = get_conn()
+        conn.execute("PRAGMA synchronous=FULL")
+        try:
+            while True:
+                op = self.ops.get()
+                if op is None:
+                    return
+                batch = [op]
+                deadline = time.monotonic() + self.max_delay
+                stopping = False
+                while len(batch) < self.max_batch:
+                    try:
+                        op = self.ops.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if op is None:
+                        stopping = True
+                        break
+                    batch.append(op)
+                self._commit(conn, batch)
+                if stopping:
+                    return
+        finally:
+            close_conn()  # this thread's connection
+
+    def _commit(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fut, sql, params in batch:
+                conn.execute("SAVEPOINT op")
+                try:
+                    cur = conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    conn.execute("ROLLBACK TO op")
+                    outcomes.append((fut, None, e))
+                else:
+                    is_insert = sql.lstrip().upper().startswith("INSERT")
+                    outcomes.append((fut, cur.lastrowid if is_insert else cur.rowcount, None))
+                conn.execute("RELEASE op")
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(fut, None, e) for fut, _, _ in batch]
+        else:
+            self.batches += 1
+            self.statements += len(batch)
+        for fut, value, error in outcomes:
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(value)
+
+def start_test_writer(max_batch=TEST_WRITE_BATCH, max_delay=TEST_WRITE_DELAY):
+    """Route add_test()/update_test() through a group-commit TestWriter."""
+    global _test_writer
+    if _test_writer is None:
+        _test_writer = TestWriter(max_batch, max_delay)
+    return _test_writer
+
+def stop_test_writer():
+    global _test_writer
+    writer, _test_writer = _test_writer, None
+    if writer is not None:
+        writer.stop()
+
+# =========================
+# Patient Search
+# =========================
+SEARCH_LIMIT = 50
+SEARCH_DEBOUNCE_MS = 200  # search once typing pauses this long
+SEARCH_MIN_CHARS = 2  # shorter prefixes match too much of the table to be useful
+
+def patient_search_query(text):
+    """FTS5 MATCH expression for what the user typed, or None if too short.
+
+    Every word must match as a prefix somewhere in barcode, name or IC.
+    Words are quoted so punctuation is tokenized rather than parsed as query
+    syntax; dashes are dropped from words with digits, matching the index's IC.
+    """
+    terms = []
+    for word in text.split():
+        if any(ch.isdigit() for ch in word):
+            word = word.replace("-", "")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"*')
+    if not terms or len("".join(text.split())) < SEARCH_MIN_CHARS:
+        return None
+    return " ".join(terms)
+
+def search_patients(text, limit=SEARCH_LIMIT):
+    """Patients matching text by barcode, name or IC prefix, newest first.
+
+    An exact barcode match is always listed first.
+    """
+    match = patient_search_query(text)
+    if match is None:
+        return []
+    conn = get_conn()
+    rows = conn.execute("""
+        SELECT p.barcode_data, p.ward, p.name, p.ic_number
+        FROM patients_fts f CROSS JOIN patients p ON p.id = f.rowid
+        WHERE patients_fts MATCH ?
+        ORDER BY f.rowid DESC
+        LIMIT ?
+    """, (match, limit)).fetchall()
+    exact = get_patient(text.strip())
+    if exact:
+        rows = [exact] + [r for r in rows if r[0] != exact[0]][:limit - 1]
     return rows
 
+def rebuild_patient_search():
+    """Re-index every patient, e.g. if patients_fts was damaged or edited by hand."""
+    conn = get_conn()
+    with conn:
+        conn.execute("INSERT INTO patients_fts (patients_fts) VALUES ('delete-all')")
+        conn.execute("""
+            INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+            SELECT id, barcode_data, name, replace(replace(ic_number, '-', ''), ' ', '')
+            FROM patients
+        """)
+
 # =========================
-# Sticker Printing (DOCX flow)
+# Reports
 # =========================
-def print_sticker(barcode_data, ward, name, ic_number,
-                  CROP_KEEP=0.3, BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0):
-    barcode_img_path = "barcode.png"
-    barcode_cropped_path = "barcode_cropped.png"
-    barcode = Code128(barcode_data, writer=ImageWriter())
-    barcode.save(barcode_img_path.replace(".png", ""))  # creates barcode.png
+# Grouping keys for revenue_report(), as columns of test_rollup: a year is a
+# few tens of thousands of rollup rows rather than every test.
+REPORT_GROUPS = {
+    "test":  ("Test", "r.test_name"),
+    "day":   ("Date", "r.test_date"),
+    "month": ("Month", "substr(r.test_date, 1, 7)"),
+    "ward":  ("Ward", "r.ward"),
+}
+
+def revenue_report(date_from, date_to, group_by=("test",)):
+    """Test counts and revenue for tests dated date_from..date_to (inclusive).
+
+    group_by is a sequence of REPORT_GROUPS keys. Returns (header, rows),
+    rows being (*group values, count, revenue) sorted by the group values.
+    """
+    unknown = [g for g in group_by if g not in REPORT_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown report grouping: {', '.join(unknown)}")
+    for date in (date_from, date_to):
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise ValueError(f"Report dates must be YYYY-MM-DD, got {date!r}") from None
+    labels = [REPORT_GROUPS[g][0] for g in group_by]
+    header = labels + ["Tests", "Revenue (RM)"]
+    keys = [REPORT_GROUPS[g][1] for g in group_by]
+    # rollup rows whose tests have all been deleted or moved stay at zero
+    group = (f"GROUP BY {', '.join(keys)} HAVING SUM(r.test_count) > 0 ORDER BY {', '.join(keys)}"
+             if keys else "")
+    rows = get_conn().execute(f"""
+        SELECT {''.join(k + ', ' for k in keys)}COALESCE(SUM(r.test_count), 0),
+               ROUND(COALESCE(SUM(r.revenue), 0), 2)
+        FROM test_rollup r
+        WHERE r.test_date BETWEEN ? AND ?
+        {group}
+    """, (date_from, date_to)).fetchall()
+    return header, rows
+
+def export_report_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+# =========================
+# Bulk Patient Import
+# =========================
+IMPORT_CHUNK_ROWS = 5000
+# accepted spellings of the census file's column headers
+PATIENT_HEADER_ALIASES = {
+    "barcode": "barcode_data", "barcode_data": "barcode_data",
+    "ward": "ward",
+    "name": "name", "patient_name": "name",
+    "ic": "ic_number", "ic_number": "ic_number", "ic_no": "ic_number",
+}
+# columns a census file must have, with the header named in the error
+PATIENT_REQUIRED_COLUMNS = {"barcode_data": "Barcode", "name": "Name"}
+
+def read_patient_rows(path):
+    """Yield (line number, {column: value}) from a CSV or XLSX census file, streaming.
+
+    Every row has a key for each recognised column in the header and none
+    for columns the file lacks. A header without the required columns
+    raises ValueError before any row is read.
+    """
+    def columns(header):
+        cols = [PATIENT_HEADER_ALIASES.get(str(h or "").strip().lower().replace(" ", "_"))
+                for h in header]
+        missing = [label for c, label in PATIENT_REQUIRED_COLUMNS.items() if c not in cols]
+        if missing:
+            unknown = [str(h) for h, c in zip(header, cols) if h is not None and str(h).strip() and not c]
+            msg = f"census file has no {' or '.join(missing)} column"
+            if unknown:
+                msg += f" (unrecognised headers: {', '.join(map(repr, unknown))})"
+            raise ValueError(msg)
+        return cols
+
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook  # only needed for Excel files
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            cols = columns(next(rows, ()))
+            for line, values in enumerate(rows, start=2):
+                yield line, {c: v for c, v in itertools.zip_longest(cols, values) if c}
+        finally:
+            wb.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            cols = columns(next(reader, []))
+            for values in reader:
+                yield reader.line_num, {c: v for c, v in itertools.zip_longest(cols, values) if c}
+
+def validate_patient_row(row):
+    """(barcode, ward, name, ic) to import, or raise ValueError with the reason.
+
+    Columns the file does not have come back as None, which leaves the
+    stored value alone (see _IMPORT_PATIENT_SQL).
+    """
+    def text(key):
+        if key not in row:
+            return None
+        value = row[key]
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # Excel stores long numbers (barcodes, ICs) as floats
+        return "" if value is None else str(value).strip()
+
+    barcode = text("barcode_data")
+    if not barcode:
+        raise ValueError("missing barcode")
+    if not all(" " <= ch <= "~" for ch in barcode):
+        raise ValueError("barcode must be printable ASCII")
+    ic = text("ic_number")  # stored as given, like upsert_patient; search ignores dashes
+    if ic and not ic.replace("-", "").isalnum():
+        raise ValueError("bad IC number")
+    return barcode, text("ward"), text("name"), ic
+
+def import_patients(path, rejects_path=None, chunk_rows=IMPORT_CHUNK_ROWS):
+    """Upsert every valid row of a census file in one transaction, chunk by chunk.
+
+    Rows that fail validation go to rejects_path (default <path>.rejected.csv)
+    with their line number and reason. Columns the file lacks keep their
+    stored values. Returns counts and rows/sec.
+
+    The patient search and rollup triggers are dropped inside the transaction
+    and each chunk is re-indexed and re-rolled-up with set-based statements,
+    several times faster than the triggers' row-by-row updates; a failed
+    import rolls back to the old triggers.
+    """
+    rejects_path = rejects_path or path + ".rejected.csv"
+    conn = get_conn()
+    started = time.perf_counter()
+    imported = rejected = 0
+    chunk = []
+    rows = read_patient_rows(path)
+    first = next(rows, None)  # checks the header before anything is written
+    with open(rejects_path, "w", newline="", encoding="utf-8") as rej_file:
+        rejects = csv.writer(rej_file)
+        rejects.writerow(["line", "reason", "barcode_data", "ward", "name", "ic_number"])
+        with conn:
+            conn.execute("BEGIN")  # before the DDL, which would otherwise autocommit
+            for name in [*PATIENT_SEARCH_TRIGGERS, *PATIENT_ROLLUP_TRIGGERS]:
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            for line, row in itertools.chain([first] if first else [], rows):
+                try:
+                    chunk.append(validate_patient_row(row))
+                except ValueError as e:
+                    rejected += 1
+                    rejects.writerow([line, e] + [row.get(c, "") for c in
+                                                  ("barcode_data", "ward", "name", "ic_number")])
+                    continue
+                if len(chunk) >= chunk_rows:
+                    imported += _upsert_patients(conn, chunk)
+                    chunk = []
+            imported += _upsert_patients(conn, chunk)
+            for sql in [*PATIENT_SEARCH_TRIGGERS.values(), *PATIENT_ROLLUP_TRIGGERS.values()]:
+                conn.execute(sql)
+    if not rejected:
+        os.remove(rejects_path)
+    elapsed = time.perf_counter() - started
+    return {
+        "imported": imported,
+        "rejected": rejected,
+        "rejects_path": rejects_path if rejected else None,
+        "seconds": elapsed,
+        "rows_per_sec": imported / elapsed if elapsed else 0.0,
+    }
+
+# like _UPSERT_PATIENT_SQL, but a None (column not in the census file) keeps
+# the stored value instead of blanking it
+_IMPORT_PATIENT_SQL = """
+    INSERT INTO patients (barcode_data, ward, name, ic_number)
+    VALUES (?1, COALESCE(?2, ''), COALESCE(?3, ''), COALESCE(?4, ''))
+    ON CONFLICT(barcode_data) DO UPDATE SET
+        ward=COALESCE(?2, ward), name=COALESCE(?3, name), ic_number=COALESCE(?4, ic_number)
+"""
+
+# the chunk's tests counted in (+1) or out (-1) of test_rollup under their
+# patients' wards at the time
+_IMPORT_ROLLUP_SQL = """
+    INSERT INTO test_rollup (test_date, test_name, ward, test_count, revenue)
+    SELECT COALESCE(t.test_date, ''), COALESCE(t.test_name, ''), COALESCE(p.ward, ''),
+           ?2 * COUNT(*), ?2 * COALESCE(SUM(t.price), 0)
+    FROM tests t LEFT JOIN patients p ON p.barcode_data = t.barcode_data
+    WHERE t.barcode_data IN (SELECT value FROM json_each(?1))
+    GROUP BY 1, 2, 3
+    ON CONFLICT (test_date, test_name, ward) DO UPDATE SET
+        test_count = test_count + excluded.test_count, revenue = revenue + excluded.revenue
+"""
+
+def _upsert_patients(conn, rows):
+    """Upsert rows and bring patients_fts and test_rollup up to date for them (triggers dropped)."""
+    barcodes = json.dumps([row[0] for row in rows])
+    conn.execute("""
+        INSERT INTO patients_fts (patients_fts, rowid, barcode_data, name, ic_number)
+        SELECT 'delete', id, barcode_data, name, replace(replace(ic_number, '-', ''), ' ', '')
+        FROM patients WHERE barcode_data IN (SELECT value FROM json_each(?))
+    """, (barcodes,))
+    conn.execute(_IMPORT_ROLLUP_SQL, (barcodes, -1))
+    conn.executemany(_IMPORT_PATIENT_SQL, rows)
+    conn.execute(_IMPORT_ROLLUP_SQL, (barcodes, 1))
+    conn.execute("""
+        INSERT INTO patients_fts (rowid, barcode_data, name, ic_number)
+        SELECT id, barcode_data, name, replace(replace(ic_number, '-', ''), ' ', '')
+        FROM patients WHERE barcode_data IN (SELECT value FROM json_each(?))
+    """, (barcodes,))
+    return len(rows)
+
+# =========================
+# Barcode Rendering
+# =========================
+def code128_values(data):
+    """Code128 symbol values (start .. check digit) using subsets B and C.
+
+    Digit runs switch to subset C when that saves symbols: 4+ digits at the
+    start or end of the data, 6+ in the middle; odd runs keep their first
+    digit in B.
+    """
+    if any(not " " <= ch <= "~" for ch in data):
+        raise ValueError(f"Code128 sticker data must be printable ASCII: {data!r}")
+
+    def digit_run(i):
+        j = i
+        while j < len(data) and data[j].isdigit():
+            j += 1
+        return j - i
+
+    run = digit_run(0)
+    charset = "C" if run >= 4 or (run == len(data) and run % 2 == 0 and run) else "B"
+    values = [105 if charset == "C" else 104]
+    i = 0
+    while i < len(data):
+        run = digit_run(i)
+        if charset == "B":
+            edge = i == 0 or i + run == len(data)
+            if run >= (4 if edge else 6):
+                if run % 2:
+                    values.append(ord(data[i]) - 32)
+                    i += 1
+                values.append(99)  # CODE C
+                charset = "C"
+                continue
+            values.append(ord(data[i]) - 32)
+            i += 1
+        elif run >= 2:
+            values.append(int(data[i:i + 2]))
+            i += 2
+        else:
+            values.append(100)  # CODE B
+            charset = "B"
+    values.append((values[0] + sum(i * v for i, v in enumerate(values[1:], start=1))) % 103)
+    return values
+
+def code128_modules(data):
+    """Code128 bar pattern as a '1'/'0' module string (start .. stop, no quiet zone)."""
+    # the 13-module stop symbol is the 11-module STOP pattern plus a 2-module end bar
+    return "".join(code128.CODES[v] for v in code128_values(data)) + code128.STOP + "11"
 
-    img = Image.open(barcode_img_path)
+def render_code128(data, width_cm=4.0, height_cm=1.0, dpi=PRINTER_DPI, quiet_modules=10):
+    """1-bit Code128 image: whole-dot modules, no text, exactly height_cm tall.
+
+    The module width is the largest whole number of dots that fits width_cm,
+    so every bar lands on the printer's dot grid without resampling.
+    """
+    modules = np.frombuffer(code128_modules(data).encode("ascii"), dtype=np.uint8) == ord("1")
+    modules = np.pad(modules, quiet_modules)
+    width_dots = int(width_cm / 2.54 * dpi)
+    module_dots = max(1, width_dots // len(modules))
+    height_dots = max(1, int(round(height_cm / 2.54 * dpi)))
+    row = ~np.repeat(modules, module_dots)  # True = white paper
+    return Image.fromarray(np.broadcast_to(row, (height_dots, row.size)))
+
+@lru_cache(maxsize=STICKER_CACHE_SIZE)
+def _barcode_png_bytes(data, width_cm, height_cm):
+    out = BytesIO()
+    render_code128(data, width_cm, height_cm).save(out, format="PNG")
+    return out.getvalue()
+
+def barcode_png(data, width_cm=4.0, height_cm=1.0):
+    """PNG stream of render_code128(); reprints of the same barcode come from cache."""
+    return BytesIO(_barcode_png_bytes(data, width_cm, height_cm))
+
+def render_barcode_png(barcode_data, crop_keep=0.3):
+    """Code128 PNG via python-barcode's ImageWriter, cropped to its top crop_keep.
+
+    Superseded by render_code128(); kept as the reference rendering.
+    """
+    raw = BytesIO()
+    Code128(barcode_data, writer=ImageWriter()).write(raw)
+    raw.seek(0)
+    img = Image.open(raw)
     width, height = img.size
-    cropped_img = img.crop((0, 0, width, int(height * CROP_KEEP)))
-    cropped_img.save(barcode_cropped_path)
+    out = BytesIO()
+    img.crop((0, 0, width, int(height * crop_keep))).save(out, format="PNG")
+    out.seek(0)
+    return out
 
-    doc = Document()
-    section = doc.sections[0]
-    section.page_width = Cm(5.5)
-    section.page_height = Cm(2)
-    section.top_margin = Cm(0)
-    section.bottom_margin = Cm(0)
-    section.left_margin = Cm(0)
-    section.right_margin = Cm(0)
+# =========================
+# Sticker Printing (DOCX flow)
+# =========================
+def add_sticker(doc, barcode_data, ward, name, ic_number,
+                CROP_KEEP=0.3, BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0,
+                new_page=False):
+    """Append one sticker paragraph to doc (on a fresh page if new_page).
+
+    CROP_KEEP is still accepted from older callers but no longer used: the
+    bars are rendered at their final height, so there is nothing to crop.
+    """
+    bars = barcode_png(barcode_data, BARCODE_WIDTH_CM, BARCODE_HEIGHT_CM)
 
     p = doc.add_paragraph()
     p.alignment = 1  # center
     p.paragraph_format.space_before = Pt(0)
     p.paragraph_format.space_after = Pt(0)
     p.paragraph_format.line_spacing = 0.8
+    p.paragraph_format.page_break_before = new_page
 
     run = p.add_run()
-    run.add_picture(barcode_cropped_path, width=Cm(BARCODE_WIDTH_CM), height=Cm(BARCODE_HEIGHT_CM))
+    run.add_picture(bars, width=Cm(BARCODE_WIDTH_CM), height=Cm(BARCODE_HEIGHT_CM))
 
     run.add_break()
     bold_run = p.add_run(barcode_data)
@@ -189,13 +1099,13 @@ def print_sticker(barcode_data, ward, name, ic_number,
     bold_run.bold = True
     bold_run._element.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
 
-    normal_run = p.add_run(f" ({ward})")
+    normal_run = p.add_run(f" ({ward or ''})")
     normal_run.font.name = "Calibri"
     normal_run.font.size = Pt(8)
     normal_run._element.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
 
     normal_run.add_break()
-    text2 = p.add_run(name)
+    text2 = p.add_run(name or "")
     text2.font.name = "Calibri"
     text2.font.size = Pt(8)
     text2._element.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
@@ -210,26 +1120,1162 @@ def print_sticker(barcode_data, ward, name, ic_number,
     text3.font.size = Pt(8)
     text3._element.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
 
+def build_sticker_doc(records, **layout):
+    """One DOCX with a 5.5 x 2 cm page per (barcode, ward, name, IC) record.
+
+    Built from scratch with python-docx; print_stickers() uses the much
+    cheaper build_sticker_docx(), which stamps out a compiled template.
+    """
+    doc = Document()
+    section = doc.sections[0]
+    section.page_width = Cm(5.5)
+    section.page_height = Cm(2)
+    section.top_margin = Cm(0)
+    section.bottom_margin = Cm(0)
+    section.left_margin = Cm(0)
+    section.right_margin = Cm(0)
+
+    for i, (barcode_data, ward, name, ic_number) in enumerate(records):
+        add_sticker(doc, barcode_data, ward, name, ic_number, new_page=i > 0, **layout)
+    return doc
+
+# Compiled sticker template: the DOCX package is built with python-docx once
+# per barcode size, then every print job copies its parts and only patches
+# the text nodes and barcode images. Fonts live in two styles ("Sticker"
+# and "Sticker Barcode") instead of being set on each run.
+STICKER_TEMPLATE_MARKS = ("@@BARCODE@@", "@@WARD@@", "@@NAME@@", "@@LINE3@@")
+STICKER_KEEP_STYLES = {"Normal", "DefaultParagraphFont", "TableNormal", "NoList",
+                       "Sticker", "StickerBarcode"}
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def _docx_text(value):
+    return escape(_XML_INVALID.sub("", str(value)))
+
+class StickerTemplate:
+    """Sticker DOCX compiled once; render() turns records into .docx bytes."""
+
+    def __init__(self, width_cm=4.0, height_cm=1.0):
+        self.width_cm = width_cm
+        self.height_cm = height_cm
+        out = BytesIO()
+        self._compile().save(out)
+        with zipfile.ZipFile(out) as z:
+            parts = {name: z.read(name) for name in z.namelist()
+                     if not name.startswith("word/media/")}
+        document = parts.pop("word/document.xml").decode("utf-8")
+        rels = parts.pop("word/_rels/document.xml.rels").decode("utf-8")
+        # the unchanging parts, compressed once; render() appends to a copy
+        static = BytesIO()
+        with zipfile.ZipFile(static, "w", zipfile.ZIP_DEFLATED) as z:
+            for name, data in parts.items():
+                z.writestr(name, data)
+        self.static_zip = static.getvalue()
+
+        # document.xml = head + one paragraph per sticker + tail
+        start = document.index("<w:p>")
+        end = document.index("<w:sectPr")
+        self.head, self.tail = document[:start], document[end:]
+        para = document[start:end].replace("{", "{{").replace("}", "}}")
+        para = para.replace("<w:pageBreakBefore/>", "{page_break}")
+        para = re.sub(r'r:embed="[^"]+"', 'r:embed="{rid}"', para)
+        para = re.sub(r'<wp:docPr id="\d+" name="[^"]*"', '<wp:docPr id="{k}" name="Picture {k}"', para)
+        para = re.sub(r"<w:t(?: [^>]*)?>", '<w:t xml:space="preserve">', para)
+        for mark, field in zip(STICKER_TEMPLATE_MARKS, ("barcode", "ward", "name", "line3")):
+            para = para.replace(mark, "{%s}" % field)
+        self.paragraph = para
+
+        image_rel = re.search(r'<Relationship [^>]*/relationships/image"[^>]*/>', rels).group(0)
+        self.rels_head = rels.replace(image_rel, "").replace("</Relationships>", "")
+        self.image_rel = image_rel.replace("{", "{{").replace("}", "}}")
+        self.image_rel = re.sub(r'Id="[^"]+"', 'Id="{rid}"', self.image_rel)
+        self.image_rel = re.sub(r'Target="[^"]+"', 'Target="media/image{k}.png"', self.image_rel)
+
+    def _compile(self):
+        doc = Document()
+        section = doc.sections[0]
+        section.page_width = Cm(5.5)
+        section.page_height = Cm(2)
+        section.top_margin = Cm(0)
+        section.bottom_margin = Cm(0)
+        section.left_margin = Cm(0)
+        section.right_margin = Cm(0)
+
+        # only the parts and styles a sticker needs, so each copy stays small
+        for rels in (doc.part.rels, doc.part.package.rels):
+            for rId, rel in list(rels.items()):
+                if rel.reltype.rsplit("/", 1)[1] in ("stylesWithEffects", "customXml", "thumbnail"):
+                    rels.pop(rId)
+        styles = doc.styles.element
+        for child in list(styles):
+            if child.tag == qn("w:latentStyles") or (
+                    child.tag == qn("w:style") and child.get(qn("w:styleId")) not in STICKER_KEEP_STYLES):
+                styles.remove(child)
+
+        sticker = doc.styles.add_style("Sticker", WD_STYLE_TYPE.PARAGRAPH)
+        sticker.base_style = doc.styles["Normal"]
+        sticker.font.name = "Calibri"
+        sticker.font.size = Pt(8)
+        sticker.element.get_or_add_rPr().get_or_add_rFonts().set(qn('w:eastAsia'), 'Calibri')
+        fmt = sticker.paragraph_format
+        fmt.alignment = 1  # center
+        fmt.space_before = Pt(0)
+        fmt.space_after = Pt(0)
+        fmt.line_spacing = 0.8
+        barcode_style = doc.styles.add_style("Sticker Barcode", WD_STYLE_TYPE.CHARACTER)
+        barcode_style.font.size = Pt(10)
+        barcode_style.font.bold = True
+
+        p = doc.add_paragraph(style=sticker)
+        p.paragraph_format.page_break_before = True  # becomes {page_break}
+        run = p.add_run()
+        run.add_picture(BytesIO(_barcode_png_bytes("0", self.width_cm, self.height_cm)),
+                        width=Cm(self.width_cm), height=Cm(self.height_cm))
+        run.add_break()
+        barcode, ward, name, line3 = STICKER_TEMPLATE_MARKS
+        p.add_run(barcode, style=barcode_style)
+        p.add_run(f" ({ward})").add_break()
+        p.add_run(name).add_break()
+        p.add_run(line3)
+        return doc
+
+    def render(self, records):
+        stamp = datetime.now().strftime("%d/%m - %H:%M")
+        paragraphs, rels, images = [], [], []
+        for k, (barcode_data, ward, name, ic_number) in enumerate(records, 1):
+            rid = f"rIdSticker{k}"
+            paragraphs.append(self.paragraph.format(
+                page_break="<w:pageBreakBefore/>" if k > 1 else "", rid=rid, k=k,
+                barcode=_docx_text(barcode_data), ward=_docx_text(ward or ""), name=_docx_text(name or ""),
+                line3=_docx_text(f"{stamp} - IC: {ic_number}")))
+            rels.append(self.image_rel.format(rid=rid, k=k))
+            images.append(_barcode_png_bytes(barcode_data, self.width_cm, self.height_cm))
+
+        out = BytesIO(self.static_zip)
+        with zipfile.ZipFile(out, "a", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+            z.writestr("word/document.xml", self.head + "".join(paragraphs) + self.tail)
+            z.writestr("word/_rels/document.xml.rels", self.rels_head + "".join(rels) + "</Relationships>")
+            for k, png in enumerate(images, 1):
+                z.writestr(f"word/media/image{k}.png", png, zipfile.ZIP_STORED)
+        return out.getvalue()
+
+@lru_cache(maxsize=8)
+def sticker_template(width_cm=4.0, height_cm=1.0):
+    return StickerTemplate(width_cm, height_cm)
+
+def build_sticker_docx(records, CROP_KEEP=0.3, BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0):
+    """DOCX bytes with one sticker page per record, as build_sticker_doc() lays it out."""
+    return sticker_template(BARCODE_WIDTH_CM, BARCODE_HEIGHT_CM).render(records)
+
+def print_stickers(records, **layout):
+    """Print many stickers as a single job (one print handler launch)."""
+    records = list(records)
+    if not records:
+        return
+    if PRINT_SPOOLER:
+        spool_stickers(records, **layout)
+        return
+    if STICKER_FORMAT == "raster":
+        print_sticker_images(records, **layout)
+        return
+    if STICKER_FORMAT == "dpl":
+        send_raw(build_stickers_dpl(records, **layout))
+        return
     with NamedTemporaryFile(delete=False, suffix=".docx") as tmp_file:
         doc_path = tmp_file.name
-        doc.save(doc_path)
+        tmp_file.write(build_sticker_docx(records, **layout))
 
     os.startfile(doc_path, "print")
 
+def print_sticker(barcode_data, ward, name, ic_number,
+                  CROP_KEEP=0.3, BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0):
+    print_stickers([(barcode_data, ward, name, ic_number)], CROP_KEEP=CROP_KEEP,
+                   BARCODE_WIDTH_CM=BARCODE_WIDTH_CM, BARCODE_HEIGHT_CM=BARCODE_HEIGHT_CM)
+
+# =========================
+# Sticker Printing (DPL flow)
+# =========================
+# Raw Datamax DPL for the E-4204B: the printer draws the Code128 and the
+# resident fonts itself, so a sticker is a few hundred bytes instead of a
+# Word document. Positions are in 0.01" (D11, inch mode); rows count up
+# from the bottom edge of the label.
+# "raster" (1-bit bitmap through the driver), "docx" (Word + driver)
+# or "dpl" (raw printer commands)
+STICKER_FORMAT = "raster"
+
+DPL_LABEL_W = 216        # 5.5 cm
+DPL_LABEL_H = 79         # 2.0 cm
+DPL_FONT_CELL = {"2": 12, "3": 16}  # resident font -> character pitch in dots
+
+def _dpl_text(value):
+    """Field data ends at CR; keep it on one line and in 7-bit ASCII."""
+    value = "".join(ch for ch in str(value) if ch >= " ")
+    return value.encode("ascii", "replace").decode("ascii")
+
+def _dots_to_hundredths(dots):
+    return int(round(dots * 100 / PRINTER_DPI))
+
+def _cm_to_hundredths(cm):
+    return int(round(cm / 2.54 * 100))
+
+def code128_module_count(data):
+    """Width of a Code128 symbol in modules."""
+    return len(code128_modules(data))
+
+def dpl_field(font, row, col, data, rotation=1, width_mult=1, height_mult=1, height=0):
+    """One DPL record: rotation, font/barcode id, multipliers, height, row, column, data."""
+    return f"{rotation}{font}{width_mult}{height_mult}{height:03d}{row:04d}{col:04d}{data}\r\n"
+
+def _dpl_centered(width_dots):
+    return max(0, (DPL_LABEL_W - _dots_to_hundredths(width_dots)) // 2)
+
+@lru_cache(maxsize=STICKER_CACHE_SIZE)
+def _dpl_static_fields(barcode_data, ward, name, width_cm, height_cm):
+    """Everything on the sticker except the time-stamped last line."""
+    code128_values(barcode_data)  # raises, rather than printing bars for "?"
+    barcode_data = _dpl_text(barcode_data)
+    ward_text = _dpl_text(f" ({ward or ''})")
+    name = _dpl_text(name)
+
+    # widest bar module (in dots) that keeps the symbol inside the requested width
+    modules = code128_module_count(barcode_data)
+    max_w = min(_cm_to_hundredths(width_cm), DPL_LABEL_W)
+    module = next((m for m in (3, 2) if _dots_to_hundredths(modules * m) <= max_w), 1)
+    bar_row = 36
+    bar_h = min(_cm_to_hundredths(height_cm), DPL_LABEL_H - bar_row - 1)
+
+    num_w = len(barcode_data) * DPL_FONT_CELL["3"]
+    line1_w = num_w + len(ward_text) * DPL_FONT_CELL["2"]
+    line1_col = _dpl_centered(line1_w)
+
+    out = ["\x02L\r\n", "D11\r\n"]
+    out.append(dpl_field("e", bar_row, _dpl_centered(modules * module), barcode_data,
+                         width_mult=module, height_mult=module, height=bar_h))
+    out.append(dpl_field("3", 22, line1_col, barcode_data))
+    out.append(dpl_field("2", 22, line1_col + _dots_to_hundredths(num_w), ward_text))
+    out.append(dpl_field("2", 12, _dpl_centered(len(name) * DPL_FONT_CELL["2"]), name))
+    return "".join(out)
+
+def build_sticker_dpl(barcode_data, ward, name, ic_number,
+                      BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0, now=None, quantity=1, **_):
+    """DPL label format for one sticker, same layout as the DOCX sticker.
+
+    quantity prints that many copies from the one format (DPL Qnnnn).
+    """
+    now = now or datetime.now()
+    line3 = _dpl_text(f"{now.strftime('%d/%m')} - {now.strftime('%H:%M')} - IC: {ic_number}")
+    static = _dpl_static_fields(barcode_data, ward, name, BARCODE_WIDTH_CM, BARCODE_HEIGHT_CM)
+    return (static
+            + dpl_field("2", 2, _dpl_centered(len(line3) * DPL_FONT_CELL["2"]), line3)
+            + f"Q{quantity:04d}\r\nE\r\n").encode("ascii")
+
+def sticker_cache_info():
+    """Hit/miss counters of the sticker render caches (functools CacheInfo tuples)."""
+    return {"barcode_png": _barcode_png_bytes.cache_info(),
+            "dpl_static": _dpl_static_fields.cache_info(),
+            "raster_static": _raster_static.cache_info(),
+            "raster_glyphs": _sticker_glyph.cache_info()}
+
+def clear_sticker_cache():
+    _barcode_png_bytes.cache_clear()
+    _dpl_static_fields.cache_clear()
+    _raster_static.cache_clear()
+
+def build_stickers_dpl(records, **layout):
+    return b"".join(build_sticker_dpl(*rec, **layout) for rec in records)
+
+# =========================
+# Sticker Printing (raster flow)
+# =========================
+# The sticker drawn straight onto a 1-bit canvas at the printer's own
+# resolution (203 dpi here, 300 on the 300-dpi heads): bars come from
+# render_code128() on whole dots and text is drawn without anti-aliasing,
+# so nothing is resampled or dithered between here and the print head.
+# Same layout as the DOCX sticker.
+STICKER_W_CM = 5.5
+STICKER_H_CM = 2.0
+STICKER_FONTS = {False: ("calibri.ttf", "arial.ttf", "DejaVuSans.ttf"),
+                 True: ("calibrib.ttf", "arialbd.ttf", "DejaVuSans-Bold.ttf")}
+STICKER_MIN_POINTS = 5  # lines wider than the label shrink down to this size
+
+@lru_cache(maxsize=64)
+def sticker_font(points, dpi, bold=False):
+    """Calibri at `points` for this dpi, or the nearest installed fallback."""
+    size = round(points / 72 * dpi)
+    for name in STICKER_FONTS[bold]:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size)
+
+def _cm_to_dots(cm, dpi):
+    return int(round(cm / 2.54 * dpi))
+
+@lru_cache(maxsize=1024)
+def _sticker_glyph(ch, points, dpi, bold=False):
+    """(mask, dx, dy, advance) of one character, rendered by FreeType only once."""
+    font = sticker_font(points, dpi, bold)
+    left, top, right, bottom = font.getbbox(ch, mode="1", anchor="ls")
+    mask = Image.new("1", (max(1, right - left), max(1, bottom - top)), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.fontmode = "1"  # hinted, aliased glyphs: every pixel is a whole dot
+    draw.text((-left, -top), ch, fill=1, font=font, anchor="ls")
+    return mask, left, top, font.getlength(ch)
+
+def _sticker_text_width(text, points, dpi, bold=False):
+    return sum(_sticker_glyph(ch, points, dpi, bold)[3] for ch in text)
+
+def _draw_sticker_text(img, x, baseline, text, points, dpi, bold=False):
+    """Stamp text in black from cached glyphs, starting at x; returns the end x."""
+    for ch in text:
+        mask, dx, dy, advance = _sticker_glyph(ch, points, dpi, bold)
+        img.paste(0, (int(round(x)) + dx, baseline + dy), mask)
+        x += advance
+    return x
+
+def _draw_sticker_line(img, baseline, parts, dpi):
+    """Centre a line of (text, points, bold) parts, shrinking them together a
+    point at a time until the line fits the label. A line still too wide at
+    STICKER_MIN_POINTS starts at the left edge, so only its end is cut off."""
+    while True:
+        width = sum(_sticker_text_width(text, points, dpi, bold) for text, points, bold in parts)
+        if width <= img.width or min(points for _, points, _ in parts) <= STICKER_MIN_POINTS:
+            break
+        parts = [(text, points - 1, bold) for text, points, bold in parts]
+    x = max(0, (img.width - width) / 2)
+    for text, points, bold in parts:
+        x = _draw_sticker_text(img, x, baseline, text, points, dpi, bold)
+
+@lru_cache(maxsize=STICKER_CACHE_SIZE)
+def _raster_static(barcode_data, ward, name, width_cm, height_cm, dpi):
+    """Sticker image without the time-stamped last line, and that line's baseline."""
+    img = Image.new("1", (_cm_to_dots(STICKER_W_CM, dpi), _cm_to_dots(STICKER_H_CM, dpi)), 1)
+    bars = render_code128(barcode_data, width_cm, height_cm, dpi)
+    img.paste(bars, ((img.width - bars.width) // 2, 0))
+
+    pitch = round(sticker_font(8, dpi).size * 0.96)  # the DOCX sticker's 0.8 line spacing
+    y = bars.height + sticker_font(10, dpi, True).getmetrics()[0]
+    _draw_sticker_line(img, y, [(barcode_data, 10, True), (f" ({ward or ''})", 8, False)], dpi)
+    y += pitch
+    _draw_sticker_line(img, y, [(name or "", 8, False)], dpi)
+    return img, y + pitch
+
+def render_sticker_image(barcode_data, ward, name, ic_number,
+                         BARCODE_WIDTH_CM=4.0, BARCODE_HEIGHT_CM=1.0, dpi=PRINTER_DPI, now=None, **_):
+    """The sticker as a mode "1" PIL image, one pixel per printer dot."""
+    now = now or datetime.now()
+    static, baseline = _raster_static(barcode_data, ward, name, BARCODE_WIDTH_CM, BARCODE_HEIGHT_CM, dpi)
+    img = static.copy()
+    _draw_sticker_line(img, baseline, [(f"{now.strftime('%d/%m')} - {now.strftime('%H:%M')} - IC: {ic_number}",
+                                        8, False)], dpi)
+    return img
+
+def sticker_png(barcode_data, ward, name, ic_number, **layout):
+    """1-bit PNG of render_sticker_image(), for on-screen previews."""
+    out = BytesIO()
+    render_sticker_image(barcode_data, ward, name, ic_number, **layout).save(out, format="PNG")
+    return out.getvalue()
+
+def print_sticker_images(records, printer_name=PRINTER_NAME, job_name="LIS Stickers", **layout):
+    """Print stickers as 1-bit bitmaps through the Windows driver, one page each.
+
+    Each image is rendered at the driver's own resolution and drawn 1:1, so
+    the driver has nothing to scale. The driver's page must be set to the
+    5.5 x 2 cm label.
+    """
+    import win32con
+    import win32ui
+    from PIL import ImageWin
+    dc = win32ui.CreateDC()
+    dc.CreatePrinterDC(printer_name)
+    try:
+        dpi = dc.GetDeviceCaps(win32con.LOGPIXELSX)
+        dc.StartDoc(job_name)
+        for rec in records:
+            img = render_sticker_image(*rec, dpi=dpi, **layout)
+            dc.StartPage()
+            ImageWin.Dib(img).draw(dc.GetHandleOutput(), (0, 0, img.width, img.height))
+            dc.EndPage()
+        dc.EndDoc()
+    finally:
+        dc.DeleteDC()
+
+# =========================
+# Printer Transports
+# =========================
+# Where raw printer bytes (DPL) go. PRINTER_URI picks the backend:
+#   win32:<printer name>   RAW job through the Windows spooler
+#   tcp://host[:9100]      raw socket to the printer's network port
+#   lp:<cups queue>        CUPS `lp -o raw` pipe
+#   file:<path>            append to a file (or a device node)
+PRINTER_URI = f"win32:{PRINTER_NAME}"
+
+class Transport:
+    """open() starts a job/connection, write() may be called many times, close() ends it."""
+
+    def send(self, data, job_name="LIS Stickers"):
+        self.open(job_name)
+        try:
+            self.write(data)
+        finally:
+            self.close()
+
+class Win32RawTransport(Transport):
+    def __init__(self, printer_name):
+        self.printer_name = printer_name
+        self.handle = None
+
+    def open(self, job_name="LIS Stickers"):
+        import win32print
+        self.handle = win32print.OpenPrinter(self.printer_name)
+        win32print.StartDocPrinter(self.handle, 1, (job_name, None, "RAW"))
+        win32print.StartPagePrinter(self.handle)
+
+    def write(self, data):
+        import win32print
+        win32print.WritePrinter(self.handle, data)
+
+    def close(self):
+        import win32print
+        if self.handle is None:
+            return
+        try:
+            win32print.EndPagePrinter(self.handle)
+            win32print.EndDocPrinter(self.handle)
+        finally:
+            win32print.ClosePrinter(self.handle)
+            self.handle = None
+
+class TcpTransport(Transport):
+    def __init__(self, host, port=9100, timeout=10.0):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.sock = None
+
+    def open(self, job_name=None):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class LpTransport(Transport):
+    def __init__(self, destination):
+        self.destination = destination
+        self.proc = None
+
+    def open(self, job_name="LIS Stickers"):
+        self.proc = subprocess.Popen(["lp", "-d", self.destination, "-o", "raw", "-t", job_name],
+                                     stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    def write(self, data):
+        self.proc.stdin.write(data)
+
+    def close(self):
+        if self.proc is None:
+            return
+        proc, self.proc = self.proc, None
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+class FileTransport(Transport):
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def open(self, job_name=None):
+        self.file = open(self.path, "ab")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def open_transport(uri=None):
+    """Transport for a printer URI (see PRINTER_URI)."""
+    uri = uri or PRINTER_URI
+    scheme, _, rest = uri.partition(":")
+    if scheme == "win32":
+        return Win32RawTransport(rest)
+    if scheme == "tcp":
+        host, _, port = rest.lstrip("/").partition(":")
+        return TcpTransport(host, int(port or 9100))
+    if scheme == "lp":
+        return LpTransport(rest)
+    if scheme == "file":
+        return FileTransport(rest)
+    raise ValueError(f"Unknown printer URI: {uri!r}")
+
+def send_raw(data, printer_uri=None, job_name="LIS Stickers"):
+    """Send raw bytes straight to the printer (no driver rendering)."""
+    open_transport(printer_uri).send(data, job_name)
+
+class PrinterSession:
+    """Long-lived printer connection that pipelines many labels into few writes.
+
+    Labels are buffered and written as one block once max_bytes is reached
+    or max_delay seconds after the first buffered label, whichever comes
+    first. The connection (or spooler job) stays open until close().
+
+    A flush that fails on the timer thread leaves its labels buffered and
+    raises its error from the next add(), flush() or close(); call flush()
+    to retry them or discard() to drop them.
+    """
+
+    def __init__(self, printer_uri=None, max_bytes=64 * 1024, max_delay=0.2,
+                 job_name="LIS Stickers"):
+        self.transport = open_transport(printer_uri)
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.job_name = job_name
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.buffered_labels = 0
+        self.timer = None
+        self.error = None
+        self.is_open = False
+        self.started = None
+        self.bytes_sent = 0
+        self.labels_sent = 0
+        self.flushes = 0
+
+    def add(self, label, labels=1):
+        """Queue one DPL label format (printing `labels` stickers via its Q count)."""
+        with self.lock:
+            self._raise_error_locked()
+            if self.started is None:
+                self.started = time.perf_counter()
+            self.buffer += label
+            self.buffered_labels += labels
+            if len(self.buffer) >= self.max_bytes:
+                self._flush_locked()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.max_delay, self._timed_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def add_sticker(self, barcode_data, ward, name, ic_number, copies=1, **layout):
+        self.add(build_sticker_dpl(barcode_data, ward, name, ic_number, quantity=copies, **layout),
+                 labels=copies)
+
+    def flush(self):
+        with self.lock:
+            self._raise_error_locked()
+            self._flush_locked()
+
+    def _timed_flush(self):
+        with self.lock:
+            try:
+                self._flush_locked()
+            except Exception as e:
+                # nobody is waiting on the timer thread: hand the error to the caller
+                self.error = e
+
+    def _raise_error_locked(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _flush_locked(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        try:
+            self._write(data)
+        except OSError:
+            # dropped connection: reopen once and resend the whole block. The
+            # transports cannot tell how much of a failed write reached the
+            # printer, so labels it had already received may print twice;
+            # each DPL label is a complete format, so none prints garbled
+            self._close_transport()
+            self._write(data)
+        self.bytes_sent += len(data)
+        self.labels_sent += self.buffered_labels
+        self.flushes += 1
+        self.buffer.clear()
+        self.buffered_labels = 0
+
+    def _write(self, data):
+        if not self.is_open:
+            self.transport.open(self.job_name)
+            self.is_open = True
+        self.transport.write(data)
+
+    def _close_transport(self):
+        if self.is_open:
+            self.is_open = False
+            self.transport.close()
+
+    def close(self):
+        with self.lock:
+            try:
+                self._raise_error_locked()
+                self._flush_locked()
+            finally:
+                self._close_transport()
+
+    def discard(self):
+        """Drop buffered labels and the connection without sending, e.g. after a failed flush."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.error = None
+            self.buffer.clear()
+            self.buffered_labels = 0
+            try:
+                self._close_transport()
+            except OSError:
+                pass
+
+    def metrics(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            "bytes": self.bytes_sent,
+            "labels": self.labels_sent,
+            "flushes": self.flushes,
+            "seconds": elapsed,
+            "bytes_per_sec": self.bytes_sent / elapsed if elapsed else 0.0,
+            "labels_per_sec": self.labels_sent / elapsed if elapsed else 0.0,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# =========================
+# Print Spooler Client
+# =========================
+# With PRINT_SPOOLER set ("host:port" of print_spooler.py), print_stickers()
+# hands DPL jobs to the shared spooler instead of opening the printer itself.
+# The protocol is one JSON object per line each way.
+PRINT_SPOOLER = None
+SPOOLER_PORT = 9200
+
+class SpoolerClient:
+    """One connection to print_spooler.py; not shared between threads."""
+
+    def __init__(self, address=None, timeout=60.0):
+        host, _, port = (address or PRINT_SPOOLER or "127.0.0.1").partition(":")
+        self.sock = socket.create_connection((host, int(port or SPOOLER_PORT)), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rwb")
+
+    def request(self, **req):
+        self.file.write(json.dumps(req).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("print spooler closed the connection")
+        reply = json.loads(line)
+        if "error" in reply and "job" not in reply:
+            raise RuntimeError(f"print spooler: {reply['error']}")
+        return reply
+
+    def submit(self, records, printer="default", copies=1, wait=False, **layout):
+        """Queue stickers on a printer; with wait=True, reply once printed or failed."""
+        return self.request(cmd="print", printer=printer, records=[list(r) for r in records],
+                            copies=copies, layout=layout, wait=wait)
+
+    def status(self):
+        return self.request(cmd="status")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def spool_stickers(records, printer="default", copies=1, **layout):
+    """Print through PRINT_SPOOLER and wait for the result; raises if the job failed."""
+    with SpoolerClient() as client:
+        reply = client.submit(records, printer, copies, wait=True, **layout)
+    if reply.get("state") != "done":
+        raise RuntimeError(f"print job {reply.get('job')} failed: {reply.get('error')}")
+    return reply
+
+# =========================
+# Background Printing
+# =========================
+class PrintWorker:
+    """Prints sticker jobs on a background thread, in submission order.
+
+    submit() returns at once with a job id; finished jobs are collected with
+    poll() as (job_id, error) pairs, error being None on success. The GUI
+    polls from after() so Tk is only ever touched on the main thread.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or print_stickers
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self._ids = itertools.count(1)
+        self._thread = threading.Thread(target=self._run, name="print-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, records, done=None):
+        """done(job_id, error), if given, is called on the print thread when
+        the job finishes, before the result reaches poll()."""
+        job_id = next(self._ids)
+        self.jobs.put((job_id, list(records), done))
+        return job_id
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def poll(self):
+        done = []
+        while True:
+            try:
+                done.append(self.results.get_nowait())
+            except queue.Empty:
+                return done
+
+    def stop(self, wait=True):
+        """Finish the jobs already queued, then end the thread."""
+        self.jobs.put(None)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            job_id, records, done = job
+            try:
+                self.backend(records)
+            except Exception as e:
+                error = e
+            else:
+                error = None
+            if done is not None:
+                done(job_id, error)
+            self.results.put((job_id, error))
+
+# =========================
+# Remote Backend
+# =========================
+# LISApp talks to the data layer through a backend object: this module for a
+# local lis.db, or RemoteLIS for a shared lis_server.py on the network. Both
+# offer the same functions with the same return shapes.
+REMOTE_TIMEOUT = 10.0  # seconds per request
+# operations with no side effects, safe to send twice
+REMOTE_READS = frozenset({"get_patient", "search_patients", "list_tests", "list_tests_page",
+                          "test_totals", "get_current_price", "get_all_prices", "revenue_report"})
+
+class RemoteError(Exception):
+    """The LIS server rejected a request or could not run it."""
+
+class RemoteLIS:
+    """Client for lis_server.py's JSON API, one keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=REMOTE_TIMEOUT):
+        parts = urlsplit(url if "//" in url else "http://" + url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def call(self, op, **kwargs):
+        body = json.dumps(kwargs).encode()
+        while True:
+            conn = self._conn()
+            reused = conn.sock is not None
+            if reused and select.select([conn.sock], [], [], 0)[0]:
+                # an idle keep-alive socket only turns readable when the server
+                # has closed it (e.g. it restarted): reconnect before sending
+                conn.close()
+                reused = False
+            sent = False
+            try:
+                conn.request("POST", f"/api/{op}", body, {"Content-Type": "application/json"})
+                sent = True
+                resp = conn.getresponse()
+                payload = json.loads(resp.read() or b"null")
+                break
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                # retry once on a reused connection that turned out dead. Reads
+                # are safe to repeat; a write is only repeated if sending it
+                # failed, since once sent the server may already have committed
+                # it (an add_test retried then would bill the test twice)
+                if not reused or (sent and op not in REMOTE_READS):
+                    raise
+        if resp.status == 400:
+            raise ValueError(payload["error"])
+        if resp.status != 200:
+            raise RemoteError(f"{op}: {payload['error'] if payload else resp.reason}")
+        return payload["result"]
+
+    def status(self):
+        """The server's /status: writer batching counters and queue depth."""
+        conn = self._conn()
+        conn.request("GET", "/status")
+        return json.loads(conn.getresponse().read())["result"]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- patients ---
+    def get_patient(self, barcode_data):
+        row = self.call("get_patient", barcode_data=barcode_data)
+        return tuple(row) if row else None
+
+    def upsert_patient(self, barcode_data, ward, name, ic_number):
+        self.call("upsert_patient", barcode_data=barcode_data, ward=ward, name=name, ic_number=ic_number)
+
+    def search_patients(self, text, limit=SEARCH_LIMIT):
+        return [tuple(r) for r in self.call("search_patients", text=text, limit=limit)]
+
+    # --- tests ---
+    def add_test(self, barcode_data, test_name, test_date, result, price_snapshot):
+        return self.call("add_test", barcode_data=barcode_data, test_name=test_name,
+                         test_date=test_date, result=result, price_snapshot=price_snapshot)
+
+    def update_test(self, test_id, test_name, test_date, result, price_snapshot=None):
+        self.call("update_test", test_id=test_id, test_name=test_name, test_date=test_date,
+                  result=result, price_snapshot=price_snapshot)
+
+    def delete_test(self, test_id):
+        self.call("delete_test", test_id=test_id)
+
+    def list_tests(self, barcode_data):
+        return [tuple(r) for r in self.call("list_tests", barcode_data=barcode_data)]
+
+    def list_tests_page(self, barcode_data, after=None, before=None, limit=TESTS_PAGE_SIZE):
+        return [tuple(r) for r in self.call("list_tests_page", barcode_data=barcode_data,
+                                            after=after, before=before, limit=limit)]
+
+    def test_totals(self, barcode_data):
+        return tuple(self.call("test_totals", barcode_data=barcode_data))
+
+    # --- prices ---
+    def get_current_price(self, test_name):
+        return self.call("get_current_price", test_name=test_name)
+
+    def get_all_prices(self):
+        return self.call("get_all_prices")
+
+    def set_all_prices(self, price_dict):
+        self.call("set_all_prices", price_dict=price_dict)
+
+    # --- reports ---
+    def add_tests_bulk(self, barcodes, test_name, test_date, result=""):
+        ordered, missing, price = self.call("add_tests_bulk", barcodes=list(barcodes), test_name=test_name,
+                                            test_date=test_date, result=result)
+        return [tuple(p) for p in ordered], missing, price
+
+    def revenue_report(self, date_from, date_to, group_by=("test",)):
+        header, rows = self.call("revenue_report", date_from=date_from, date_to=date_to, group_by=list(group_by))
+        return header, [tuple(r) for r in rows]
+
+# =========================
+# Background Search
+# =========================
+class SearchWorker:
+    """Runs search_patients() on a background thread, newest query wins.
+
+    submit() replaces any query that has not started yet, so typing faster
+    than the searches finish never builds a backlog. poll() returns
+    (text, rows) once the latest submitted query has finished, else None.
+    """
+
+    def __init__(self, search=None):
+        self.search = search or search_patients
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._pending = None  # (seq, text) not yet picked up
+        self._result = None   # (seq, text, rows) of the last finished query
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="patient-search", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        with self._cond:
+            self._seq += 1
+            self._pending = (self._seq, text)
+            self._cond.notify()
+
+    def poll(self):
+        with self._cond:
+            if self._result is None or self._result[0] != self._seq:
+                return None
+            _, text, rows = self._result
+            self._result = None
+            return text, rows
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while self._pending is None and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    seq, text = self._pending
+                    self._pending = None
+                try:
+                    rows = self.search(text)
+                except sqlite3.Error:
+                    rows = []
+                with self._cond:
+                    self._result = (seq, text, rows)
+        finally:
+            close_conn()  # this thread's connection
+
+# =========================
+# Barcode Scanning
+# =========================
+# Keyboard-wedge scanners "type" the barcode into e_barcode a few ms per
+# character and finish with Enter (or Tab, depending on the scanner setup).
+# People are far slower, so key timing alone tells the two apart.
+SCAN_MAX_GAP_MS = 40      # slowest key-to-key gap still counted as a scanner
+SCAN_MIN_LENGTH = 4       # shorter bursts are treated as typing
+SCAN_TERMINATORS = ("Return", "KP_Enter", "Tab")
+SCAN_AUTO_PRINT = False   # print the sticker as soon as a scanned patient is found
+SCAN_IGNORED_KEYS = {"Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R",
+                     "Caps_Lock", "Num_Lock"}  # scanners press Shift for capitals
+
+class ScanDetector:
+    """Tells keyboard-wedge scanner bursts from typing.
+
+    key() is fed every key press in the barcode field with the event time in
+    ms. At least SCAN_MIN_LENGTH characters each within SCAN_MAX_GAP_MS of
+    the last, ended by a terminator within the same gap, make a scan: key()
+    then returns (barcode, started), started being the perf_counter() of the
+    first character. Everything else returns None.
+    """
+
+    def __init__(self, max_gap_ms=SCAN_MAX_GAP_MS, min_length=SCAN_MIN_LENGTH,
+                 terminators=SCAN_TERMINATORS):
+        self.max_gap_ms = max_gap_ms
+        self.min_length = min_length
+        self.terminators = terminators
+        self.chars = []
+        self.last = None     # event time of the previous key
+        self.started = None
+
+    def key(self, keysym, char, time_ms):
+        if keysym in SCAN_IGNORED_KEYS:
+            return None
+        # event times wrap after ~49 days; a negative gap just counts as slow
+        fast = self.last is not None and 0 <= time_ms - self.last <= self.max_gap_ms
+        self.last = time_ms
+        if keysym in self.terminators:
+            scan = "".join(self.chars) if fast and len(self.chars) >= self.min_length else None
+            self.chars = []
+            self.last = None
+            return (scan, self.started) if scan else None
+        if not char or not char.isprintable():
+            self.chars = []  # editing keys end any burst
+            self.last = None
+            return None
+        if not fast:
+            self.chars = []
+            self.started = time.perf_counter()
+        self.chars.append(char)
+        return None
+
+class LatencyStats:
+    """Recent latencies per stage (seconds), recorded from any thread."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+            del self.samples[stage][:-self.window]
+
+    def summary(self):
+        """{stage: {"n", "p50_ms", "p99_ms", "max_ms"}} over the recent samples."""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        return {stage: {"n": len(v),
+                        "p50_ms": round(v[len(v) // 2] * 1000, 1),
+                        "p99_ms": round(v[min(len(v) - 1, int(len(v) * 0.99))] * 1000, 1),
+                        "max_ms": round(v[-1] * 1000, 1)}
+                for stage, v in samples.items() if v}
+
+class PatientLoader:
+    """Loads a patient and their first page of tests on a background thread.
+
+    submit() queues a load and returns at once; poll() returns the finished
+    ones as (barcode, tag, patient, rows, totals, error). With a printer, a
+    found patient's sticker is queued the moment the record is read, so the
+    label is on its way while the tests are still being fetched. `tag` is
+    passed through untouched (the GUI uses it for the scan start time).
+    """
+
+    def __init__(self, db=None):
+        self.db = db or sys.modules[__name__]
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="patient-loader", daemon=True)
+        self._thread.start()
+
+    def submit(self, barcode, tag=None, printer=None, printed=None):
+        """printer: a PrintWorker to queue the sticker on; printed(job_id, error)
+        is then called on the print thread once the job is done."""
+        self.jobs.put((barcode, tag, printer, printed))
+
+    def pending(self):
+        return self.jobs.qsize()
+
+    def poll(self):
+        done = []
+        while True:
+            try:
+                done.append(self.results.get_nowait())
+            except queue.Empty:
+                return done
+
+    def stop(self):
+        self.jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                barcode, tag, printer, printed = job
+                patient = rows = totals = None
+                try:
+                    patient = self.db.get_patient(barcode)
+                    if patient:
+                        if printer is not None and patient[2]:
+                            printer.submit([tuple(v or "" for v in patient)], done=printed)
+                        rows = self.db.list_tests_page(barcode)
+                        totals = self.db.test_totals(barcode)
+                except Exception as e:  # sqlite3.Error, or RemoteError/OSError remotely
+                    self.results.put((barcode, tag, patient, rows, totals, e))
+                else:
+                    self.results.put((barcode, tag, patient, rows, totals, None))
+        finally:
+            close_conn()  # this thread's connection
+
 # =========================
 # GUI (Tkinter) – previous layout, but grid inside right frame
 # =========================
+def test_row_values(row):
+    rid, name, date, result, price = row
+    return (rid, name, date, result, f"{float(price or 0.0):.2f}")
+
+def diff_test_rows(shown, rows):
+    """Tree edits turning `shown` ({iid: values}) into `rows` (list_tests order).
+
+    Returns (removed, updated, inserted): iids to delete, {iid: values} to
+    change in place, and (index, iid, values) to insert in ascending index
+    order. Rows whose date changed move, so they are deleted and re-inserted;
+    everything else keeps its relative order and stays where it is.
+    """
+    new = {str(row[0]): test_row_values(row) for row in rows}
+    removed = [iid for iid, vals in shown.items()
+               if iid not in new or new[iid][2] != vals[2]]
+    gone = set(removed)
+    updated = {iid: vals for iid, vals in new.items()
+               if iid in shown and iid not in gone and shown[iid] != vals}
+    inserted = [(index, str(row[0]), new[str(row[0])]) for index, row in enumerate(rows)
+                if str(row[0]) not in shown or str(row[0]) in gone]
+    return removed, updated, inserted
+
 class LISApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, backend=None):
         super().__init__()
-        self.title("Mini LIS - Patients & Tests")
-        self.geometry("1200x600")
+        # data layer: this module for the local lis.db, or a RemoteLIS
+        self.db = backend or sys.modules[__name__]
+        self.remote = backend is not None
+        self.title("Mini LIS - Patients & Tests" + (f" ({backend.host})" if self.remote else ""))
+        self.geometry("1200x650")
         self.resizable(False, False)
         self.selected_test_id = None
+        # tests_tree shows a sliding window of the patient's tests, paged in on scroll
+        self.shown_barcode = None  # patient whose tests are in tests_tree
+        self.shown_tests = {}      # tree iid (test id) -> displayed values
+        self.window_rows = []      # rows in tests_tree, list_tests() order
+        self.window_after = None   # (test_date, id) just above the window; None = at the top
+        self.window_at_end = True  # window reaches the oldest test
+        self.paging = False
+        self.print_queue = []  # (barcode, ward, name, ic) awaiting a batch print
+        self.printer = PrintWorker()
+        self.searcher = SearchWorker(self.db.search_patients)
+        self.search_after = None  # pending debounce timer
+        self.search_rows = []     # patients listed in the search dropdown
+        self.search_polling = False
+        self.scanner = ScanDetector()
+        self.loader = PatientLoader(self.db)
+        self.loads_pending = 0
+        self.scan_stats = LatencyStats()
+        self.auto_print = tk.BooleanVar(value=SCAN_AUTO_PRINT)
+
+        menubar = tk.Menu(self)
+        file_menu = tk.Menu(menubar, tearoff=False)
+        file_menu.add_command(label="Import Patients (CSV/Excel)...", command=self.import_patients_dialog)
+        file_menu.add_separator()
+        file_menu.add_checkbutton(label="Print Sticker on Scan", variable=self.auto_print)
+        menubar.add_cascade(label="File", menu=file_menu)
+        tests_menu = tk.Menu(menubar, tearoff=False)
+        tests_menu.add_command(label="Bulk Order...", command=self.open_bulk_order_dialog)
+        menubar.add_cascade(label="Tests", menu=tests_menu)
+        menubar.add_command(label="Reports", command=self.open_reports_window)
+        self.config(menu=menubar)
+
+        # Search box (top-left); matches drop down below it as you type
+        frm_find = ttk.Frame(self)
+        frm_find.place(x=10, y=10, width=460, height=40)
+        ttk.Label(frm_find, text="Find patient:").pack(side="left", padx=6)
+        self.e_search = ttk.Entry(frm_find)
+        self.e_search.pack(side="left", fill="x", expand=True, padx=6)
+        self.e_search.bind("<KeyRelease>", self.on_search_key)
+        self.e_search.bind("<Down>", lambda e: self.focus_search_results())
+        self.e_search.bind("<Return>", lambda e: self.pick_search_result(0))
+        self.e_search.bind("<Escape>", lambda e: self.hide_search_results())
+        self.search_list = tk.Listbox(self, activestyle="dotbox")
+        self.search_list.bind("<Return>", lambda e: self.pick_search_result())
+        self.search_list.bind("<Double-Button-1>", lambda e: self.pick_search_result())
+        self.search_list.bind("<Escape>", lambda e: self.hide_search_results())
 
         # Patient frame (top-left)
         frm_pat = ttk.LabelFrame(self, text="Patient")
-        frm_pat.place(x=10, y=10, width=460, height=230)
+        frm_pat.place(x=10, y=55, width=460, height=265)
 
         ttk.Label(frm_pat, text="Barcode:").grid(row=0, column=0, sticky="e", padx=6, pady=6)
         ttk.Label(frm_pat, text="Ward:").grid(row=1, column=0, sticky="e", padx=6, pady=6)
@@ -244,6 +2290,7 @@ class LISApp(tk.Tk):
         self.e_ward.grid(row=1, column=1, padx=6, pady=6)
         self.e_name.grid(row=2, column=1, padx=6, pady=6)
         self.e_ic.grid(row=3, column=1, padx=6, pady=6)
+        self.e_barcode.bind("<KeyPress>", self.on_barcode_key)
 
         btn_save   = ttk.Button(frm_pat, text="Save/Update Patient", command=self.save_patient)
         btn_load   = ttk.Button(frm_pat, text="Load by Barcode", command=self.load_patient)
@@ -254,9 +2301,14 @@ class LISApp(tk.Tk):
         btn_print.grid(row=5, column=0, padx=6, pady=4, sticky="ew")
         btn_prices.grid(row=5, column=1, padx=6, pady=4, sticky="ew")
 
+        btn_queue = ttk.Button(frm_pat, text="Add to Print Queue", command=self.queue_sticker_btn)
+        self.btn_flush = ttk.Button(frm_pat, text="Print Queue (0)", command=self.flush_print_queue)
+        btn_queue.grid(row=6, column=0, padx=6, pady=4, sticky="ew")
+        self.btn_flush.grid(row=6, column=1, padx=6, pady=4, sticky="ew")
+
         # Test frame (bottom-left)
         frm_test = ttk.LabelFrame(self, text="Add / Edit Test")
-        frm_test.place(x=10, y=250, width=460, height=330)
+        frm_test.place(x=10, y=330, width=460, height=295)
 
         ttk.Label(frm_test, text="Test Name:").grid(row=0, column=0, sticky="e", padx=6, pady=6)
         ttk.Label(frm_test, text="Date (YYYY-MM-DD):").grid(row=1, column=0, sticky="e", padx=6, pady=6)
@@ -288,7 +2340,7 @@ class LISApp(tk.Tk):
 
         # Tests list frame (right side)
         frm_list = ttk.LabelFrame(self, text="Patient Tests")
-        frm_list.place(x=480, y=10, width=700, height=570)
+        frm_list.place(x=480, y=10, width=700, height=615)
 
         # Use GRID inside this frame to lock the bottom controls in place
         frm_list.grid_columnconfigure(0, weight=1)
@@ -310,9 +2362,11 @@ class LISApp(tk.Tk):
         self.tests_tree.column("date", width=100, anchor="center")
         self.tests_tree.column("result", width=150)
         self.tests_tree.column("price", width=110, anchor="e")
-        self.tests_tree.grid(row=0, column=0, sticky="nsew", padx=6, pady=6)
+        self.tests_tree.grid(row=0, column=0, sticky="nsew", padx=(6,0), pady=6)
         self.tests_tree.bind("<<TreeviewSelect>>", self.on_tree_select)
-        
+        self.tests_scroll = ttk.Scrollbar(frm_list, orient="vertical", command=self.tests_tree.yview)
+        self.tests_scroll.grid(row=0, column=1, sticky="ns", padx=(0,6), pady=6)
+        self.tests_tree.configure(yscrollcommand=self.on_tests_scroll)
 
         # Refresh button
         btn_refresh = ttk.Button(frm_list, text="Refresh List", command=self.refresh_tests)
@@ -328,12 +2382,16 @@ class LISApp(tk.Tk):
         self.total_label = tk.Label(frm_list, text="Total: RM 0.00", anchor="e", font=base)
         self.total_label.grid(row=3, column=0, sticky="ew", padx=6, pady=(0,6))
 
+        self.print_status = ttk.Label(frm_list, text="", anchor="w")
+        self.print_status.grid(row=4, column=0, sticky="ew", padx=6, pady=(0,6))
+        self.after(200, self.poll_print_results)
+
         # Initialize current price display
         self.update_current_price_label()
 
     # ----- Prices Dialog -----
     def open_prices_dialog(self):
-        prices = get_all_prices()
+        prices = self.db.get_all_prices()
 
         top = tk.Toplevel(self)
         top.title("Set Test Prices")
@@ -361,7 +2419,7 @@ class LISApp(tk.Tk):
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid non-negative numbers.")
                 return
-            set_all_prices(new_prices)
+            self.db.set_all_prices(new_prices)
             messagebox.showinfo("Saved", "Prices updated.")
             top.destroy()
             self.update_current_price_label()
@@ -372,6 +2430,253 @@ class LISApp(tk.Tk):
         ttk.Button(btns, text="Save", command=save_prices).pack(side="left", padx=8)
         ttk.Button(btns, text="Cancel", command=top.destroy).pack(side="left", padx=8)
 
+    # ----- Reports -----
+    def open_reports_window(self):
+        top = tk.Toplevel(self)
+        top.title("Revenue & Workload Report")
+        top.geometry("720x520")
+
+        frm = ttk.Frame(top)
+        frm.pack(fill="x", padx=8, pady=8)
+        today = datetime.now()
+        ttk.Label(frm, text="From:").pack(side="left")
+        e_from = ttk.Entry(frm, width=12)
+        e_from.insert(0, today.strftime("%Y-%m-01"))
+        e_from.pack(side="left", padx=(2, 8))
+        ttk.Label(frm, text="To:").pack(side="left")
+        e_to = ttk.Entry(frm, width=12)
+        e_to.insert(0, today.strftime("%Y-%m-%d"))
+        e_to.pack(side="left", padx=(2, 8))
+
+        period = tk.StringVar(value="")
+        by_test = tk.BooleanVar(value=True)
+        by_ward = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frm, text="Test", variable=by_test).pack(side="left")
+        ttk.Checkbutton(frm, text="Ward", variable=by_ward).pack(side="left")
+        for text, value in (("All dates", ""), ("Daily", "day"), ("Monthly", "month")):
+            ttk.Radiobutton(frm, text=text, value=value, variable=period).pack(side="left")
+
+        tree = ttk.Treeview(top, show="headings")
+        tree.pack(fill="both", expand=True, padx=8)
+        status = ttk.Label(top, text="")
+        status.pack(fill="x", padx=8)
+        result = {"header": [], "rows": []}
+        results = queue.Queue()
+
+        def run():
+            group_by = [g for g, on in (("month" if period.get() == "month" else "day", period.get()),
+                                        ("ward", by_ward.get()), ("test", by_test.get())) if on]
+            date_from, date_to = e_from.get().strip(), e_to.get().strip()
+
+            def work():
+                try:
+                    results.put(self.db.revenue_report(date_from, date_to, group_by))
+                except Exception as e:
+                    results.put(e)
+                finally:
+                    close_conn()  # this thread's connection
+
+            btn_run.configure(state="disabled")
+            status.configure(text="Running...")
+            threading.Thread(target=work, name="revenue-report", daemon=True).start()
+            self.after(100, check, time.perf_counter())
+
+        def check(started):
+            try:
+                res = results.get_nowait()
+            except queue.Empty:
+                self.after(100, check, started)
+                return
+            if not top.winfo_exists():  # window closed while the report ran
+                return
+            btn_run.configure(state="normal")
+            if isinstance(res, Exception):
+                status.configure(text="")
+                messagebox.showerror("Report", f"Report failed:\n{res}", parent=top)
+                return
+            header, rows = res
+            result.update(header=header, rows=rows)
+            tree.delete(*tree.get_children())
+            tree.configure(columns=list(range(len(header))))
+            for i, h in enumerate(header):
+                tree.heading(i, text=h)
+                tree.column(i, width=110, anchor="e" if i >= len(header) - 2 else "w")
+            for row in rows:
+                tree.insert("", "end", values=row[:-1] + (f"{row[-1]:.2f}",))
+            tests = sum(r[-2] for r in rows)
+            revenue = sum(r[-1] for r in rows)
+            status.configure(text=f"{tests:,} tests, RM {revenue:,.2f}  ({time.perf_counter() - started:.2f}s)")
+
+        def export():
+            if not result["rows"]:
+                messagebox.showinfo("Export", "Run a report first.", parent=top)
+                return
+            path = filedialog.asksaveasfilename(parent=top, defaultextension=".csv",
+                                                filetypes=[("CSV", "*.csv")])
+            if path:
+                export_report_csv(path, result["header"], result["rows"])
+
+        btns = ttk.Frame(top)
+        btns.pack(fill="x", padx=8, pady=8)
+        btn_run = ttk.Button(btns, text="Run", command=run)
+        btn_run.pack(side="left")
+        ttk.Button(btns, text="Export CSV...", command=export).pack(side="left", padx=8)
+
+    # ----- Bulk order -----
+    def open_bulk_order_dialog(self):
+        top = tk.Toplevel(self)
+        top.title("Bulk Test Order")
+        top.geometry("380x420")
+        top.resizable(False, False)
+
+        ttk.Label(top, text="Test:").grid(row=0, column=0, sticky="e", padx=8, pady=6)
+        combo = ttk.Combobox(top, values=TEST_CHOICES, state="readonly", width=25)
+        combo.grid(row=0, column=1, sticky="w", padx=8, pady=6)
+        combo.set(self.combo_test_name.get() or TEST_CHOICES[0])
+
+        ttk.Label(top, text="Date (YYYY-MM-DD):").grid(row=1, column=0, sticky="e", padx=8, pady=6)
+        e_date = ttk.Entry(top, width=27)
+        e_date.grid(row=1, column=1, sticky="w", padx=8, pady=6)
+        e_date.insert(0, datetime.now().strftime("%Y-%m-%d"))
+
+        ttk.Label(top, text="Barcodes (one per line / scan):").grid(
+            row=2, column=0, columnspan=2, sticky="w", padx=8, pady=(6, 0))
+        txt = tk.Text(top, width=42, height=14)
+        txt.grid(row=3, column=0, columnspan=2, padx=8, pady=6)
+        txt.focus_set()
+
+        queue_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(top, text="Add stickers to print queue", variable=queue_var).grid(
+            row=4, column=0, columnspan=2, sticky="w", padx=8)
+
+        def submit():
+            tname = combo.get().strip()
+            tdate = e_date.get().strip()
+            barcodes = txt.get("1.0", "end").split()
+            if not tname or not tdate or not barcodes:
+                messagebox.showerror("Error", "Test, date and at least one barcode are required.", parent=top)
+                return
+            ordered, missing, price = self.db.add_tests_bulk(barcodes, tname, tdate)
+            if queue_var.get() and ordered:
+                self.print_queue.extend((b, w or "", n or "", ic or "") for b, w, n, ic in ordered)
+                self.btn_flush.configure(text=f"Print Queue ({len(self.print_queue)})")
+            if self.shown_barcode in {p[0] for p in ordered}:
+                self.refresh_tests()
+            msg = f"{tname} ordered for {len(ordered)} patient(s) at RM {price:.2f} each."
+            if missing:
+                msg += f"\n\nNo patient record for {len(missing)} barcode(s):\n" + ", ".join(missing[:20])
+                if len(missing) > 20:
+                    msg += ", ..."
+            messagebox.showinfo("Bulk Order", msg, parent=top)
+            top.destroy()
+
+        btns = ttk.Frame(top)
+        btns.grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Button(btns, text="Order", command=submit).pack(side="left", padx=8)
+        ttk.Button(btns, text="Cancel", command=top.destroy).pack(side="left", padx=8)
+
+    # ----- Bulk import -----
+    def import_patients_dialog(self):
+        if self.remote:
+            messagebox.showinfo("Import", "Patient import runs on the LIS server PC:\n"
+                                "python lis6.py --import-patients census.csv")
+            return
+        path = filedialog.askopenfilename(
+            parent=self, title="Import Patients",
+            filetypes=[("Census files", "*.csv *.xlsx"), ("All files", "*.*")])
+        if not path:
+            return
+        results = queue.Queue()
+
+        def run():
+            try:
+                results.put(import_patients(path))
+            except Exception as e:
+                results.put(e)
+            finally:
+                close_conn()  # this thread's connection
+
+        def check():
+            try:
+                res = results.get_nowait()
+            except queue.Empty:
+                self.after(200, check)
+                return
+            self.config(cursor="")
+            if isinstance(res, Exception):
+                messagebox.showerror("Import", f"Import failed:\n{res}")
+                return
+            msg = (f"Imported {res['imported']:,} patients in {res['seconds']:.1f}s "
+                   f"({res['rows_per_sec']:,.0f} rows/s).")
+            if res["rejected"]:
+                msg += f"\n{res['rejected']:,} rows rejected, see:\n{res['rejects_path']}"
+            messagebox.showinfo("Import", msg)
+
+        self.config(cursor="watch")
+        threading.Thread(target=run, name="patient-import", daemon=True).start()
+        self.after(200, check)
+
+    # ----- Patient search -----
+    def on_search_key(self, event=None):
+        if event is not None and event.keysym in ("Down", "Return", "Escape"):
+            return
+        if self.search_after is not None:
+            self.after_cancel(self.search_after)
+        self.search_after = self.after(SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        self.search_after = None
+        text = self.e_search.get()
+        if patient_search_query(text) is None:
+            self.hide_search_results()
+            return
+        self.searcher.submit(text)
+        if not self.search_polling:
+            self.search_polling = True
+            self.after(20, self.poll_search)
+
+    def poll_search(self):
+        res = self.searcher.poll()
+        if res is None:
+            self.after(20, self.poll_search)
+            return
+        self.search_polling = False
+        text, rows = res
+        if text != self.e_search.get():
+            return  # typed on since; the debounce timer will search again
+        self.search_rows = rows
+        self.search_list.delete(0, tk.END)
+        for b, w, n, ic in rows:
+            self.search_list.insert(tk.END, f"{b}   {n or ''}   {ic or ''}   {w or ''}")
+        if not rows:
+            self.search_list.insert(tk.END, "No matching patients")
+        self.search_list.place(x=10, y=45, width=460, height=220)
+        self.search_list.lift()
+
+    def focus_search_results(self):
+        if self.search_rows and self.search_list.winfo_ismapped():
+            self.search_list.focus_set()
+            self.search_list.selection_clear(0, tk.END)
+            self.search_list.selection_set(0)
+            self.search_list.activate(0)
+
+    def hide_search_results(self):
+        self.search_list.place_forget()
+        self.search_rows = []
+
+    def pick_search_result(self, index=None):
+        if index is None:
+            sel = self.search_list.curselection()
+            index = sel[0] if sel else 0
+        if index >= len(self.search_rows):
+            return
+        barcode = self.search_rows[index][0]
+        self.hide_search_results()
+        self.e_search.delete(0, tk.END)
+        self.e_barcode.delete(0, tk.END)
+        self.e_barcode.insert(0, barcode)
+        self.load_patient()
+
     # ----- GUI actions -----
     def save_patient(self):
         b = self.e_barcode.get().strip()
@@ -381,15 +2686,58 @@ class LISApp(tk.Tk):
         if not b:
             messagebox.showerror("Error", "Barcode is required.")
             return
-        upsert_patient(b, w, n, ic)
+        self.db.upsert_patient(b, w, n, ic)
         messagebox.showinfo("Saved", "Patient saved/updated.")
 
-    def load_patient(self):
+    def on_barcode_key(self, event):
+        scan = self.scanner.key(event.keysym, event.char, event.time)
+        if scan is not None:
+            barcode, started = scan
+            # the burst was typed after whatever the field held before
+            self.e_barcode.delete(0, tk.END)
+            self.e_barcode.insert(0, barcode)
+            self.load_patient(started)
+            return "break"  # a Tab terminator must not move the focus
+        if event.keysym in ("Return", "KP_Enter"):
+            self.load_patient()
+
+    def load_patient(self, scan_started=None):
+        """Load the patient on the loader thread; show_loaded() fills the form.
+
+        scan_started is the perf_counter() of a scan's first character: the
+        load is then timed, and with "Print Sticker on Scan" the sticker is
+        printed too.
+        """
         b = self.e_barcode.get().strip()
         if not b:
             messagebox.showerror("Error", "Enter a barcode to load.")
             return
-        rec = get_patient(b)
+        printer = printed = None
+        if scan_started is not None and self.auto_print.get():
+            printer = self.printer
+
+            def printed(job_id, error):
+                if error is None:
+                    self.scan_stats.record("scan_to_spooled", time.perf_counter() - scan_started)
+
+        self.loader.submit(b, scan_started, printer, printed)
+        self.loads_pending += 1
+        if self.loads_pending == 1:
+            self.after(10, self.poll_loads)
+
+    def poll_loads(self):
+        for result in self.loader.poll():
+            self.loads_pending -= 1
+            self.show_loaded(*result)
+        if self.loads_pending:
+            self.after(10, self.poll_loads)
+
+    def show_loaded(self, barcode, scan_started, rec, rows, totals, error):
+        if barcode != self.e_barcode.get().strip():
+            return  # another barcode was entered meanwhile
+        if error is not None:
+            messagebox.showerror("Error", f"Could not load {barcode}:\n{error}")
+            return
         if not rec:
             messagebox.showwarning("Not found", "No patient with that barcode.")
             return
@@ -397,8 +2745,22 @@ class LISApp(tk.Tk):
         self.e_ward.delete(0, tk.END); self.e_ward.insert(0, w or "")
         self.e_name.delete(0, tk.END); self.e_name.insert(0, n or "")
         self.e_ic.delete(0, tk.END); self.e_ic.insert(0, ic or "")
-        self.refresh_tests()
+        if barcode != self.shown_barcode:
+            self.reset_tests_tree(barcode)
+        self.window_after = None
+        self.window_at_end = len(rows) < TESTS_PAGE_SIZE
+        self.show_window(rows)
+        self.total_label.configure(text=f"Total: RM {totals[1]:.2f}")
         self.clear_test_form()
+        if scan_started is not None:
+            self.update_idletasks()  # scan-to-loaded includes drawing the form
+            seconds = time.perf_counter() - scan_started
+            self.scan_stats.record("scan_to_loaded", seconds)
+            printing = ", printing sticker" if self.auto_print.get() and n else ""
+            s = self.scan_stats.summary()["scan_to_loaded"]
+            self.print_status.configure(text=f"Scanned {barcode}: loaded in {seconds * 1000:.0f} ms{printing} "
+                                             f"(p50 {s['p50_ms']:.0f} ms, p99 {s['p99_ms']:.0f} ms "
+                                             f"over {s['n']} scans)")
 
     def add_test_btn(self):
         b = self.e_barcode.get().strip()
@@ -411,8 +2773,8 @@ class LISApp(tk.Tk):
         if not tname or not tdate:
             messagebox.showerror("Error", "Test name and date are required.")
             return
-        price = get_current_price(tname)  # snapshot
-        add_test(b, tname, tdate, result, price)
+        price = self.db.get_current_price(tname)  # snapshot
+        self.db.add_test(b, tname, tdate, result, price)
         self.refresh_tests()
         self.clear_test_form()
         messagebox.showinfo("Added", f"Test added. Price snapshot: RM {price:.2f}")
@@ -447,11 +2809,11 @@ class LISApp(tk.Tk):
             if vals:
                 old_name = vals[1]
         if old_name is not None and old_name != tname:
-            new_price = get_current_price(tname)
-            update_test(self.selected_test_id, tname, tdate, result, new_price)
+            new_price = self.db.get_current_price(tname)
+            self.db.update_test(self.selected_test_id, tname, tdate, result, new_price)
             messagebox.showinfo("Updated", f"Test updated with new price snapshot: RM {new_price:.2f}")
         else:
-            update_test(self.selected_test_id, tname, tdate, result, None)
+            self.db.update_test(self.selected_test_id, tname, tdate, result, None)
             messagebox.showinfo("Updated", "Test updated.")
         self.refresh_tests()
 
@@ -461,7 +2823,7 @@ class LISApp(tk.Tk):
             return
         if not messagebox.askyesno("Confirm", "Delete the selected test?"):
             return
-        delete_test(self.selected_test_id)
+        self.db.delete_test(self.selected_test_id)
         self.refresh_tests()
         self.clear_test_form()
         messagebox.showinfo("Deleted", "Test deleted.")
@@ -475,17 +2837,85 @@ class LISApp(tk.Tk):
         self.update_current_price_label()
 
     def refresh_tests(self):
-        for row in self.tests_tree.get_children():
-            self.tests_tree.delete(row)
         b = self.e_barcode.get().strip()
-        total = 0.0
-        if b:
-            rows = list_tests(b)
-            for rid, name, date, result, price in rows:
-                total += float(price or 0.0)
-                self.tests_tree.insert("", "end", values=(rid, name, date, result, f"{price:.2f}"))
+        if b != self.shown_barcode:
+            self.reset_tests_tree(b)
+        # re-read the window currently on screen (same start, same size)
+        size = max(len(self.window_rows), TESTS_PAGE_SIZE)
+        rows = self.db.list_tests_page(b, after=self.window_after, limit=size) if b else []
+        self.window_at_end = len(rows) < size
+        self.show_window(rows)
+        count, total = self.db.test_totals(b) if b else (0, 0.0)
         self.total_label.configure(text=f"Total: RM {total:.2f}")
 
+    def reset_tests_tree(self, barcode):
+        self.tests_tree.delete(*self.tests_tree.get_children())
+        self.shown_barcode = barcode
+        self.shown_tests = {}
+        self.window_rows = []
+        self.window_after = None
+
+    def show_window(self, rows):
+        """Make tests_tree show rows, touching only the tree items that changed."""
+        removed, updated, inserted = diff_test_rows(self.shown_tests, rows)
+        if removed:
+            self.tests_tree.delete(*removed)
+        for iid in removed:
+            del self.shown_tests[iid]
+        for iid, vals in updated.items():
+            self.tests_tree.item(iid, values=vals)
+            self.shown_tests[iid] = vals
+        for index, iid, vals in inserted:
+            self.tests_tree.insert("", index, iid=iid, values=vals)
+            self.shown_tests[iid] = vals
+        self.window_rows = rows
+
+    def on_tests_scroll(self, first, last):
+        self.tests_scroll.set(first, last)
+        if self.paging or not self.window_rows:
+            return
+        if float(last) > 0.98 and not self.window_at_end:
+            self.paging = True
+            self.after_idle(self.page_tests, 1)
+        elif float(first) < 0.02 and self.window_after is not None:
+            self.paging = True
+            self.after_idle(self.page_tests, -1)
+
+    def page_tests(self, direction):
+        """Slide the window one page down (1) or up (-1), keeping the view in place."""
+        try:
+            rows = self.window_rows
+            first, _ = self.tests_tree.yview()
+            anchor = rows[min(len(rows) - 1, int(float(first) * len(rows)))][0]
+            if direction > 0:
+                last = rows[-1]
+                more = self.db.list_tests_page(self.shown_barcode, after=(last[2], last[0]))
+                self.window_at_end = len(more) < TESTS_PAGE_SIZE
+                rows = rows + more
+                drop = max(0, len(rows) - TESTS_WINDOW_ROWS)
+                if drop:
+                    self.window_after = (rows[drop - 1][2], rows[drop - 1][0])
+                    rows = rows[drop:]
+            else:
+                top = rows[0]
+                # one extra row tells us what is left above the new window
+                more = self.db.list_tests_page(self.shown_barcode, before=(top[2], top[0]),
+                                       limit=TESTS_PAGE_SIZE + 1)
+                if len(more) > TESTS_PAGE_SIZE:
+                    self.window_after = (more[0][2], more[0][0])
+                    more = more[1:]
+                else:
+                    self.window_after = None
+                rows = more + rows
+                if len(rows) > TESTS_WINDOW_ROWS:
+                    rows = rows[:TESTS_WINDOW_ROWS]
+                    self.window_at_end = False
+            self.show_window(rows)
+            index = next((i for i, row in enumerate(rows) if row[0] == anchor), 0)
+            self.tests_tree.yview_moveto(index / len(rows))
+        finally:
+            self.paging = False
+
     def print_sticker_btn(self):
         b = self.e_barcode.get().strip()
         w = self.e_ward.get().strip()
@@ -494,8 +2924,44 @@ class LISApp(tk.Tk):
         if not b or not n:
             messagebox.showerror("Error", "Barcode and Name are required.")
             return
-        print_sticker(b, w, n, ic)
-        messagebox.showinfo("Print", "Sticker sent to printer.")
+        self.printer.submit([(b, w, n, ic)])
+        self.print_status.configure(text=f"Printing {b}... ({self.printer.pending()} job(s) waiting)")
+
+    def queue_sticker_btn(self):
+        b = self.e_barcode.get().strip()
+        w = self.e_ward.get().strip()
+        n = self.e_name.get().strip()
+        ic = self.e_ic.get().strip()
+        if not b or not n:
+            messagebox.showerror("Error", "Barcode and Name are required.")
+            return
+        self.print_queue.append((b, w, n, ic))
+        self.btn_flush.configure(text=f"Print Queue ({len(self.print_queue)})")
+
+    def flush_print_queue(self):
+        if not self.print_queue:
+            messagebox.showinfo("Print", "Print queue is empty.")
+            return
+        count = len(self.print_queue)
+        self.printer.submit(self.print_queue)
+        self.print_queue = []
+        self.btn_flush.configure(text="Print Queue (0)")
+        self.print_status.configure(text=f"Printing {count} stickers as one job...")
+
+    def poll_print_results(self):
+        for job_id, error in self.printer.poll():
+            if error is not None:
+                self.print_status.configure(text=f"Print job {job_id} failed.")
+                messagebox.showerror("Print", f"Print job {job_id} failed:\n{error}")
+            else:
+                self.print_status.configure(text=f"Print job {job_id} sent to printer.")
+        self.after(200, self.poll_print_results)
+
+    def close_workers(self):
+        """Stop the background threads after mainloop()."""
+        self.loader.stop()
+        self.printer.stop()
+        self.searcher.stop()
 
     def on_test_choice_changed(self, event=None):
         self.update_current_price_label()
@@ -508,6 +2974,38 @@ class LISApp(tk.Tk):
 
 # ========= main ========
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["--server"] and len(sys.argv) > 2:
+        # python lis6.py --server http://lis-server:8080   (shared lis_server.py)
+        app = LISApp(RemoteLIS(sys.argv[2]))
+        app.mainloop()
+        app.close_workers()
+        sys.exit(0)
     init_db()
+    if sys.argv[1:2] == ["--import-patients"] and len(sys.argv) > 2:
+        # python lis6.py --import-patients census.csv [rejected.csv]
+        try:
+            res = import_patients(sys.argv[2], *sys.argv[3:4])
+        except ValueError as e:
+            sys.exit(f"Import failed: {e}")
+        print(f"{res['imported']:,} imported, {res['rejected']:,} rejected "
+              f"in {res['seconds']:.2f}s ({res['rows_per_sec']:,.0f} rows/s)")
+        if res["rejects_path"]:
+            print(f"Rejected rows: {res['rejects_path']}")
+        sys.exit(0)
+    if sys.argv[1:2] == ["--check-summary"]:
+        # verify the billing summary; "--check-summary --rebuild" also repairs it
+        bad = check_test_summary()
+        for b, (stored, expected) in sorted(bad.items()):
+            print(f"{b}: stored {stored}, expected {expected}")
+        print(f"{len(bad)} patient(s) out of sync")
+        if bad and "--rebuild" in sys.argv:
+            rebuild_test_summary()
+            rebuild_test_rollup()
+            print("Summary rebuilt.")
+        sys.exit(1 if bad and "--rebuild" not in sys.argv else 0)
+    start_test_writer()
     app = LISApp()
     app.mainloop()
+    app.close_workers()
+    stop_test_writer()
+    close_conn()
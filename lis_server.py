@@ -0,0 +1,183 @@
+# Headless LIS service: the lis6.py data layer as a JSON API over HTTP, so
+# several reception PCs can share one lis.db instead of each opening the file.
+#
+# Usage: python lis_server.py [port] [lis.db]
+#        then on each counter: python lis6.py --server http://<host>:<port>
+#
+# Every call is POST /api/<operation> with the operation's keyword arguments
+# as a JSON object; the reply is {"result": ...} or {"error": "..."}.
+# GET /status reports the writer's batching counters.
+#
+# Reads run on a small thread pool, each thread with its own connection.
+# All writes go through one lis6.TestWriter, so there is a single writer
+# connection and concurrent counters' writes share group commits.
+
+import asyncio
+import json
+import sqlite3
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import lis6
+
+HOST = "0.0.0.0"
+PORT = 8080
+READER_THREADS = 4
+MAX_BODY = 1 << 20
+
+READS = {
+    "get_patient": lis6.get_patient,
+    "search_patients": lis6.search_patients,
+    "list_tests": lis6.list_tests,
+    "list_tests_page": lis6.list_tests_page,
+    "test_totals": lis6.test_totals,
+    "get_current_price": lis6.get_current_price,
+    "get_all_prices": lis6.get_all_prices,
+    "revenue_report": lis6.revenue_report,
+}
+WRITES = {  # operation -> builder of its single SQL statement
+    "upsert_patient": lis6.upsert_patient_statement,
+    "add_test": lis6.add_test_statement,
+    "update_test": lis6.update_test_statement,
+    "delete_test": lis6.delete_test_statement,
+    "set_all_prices": lis6.set_prices_statement,
+}
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class LISServer:
+    def __init__(self, host=HOST, port=PORT, readers=READER_THREADS):
+        self.host = host
+        self.port = port
+        self.readers = ThreadPoolExecutor(readers, thread_name_prefix="lis-reader")
+        self.writer = None
+        self.server = None
+
+    async def start(self):
+        lis6.init_db()
+        self.writer = lis6.start_test_writer()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.readers.shutdown(wait=True)
+        lis6.stop_test_writer()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:  # the body cannot be framed: answer and drop the connection
+                    await self.respond(writer, 400, {"error": "bad Content-Length"}, keep_alive=False)
+                    return
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length)
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        data = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                + ("" if keep_alive else "Connection: close\r\n") + "\r\n")
+        writer.write(head.encode() + data)
+        await writer.drain()
+
+    async def read(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, lambda: fn(*args, **kwargs))
+
+    async def write(self, statement):
+        return await asyncio.wrap_future(self.writer.submit(*statement))
+
+    async def add_tests_bulk(self, barcodes, test_name, test_date, result=""):
+        """lis6.add_tests_bulk(): look patients and price up on a reader, then
+        insert the whole order as one statement through the writer."""
+        barcodes = list(dict.fromkeys(b for b in barcodes if b))
+        patients = await self.read(lis6.get_patients, barcodes)
+        price = await self.read(lis6.get_current_price, test_name)
+        ordered = [patients[b] for b in barcodes if b in patients]
+        await self.write(lis6.add_tests_bulk_statement([p[0] for p in ordered], test_name, test_date, result, price))
+        return ordered, [b for b in barcodes if b not in patients], price
+
+    async def dispatch(self, method, target, body):
+        path = target.split("?", 1)[0]
+        if path == "/status":
+            return 200, {"result": {"writer": self.writer.metrics(), "queued": self.writer.ops.qsize()}}
+        if not path.startswith("/api/"):
+            return 404, {"error": f"no such path: {path}"}
+        op = path[len("/api/"):]
+        if op not in READS and op not in WRITES and op != "add_tests_bulk":
+            return 404, {"error": f"no such operation: {op}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            kwargs = json.loads(body or b"{}")
+            if not isinstance(kwargs, dict):
+                raise ValueError("arguments must be a JSON object")
+            if op == "add_tests_bulk":
+                result = await self.add_tests_bulk(**kwargs)
+            elif op in READS:
+                result = await self.read(READS[op], **kwargs)
+            else:
+                result = await self.write(WRITES[op](**kwargs))
+        except (TypeError, ValueError) as e:  # bad JSON, missing/unknown arguments
+            return 400, {"error": str(e)}
+        except sqlite3.Error as e:
+            return 500, {"error": str(e)}
+        except Exception as e:  # a bug, not the client's fault: keep serving the others
+            traceback.print_exc()
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 200, {"result": result}
+
+
+async def main(port=PORT):
+    server = await LISServer(port=port).start()
+    print(f"LIS server on http://{server.host}:{server.port} using {lis6.DB_PATH}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        lis6.DB_PATH = sys.argv[2]
+    try:
+        asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else PORT))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,107 @@
+# Load test for lis_server.py: simulated reception counters working flat out.
+#
+# Usage: python loadtest_lis.py [counters] [seconds] [server url]
+#        (no url = start a throwaway lis_server.py on a temporary lis.db)
+#
+# Each counter registers a patient, loads it, orders two tests, edits one,
+# refreshes the tests list and totals, and searches now and then, timing
+# every call. Prints per-operation and overall p50/p99 latency.
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import lis6
+
+COUNTERS = 20
+SECONDS = 20
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def counter(url, k, deadline, timings):
+    client = lis6.RemoteLIS(url)
+    rec = {}
+
+    def timed(op, *args):
+        t0 = time.perf_counter()
+        result = getattr(client, op)(*args)
+        rec.setdefault(op, []).append(time.perf_counter() - t0)
+        return result
+
+    i = 0
+    while time.monotonic() < deadline:
+        barcode = f"C{k:02d}{i:06d}"
+        timed("upsert_patient", barcode, f"Ward {k}", f"PATIENT {k} {i}", f"900101-{k:02d}-{i % 10000:04d}")
+        timed("get_patient", barcode)
+        price = timed("get_current_price", "GXM")
+        test_id = timed("add_test", barcode, "GXM", "2025-06-01", "", price)
+        timed("add_test", barcode, "DCT", "2025-06-01", "", price)
+        timed("update_test", test_id, "GXM", "2025-06-01", "compatible", None)
+        timed("list_tests_page", barcode)
+        timed("test_totals", barcode)
+        if i % 5 == 0:
+            timed("search_patients", f"patient {k}")
+        i += 1
+    client.close()
+    timings.append(rec)
+
+
+def start_server():
+    """Run lis_server.py on a temp lis.db; returns (process, url)."""
+    db = os.path.join(tempfile.mkdtemp(), "lis.db")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen([sys.executable, os.path.join(here, "lis_server.py"), "0", db],
+                            stdout=subprocess.PIPE, text=True, cwd=here)
+    line = proc.stdout.readline()  # "LIS server on http://0.0.0.0:<port> ..."
+    port = int(line.split("http://", 1)[1].split()[0].rsplit(":", 1)[1])
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def main(counters=COUNTERS, seconds=SECONDS, url=None):
+    proc = None
+    if url is None:
+        proc, url = start_server()
+    try:
+        timings = []
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=counter, args=(url, k, deadline, timings)) for k in range(counters)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        client = lis6.RemoteLIS(url)
+        writer = client.status()["writer"]
+        client.close()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    by_op = {}
+    for rec in timings:
+        for op, values in rec.items():
+            by_op.setdefault(op, []).extend(values)
+    everything = sorted(v for values in by_op.values() for v in values)
+    print(f"{counters} counters, {elapsed:.1f}s, {len(everything):,} requests "
+          f"({len(everything) / elapsed:,.0f}/s); writer: {writer['avg_batch']:.1f} statements per commit")
+    print(f"{'operation':<20} {'calls':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for op, values in sorted(by_op.items()):
+        values.sort()
+        print(f"{op:<20} {len(values):>8,} {percentile(values, 0.50) * 1000:8.2f} {percentile(values, 0.99) * 1000:8.2f}")
+    print(f"{'all':<20} {len(everything):>8,} {percentile(everything, 0.50) * 1000:8.2f} "
+          f"{percentile(everything, 0.99) * 1000:8.2f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else COUNTERS,
+         float(args[1]) if len(args) > 1 else SECONDS,
+         args[2] if len(args) > 2 else None)
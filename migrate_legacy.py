@@ -0,0 +1,135 @@
+# Migrate the legacy lab_info.db (one denormalized patient_tests table) into
+# the normalized lis.db schema used by lis6.py: patients + tests + test_prices.
+#
+# Usage: python migrate_legacy.py [legacy.db] [lis.db]          migrate, then verify
+#        python migrate_legacy.py [legacy.db] [lis.db] --verify  verify only
+#
+# Rows are copied in chunks; each chunk commits together with its
+# legacy_id -> test_id mapping, so an interrupted run simply continues from
+# the last committed chunk when started again.
+# Patients are deduped on barcode: the first legacy row seen for a barcode
+# supplies ward/name/IC, and patients already in lis.db are left untouched.
+
+import sqlite3
+import sys
+import time
+
+import lis6
+
+LEGACY_DB = "lab_info.db"
+CHUNK_ROWS = 20_000
+
+MAPPING_TABLE = """
+    CREATE TABLE IF NOT EXISTS legacy_tests (
+        legacy_id INTEGER PRIMARY KEY,   -- patient_tests.id in the legacy DB
+        test_id   INTEGER NOT NULL       -- tests.id in lis.db
+    )
+"""
+
+
+def migrate(legacy_path=LEGACY_DB, chunk_rows=CHUNK_ROWS, progress=None):
+    """Copy every not-yet-migrated legacy row; returns (rows copied, seconds)."""
+    lis6.init_db()
+    conn = lis6.get_conn()
+    conn.execute(MAPPING_TABLE)
+    legacy = sqlite3.connect(legacy_path)
+    try:
+        with conn:
+            # keep LIS prices; only add tests the LIS has never priced
+            conn.executemany("INSERT OR IGNORE INTO test_prices (test_name, price) VALUES (?, ?)",
+                             legacy.execute("SELECT test_name, COALESCE(price, 0) FROM test_prices"))
+        lis6.invalidate_price_cache()
+
+        last_id = conn.execute("SELECT COALESCE(MAX(legacy_id), 0) FROM legacy_tests").fetchone()[0]
+        remaining = legacy.execute("SELECT COUNT(*) FROM patient_tests WHERE id > ?", (last_id,)).fetchone()[0]
+        copied = 0
+        started = time.perf_counter()
+        while True:
+            rows = legacy.execute("""
+                SELECT id, barcode, ward, name, ic, test_name, test_date, result, price
+                FROM patient_tests WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, chunk_rows)).fetchall()
+            if not rows:
+                break
+            patients = {}
+            for r in rows:
+                if r[1] is not None:
+                    patients.setdefault(r[1], r[1:5])
+            with conn:
+                conn.executemany("""
+                    INSERT OR IGNORE INTO patients (barcode_data, ward, name, ic_number)
+                    VALUES (?, ?, ?, ?)
+                """, patients.values())
+                # one writer inside one transaction: AUTOINCREMENT hands out
+                # consecutive ids, which gives the legacy -> new id mapping
+                first_id = conn.execute(
+                    "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name='tests'), 0) + 1"
+                ).fetchone()[0]
+                conn.executemany("""
+                    INSERT INTO tests (barcode_data, test_name, test_date, result, price)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(r[1], r[5], r[6], r[7], r[8]) for r in rows])
+                conn.executemany("INSERT INTO legacy_tests (legacy_id, test_id) VALUES (?, ?)",
+                                 [(r[0], first_id + i) for i, r in enumerate(rows)])
+            last_id = rows[-1][0]
+            copied += len(rows)
+            if progress:
+                progress(copied, remaining, time.perf_counter() - started)
+        return copied, time.perf_counter() - started
+    finally:
+        legacy.close()
+
+
+def verify(legacy_path=LEGACY_DB):
+    """Compare legacy rows with what was migrated.
+
+    Returns (problems, legacy_count, migrated_count); problems lists every
+    barcode whose test count or price sum differs, plus a row-count line
+    when the totals disagree.
+    """
+    lis6.init_db()
+    conn = lis6.get_conn()
+    conn.execute(MAPPING_TABLE)
+    conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+    try:
+        legacy_count = conn.execute("SELECT COUNT(*) FROM legacy.patient_tests").fetchone()[0]
+        migrated_count = conn.execute(
+            "SELECT COUNT(*) FROM legacy_tests m JOIN tests t ON t.id = m.test_id").fetchone()[0]
+        expected = {b: (n, s) for b, n, s in conn.execute("""
+            SELECT barcode, COUNT(*), ROUND(COALESCE(SUM(price), 0), 2)
+            FROM legacy.patient_tests GROUP BY barcode
+        """)}
+        actual = {b: (n, s) for b, n, s in conn.execute("""
+            SELECT t.barcode_data, COUNT(*), ROUND(COALESCE(SUM(t.price), 0), 2)
+            FROM legacy_tests m JOIN tests t ON t.id = m.test_id
+            GROUP BY t.barcode_data
+        """)}
+    finally:
+        conn.execute("DETACH DATABASE legacy")
+    problems = [f"{b}: legacy {expected.get(b)} vs migrated {actual.get(b)}"
+                for b in sorted(expected.keys() | actual.keys(), key=str)
+                if expected.get(b) != actual.get(b)]
+    if legacy_count != migrated_count:
+        problems.insert(0, f"row count: legacy {legacy_count} vs migrated {migrated_count}")
+    return problems, legacy_count, migrated_count
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    legacy_path = args[0] if args else LEGACY_DB
+    if len(args) > 1:
+        lis6.DB_PATH = args[1]
+
+    if "--verify" not in sys.argv:
+        def show(done, total, seconds):
+            print(f"\r{done:,}/{total:,} rows  ({done / seconds:,.0f} rows/s)", end="", flush=True)
+        copied, seconds = migrate(legacy_path, progress=show)
+        print(f"\nMigrated {copied:,} rows in {seconds:.1f}s")
+
+    problems, legacy_count, migrated_count = verify(legacy_path)
+    print(f"Legacy rows: {legacy_count:,}  migrated rows: {migrated_count:,}")
+    for line in problems[:50]:
+        print("  " + line)
+    print("Verification OK" if not problems else f"Verification FAILED ({len(problems)} problems)")
+    lis6.close_conn()
+    sys.exit(1 if problems else 0)
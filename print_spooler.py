@@ -0,0 +1,249 @@
+# Central sticker print spooler shared by every LISApp on the network.
+#
+# Usage: python print_spooler.py [port] [name=printer-uri ...] [--allow-adhoc]
+#        python print_spooler.py --status [host:port]   show queues
+#        then in lis6.py: PRINT_SPOOLER = "<spooler host>:<port>"
+#
+# Clients send one JSON object per line (see lis6.SpoolerClient):
+#   {"cmd": "print", "printer": "default", "records": [[barcode, ward, name, ic]],
+#    "copies": 1, "layout": {...}, "wait": false}  -> {"job": id, "state": ...}
+#   {"cmd": "status"}                               -> queues, latency, labels/min
+# Jobs are rendered to DPL in a process pool. Each printer gets its own queue
+# and one I/O thread with a long-lived lis6.PrinterSession, so its labels go
+# out strictly in submission order. Printer URIs are lis6.open_transport()'s.
+# Only configured printer names are accepted; ALLOW_ADHOC_PRINTERS (or
+# --allow-adhoc) also takes an unknown name as a URI, which lets any client
+# on the network open files and sockets as the spooler, so keep it off on
+# shared networks.
+
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import lis6
+
+HOST = "0.0.0.0"
+PRINTERS = {"default": lis6.PRINTER_URI}
+RENDER_WORKERS = os.cpu_count() or 2
+FLUSH_JOBS = 32        # a busy printer still gets a write at least this often
+LATENCY_WINDOW = 1000  # recent jobs kept for the latency percentiles
+ALLOW_ADHOC_PRINTERS = False
+MAX_PRINTERS = 32      # ad-hoc printers each cost a thread and a task
+
+
+def render_job(records, copies, layout):
+    """DPL for one job; runs in the render pool processes."""
+    return b"".join(lis6.build_sticker_dpl(*rec, quantity=copies, **layout) for rec in records)
+
+
+class Job:
+    def __init__(self, job_id, printer, records, copies):
+        self.id = job_id
+        self.printer = printer
+        self.labels = len(records) * copies
+        self.state = "queued"
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.finished = None
+        self.rendered = None  # asyncio future of the DPL bytes
+        self.done = asyncio.Event()
+
+    def reply(self):
+        return {"job": self.id, "state": self.state, "error": self.error}
+
+
+class Printer:
+    def __init__(self, name, uri):
+        self.name = name
+        self.uri = uri
+        self.queue = asyncio.Queue()
+        self.io = ThreadPoolExecutor(1, thread_name_prefix=f"printer-{name}")
+        self.session = lis6.PrinterSession(uri, max_delay=3600)  # flushed explicitly
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.labels = 0
+        self.last_error = None
+
+
+class Spooler:
+    def __init__(self, printers=None, render_workers=RENDER_WORKERS, allow_adhoc=ALLOW_ADHOC_PRINTERS):
+        self.uris = dict(printers or PRINTERS)
+        self.allow_adhoc = allow_adhoc
+        self.printers = {}
+        # spawn, not fork: the spooler already runs threads when the pool starts
+        self.render_pool = ProcessPoolExecutor(render_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.render_workers = render_workers
+        self.next_id = 1
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.printed = deque()  # (finish time, labels) over the last minute
+        self.started = time.perf_counter()
+        self.server = None
+
+    async def start(self, host=HOST, port=lis6.SPOOLER_PORT):
+        # start the render processes now rather than on the first label
+        await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(self.render_pool, render_job, [], 1, {})
+                               for _ in range(self.render_workers)))
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        self.render_pool.shutdown(wait=False, cancel_futures=True)
+        for p in self.printers.values():
+            p.session.discard()
+            p.io.shutdown(wait=False)
+
+    def printer(self, name):
+        p = self.printers.get(name)
+        if p is None:
+            uri = self.uris.get(name)
+            if uri is None:
+                if not self.allow_adhoc:
+                    raise ValueError(f"unknown printer: {name!r}")
+                if len(self.printers) >= MAX_PRINTERS:
+                    raise ValueError(f"too many printers (max {MAX_PRINTERS})")
+                uri = name
+            lis6.open_transport(uri)  # rejects unknown URI schemes up front
+            p = self.printers[name] = Printer(name, uri)
+            asyncio.create_task(self.printer_loop(p))
+        return p
+
+    # ----- jobs -----
+    def submit(self, printer, records, copies=1, layout=None):
+        p = self.printer(printer)
+        job = Job(self.next_id, p.name, records, copies)
+        self.next_id += 1
+        job.rendered = asyncio.get_running_loop().run_in_executor(
+            self.render_pool, render_job, records, copies, layout or {})
+        p.queue.put_nowait(job)
+        return job
+
+    async def printer_loop(self, p):
+        loop = asyncio.get_running_loop()
+        unflushed = []
+        while True:
+            job = await p.queue.get()
+            try:
+                data = await job.rendered
+            except Exception as e:
+                self.finish(p, job, f"render failed: {e}")
+                data = None
+            try:
+                if data is not None:
+                    job.state = "printing"
+                    unflushed.append(job)
+                    await loop.run_in_executor(p.io, p.session.add, data, job.labels)
+                # idle: send now; busy: let a few jobs share one write
+                if unflushed and (p.queue.empty() or len(unflushed) >= FLUSH_JOBS):
+                    await loop.run_in_executor(p.io, p.session.flush)
+                    for j in unflushed:
+                        self.finish(p, j)
+                    unflushed = []
+            except Exception as e:
+                # the session already reconnected once; fail what was buffered
+                p.last_error = f"{type(e).__name__}: {e}"
+                await loop.run_in_executor(p.io, p.session.discard)
+                for j in unflushed:
+                    self.finish(p, j, p.last_error)
+                unflushed = []
+
+    def finish(self, p, job, error=None):
+        job.finished = time.perf_counter()
+        job.state = "failed" if error else "done"
+        job.error = error
+        if error:
+            p.jobs_failed += 1
+        else:
+            p.jobs_done += 1
+            p.labels += job.labels
+            self.printed.append((job.finished, job.labels))
+        self.latencies.append(job.finished - job.submitted)
+        job.done.set()
+
+    def status(self):
+        now = time.perf_counter()
+        while self.printed and self.printed[0][0] < now - 60:
+            self.printed.popleft()
+        latencies = sorted(self.latencies)
+
+        def pct(q):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2) if latencies else None
+
+        return {
+            "uptime_s": round(now - self.started, 1),
+            "render_workers": self.render_workers,
+            "labels_last_min": sum(n for _, n in self.printed),
+            "latency_ms": {"p50": pct(0.50), "p99": pct(0.99), "jobs": len(latencies)},
+            "printers": {p.name: {"uri": p.uri, "queued": p.queue.qsize(), "jobs_done": p.jobs_done,
+                                  "jobs_failed": p.jobs_failed, "labels": p.labels, "last_error": p.last_error}
+                         for p in self.printers.values()},
+        }
+
+    # ----- protocol -----
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    reply = await self.dispatch(json.loads(line))
+                except (ValueError, TypeError, KeyError) as e:
+                    reply = {"error": f"bad request: {e}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, req):
+        cmd = req.get("cmd")
+        if cmd == "status":
+            return self.status()
+        if cmd == "print":
+            records = [tuple(str(v) for v in rec) for rec in req["records"]]
+            if not records or any(len(rec) != 4 for rec in records):
+                raise ValueError("records must be non-empty [barcode, ward, name, ic] lists")
+            job = self.submit(req.get("printer", "default"), records,
+                              int(req.get("copies", 1)), req.get("layout"))
+            if req.get("wait"):
+                await job.done.wait()
+            return job.reply()
+        return {"error": f"unknown command: {cmd!r}"}
+
+
+async def main(port, printers, allow_adhoc=ALLOW_ADHOC_PRINTERS):
+    spooler = await Spooler(printers, allow_adhoc=allow_adhoc).start(port=port)
+    print(f"Print spooler on port {spooler.port}, printers: {spooler.uris}", flush=True)
+    try:
+        await spooler.serve_forever()
+    finally:
+        spooler.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--status"]:
+        with lis6.SpoolerClient(sys.argv[2] if len(sys.argv) > 2 else None) as client:
+            print(json.dumps(client.status(), indent=2))
+        sys.exit(0)
+    args = sys.argv[1:]
+    port = int(args.pop(0)) if args and args[0].isdigit() else lis6.SPOOLER_PORT
+    allow_adhoc = "--allow-adhoc" in args
+    printers = dict(PRINTERS)
+    printers.update(a.split("=", 1) for a in args if a != "--allow-adhoc")
+    try:
+        asyncio.run(main(port, printers, allow_adhoc))
+    except KeyboardInterrupt:
+        pass
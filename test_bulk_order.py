@@ -0,0 +1,67 @@
+# Tests for add_tests_bulk(): one test ordered for many patients in one statement.
+# Run with: python -m pytest -q
+
+import sqlite3
+
+import pytest
+
+import lis6
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+def ordered_rows(conn):
+    return conn.execute("SELECT barcode_data, test_name, test_date, result, price FROM tests ORDER BY id").fetchall()
+
+
+def test_orders_in_scan_order(db):
+    barcodes = ["R3", "R1", "O'NEIL \"7\"", "R2", "WAD ÄÖ 9"]
+    for b in barcodes:
+        lis6.upsert_patient(b, "Ward 3", f"PATIENT {b}", "")
+    lis6.set_all_prices({"GXM": 12.5})
+
+    ordered, missing, price = lis6.add_tests_bulk(
+        ["R3", "", "R1", "NOPE", "R3", None, "O'NEIL \"7\"", "R2", "NOPE", "WAD ÄÖ 9"], "GXM", "2025-06-01", "x")
+
+    assert [p[0] for p in ordered] == barcodes  # duplicates and blanks dropped
+    assert ordered[0] == ("R3", "Ward 3", "PATIENT R3", "")
+    assert missing == ["NOPE"]
+    assert price == 12.5
+    assert ordered_rows(db) == [(b, "GXM", "2025-06-01", "x", 12.5) for b in barcodes]
+    assert lis6.get_test_summary("R1") == (1, 12.5, "2025-06-01")
+    assert lis6.check_test_summary() == {}
+
+
+def test_price_is_snapshotted(db):
+    lis6.upsert_patient("R1", "W", "A", "")
+    lis6.set_all_prices({"GSH": 5.0})
+    lis6.add_tests_bulk(["R1"], "GSH", "2025-06-01")
+    lis6.set_all_prices({"GSH": 7.0})
+    lis6.add_tests_bulk(["R1"], "GSH", "2025-06-02")
+    assert [row[4] for row in ordered_rows(db)] == [5.0, 7.0]
+
+
+def test_nothing_to_order(db):
+    assert lis6.add_tests_bulk([], "GSH", "2025-06-01") == ([], [], 0.0)
+    assert lis6.add_tests_bulk(["NOPE"], "GSH", "2025-06-01") == ([], ["NOPE"], 0.0)
+    assert ordered_rows(db) == []
+
+
+def test_all_or_nothing(db):
+    for b in ("R1", "R2", "R3"):
+        lis6.upsert_patient(b, "W", b, "")
+    db.execute("""
+        CREATE TEMP TRIGGER fail_r3 BEFORE INSERT ON tests WHEN NEW.barcode_data = 'R3'
+        BEGIN SELECT RAISE(ABORT, 'disk on fire'); END
+    """)
+    with pytest.raises(sqlite3.IntegrityError):
+        lis6.add_tests_bulk(["R1", "R2", "R3"], "GSH", "2025-06-01")
+    assert ordered_rows(db) == []
+    assert lis6.check_test_summary() == {}
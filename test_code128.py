@@ -0,0 +1,73 @@
+# Verification tests for the direct Code128 encoder and rasterizer.
+# Run with: python -m pytest -q
+
+import random
+
+import pytest
+
+import lis6
+
+N_VERIFY = 100_000  # random barcodes decoded back to their data
+N_RENDER = 10_000   # of those, rendered and read back off the image
+
+ALPHABET = "0123456789" * 3 + "ABCDEFGHIJKLMNOPQRSTUVWXYZ-"
+
+
+def raster_modules(img):
+    """Read row 0 of a rendered 1-bit barcode back into a '1'/'0' module string."""
+    import numpy as np
+    bars = ~np.asarray(img)[0]
+    edges = np.flatnonzero(np.diff(bars.astype(np.int8))) + 1
+    runs = np.diff(np.concatenate(([0], edges, [bars.size])))[1:-1]  # drop quiet zones
+    unit = np.gcd.reduce(runs)
+    return "".join(("1" if i % 2 == 0 else "0") * (r // unit) for i, r in enumerate(runs))
+
+
+def decode_code128(modules):
+    """Decode a Code128 module string to text, checking the check digit."""
+    from barcode.charsets import code128
+    values = [code128.CODES.index(modules[i:i + 11]) for i in range(0, len(modules) - 13, 11)]
+    if (values[0] + sum(i * v for i, v in enumerate(values[1:-1], start=1))) % 103 != values[-1]:
+        raise ValueError("bad checksum")
+    charset, text = {103: "A", 104: "B", 105: "C"}[values[0]], []
+    for v in values[1:-1]:
+        if charset == "C" and v < 100:
+            text.append(f"{v:02d}")
+        elif charset == "B" and v < 96:
+            text.append(chr(v + 32))
+        elif charset == "A" and v < 96:
+            text.append(chr(v + 32) if v < 64 else chr(v - 64))
+        else:
+            charset = {99: "C", 100: "B", 101: "A"}[v]
+    return "".join(text)
+
+
+def random_barcodes(n, seed=7):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(1, 14))) for _ in range(n)]
+
+
+def test_encoder_round_trips():
+    bad = [data for data in random_barcodes(N_VERIFY)
+           if decode_code128(lis6.code128_modules(data)) != data]
+    assert bad == []
+
+
+def test_rendered_bars_match_modules():
+    bad = [data for data in random_barcodes(N_RENDER, seed=8)
+           if raster_modules(lis6.render_code128(data, width_cm=8.0)) != lis6.code128_modules(data)]
+    assert bad == []
+
+
+@pytest.mark.parametrize("data", ["508020005", "12345678", "A1234567B", "LAB-12a"])
+def test_bars_land_on_whole_dots(data):
+    img = lis6.render_code128(data)
+    assert img.mode == "1"
+    assert img.height == round(1.0 / 2.54 * lis6.PRINTER_DPI)
+    assert img.width % len(lis6.code128_modules(data) + "0" * 20) == 0  # whole-dot modules + quiet zones
+
+
+@pytest.mark.parametrize("data", ["50802é", "AB\tC"])
+def test_invalid_data_rejected(data):
+    with pytest.raises(ValueError):
+        lis6.code128_values(data)
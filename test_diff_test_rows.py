@@ -0,0 +1,108 @@
+# Tests for diff_test_rows(): the tree edits behind LISApp.show_window.
+# Run with: python -m pytest -q
+
+import random
+
+import lis6
+
+
+class FakeTree:
+    """The parts of a ttk.Treeview that show_window uses, as a list."""
+
+    def __init__(self, rows=()):
+        self.order = [str(row[0]) for row in rows]
+        self.values = {str(row[0]): lis6.test_row_values(row) for row in rows}
+
+    def apply(self, rows):
+        removed, updated, inserted = lis6.diff_test_rows(dict(self.values), rows)
+        for iid in removed:
+            self.order.remove(iid)
+            del self.values[iid]
+        for iid, vals in updated.items():
+            assert iid in self.values
+            self.values[iid] = vals
+        assert [index for index, _, _ in inserted] == sorted(index for index, _, _ in inserted)
+        for index, iid, vals in inserted:
+            assert iid not in self.values
+            self.order.insert(index, iid)
+            self.values[iid] = vals
+        return removed, updated, inserted
+
+    def shown(self):
+        return [(iid, self.values[iid]) for iid in self.order]
+
+
+def expected(rows):
+    return [(str(row[0]), lis6.test_row_values(row)) for row in rows]
+
+
+def listed(rows):
+    """rows in list_tests() order: newest date first, then highest id."""
+    return sorted(rows, key=lambda row: (row[2], row[0]), reverse=True)
+
+
+def make_rows(n, rnd):
+    return listed([(i, "FBC", f"2025-01-{rnd.randint(1, 28):02d}", "", 10.0) for i in range(1, n + 1)])
+
+
+def test_unchanged_window_is_untouched():
+    rows = make_rows(50, random.Random(1))
+    assert FakeTree(rows).apply(list(rows)) == ([], {}, [])
+
+
+def test_result_edit_updates_in_place():
+    rows = make_rows(50, random.Random(2))
+    tree = FakeTree(rows)
+    edited = [row if row[0] != 7 else (7, "GSH", row[2], "done", 12.5) for row in rows]
+    removed, updated, inserted = tree.apply(edited)
+    assert (removed, inserted) == ([], [])
+    assert updated == {"7": (7, "GSH", edited[[r[0] for r in edited].index(7)][2], "done", "12.50")}
+    assert tree.shown() == expected(edited)
+
+
+def test_date_change_moves_the_row():
+    rows = listed([(1, "FBC", "2025-01-01", "", 5.0), (2, "FBC", "2025-01-02", "", 5.0),
+                   (3, "FBC", "2025-01-03", "", 5.0)])
+    tree = FakeTree(rows)
+    moved = listed([(1, "FBC", "2025-01-09", "", 5.0), (2, "FBC", "2025-01-02", "", 5.0),
+                    (3, "FBC", "2025-01-03", "", 5.0)])
+    removed, updated, inserted = tree.apply(moved)
+    assert removed == ["1"] and updated == {}
+    assert inserted == [(0, "1", (1, "FBC", "2025-01-09", "", "5.00"))]
+    assert tree.shown() == expected(moved)
+
+
+def test_random_edits_reproduce_the_rows():
+    rnd = random.Random(3)
+    rows = make_rows(80, rnd)
+    tree = FakeTree(rows)
+    next_id = 81
+    for _ in range(300):
+        rows = list(rows)
+        for _ in range(rnd.randint(1, 5)):
+            op = rnd.random()
+            if op < 0.3 or not rows:
+                rows.append((next_id, "FBC", f"2025-01-{rnd.randint(1, 28):02d}", "", 10.0))
+                next_id += 1
+            elif op < 0.5:
+                rows.pop(rnd.randrange(len(rows)))
+            elif op < 0.75:
+                i = rnd.randrange(len(rows))
+                rows[i] = rows[i][:3] + (f"r{rnd.random():.3f}", rnd.choice([None, 5.0, 12.5]))
+            else:
+                i = rnd.randrange(len(rows))
+                rows[i] = (rows[i][0], rows[i][1], f"2025-01-{rnd.randint(1, 28):02d}") + rows[i][3:]
+        rows = listed(rows)
+        tree.apply(rows)
+        assert tree.shown() == expected(rows)
+
+
+def test_sliding_window():
+    # paging drops rows off one end and adds them at the other
+    rows = make_rows(300, random.Random(4))
+    tree = FakeTree(rows[:100])
+    for start in (50, 150, 200, 120, 0):
+        removed, updated, inserted = tree.apply(rows[start:start + 100])
+        assert updated == {}
+        assert len(removed) == len(inserted)
+        assert tree.shown() == expected(rows[start:start + 100])
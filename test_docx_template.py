@@ -0,0 +1,50 @@
+# Tests that the compiled DOCX sticker template reads back like python-docx output.
+# Run with: python -m pytest -q
+
+import io
+from datetime import datetime
+
+import pytest
+from docx import Document
+
+import lis6
+
+RECORDS = [
+    ("508020005", "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354"),
+    ("LAB-12a", "A&E", "TAN & SONS <ICU> \"Q\" O'NEILL", "850101-14-5678"),
+    ("12345678", None, None, "IC"),
+    ("99", "<Ward>", "AMPERSAND &amp; ALREADY", "1-2"),
+] + [(f"5{i:08d}", f"Ward {i % 20}", f"PATIENT {i}", f"IC{i:012d}") for i in range(20)]
+
+
+class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 6, 1, 8, 5)
+
+
+@pytest.fixture(autouse=True)
+def fixed_clock(monkeypatch):
+    monkeypatch.setattr(lis6, "datetime", FixedDatetime)
+
+
+def test_template_matches_python_docx():
+    got = Document(io.BytesIO(lis6.build_sticker_docx(RECORDS)))
+    want = lis6.build_sticker_doc(RECORDS)
+
+    assert [p.text for p in got.paragraphs] == [p.text for p in want.paragraphs]
+    images = [got.part.related_parts[f"rIdSticker{k}"].blob for k in range(1, len(RECORDS) + 1)]
+    assert images == [lis6.barcode_png(r[0]).getvalue() for r in RECORDS]
+    assert [bool(p.paragraph_format.page_break_before) for p in got.paragraphs] == \
+        [False] + [True] * (len(RECORDS) - 1)
+
+
+def test_text_is_escaped_and_none_is_blank():
+    records = RECORDS[1:4] + [("7", "W\x0b1", "NAME\x01", "IC")]  # control chars are dropped
+    paragraphs = Document(io.BytesIO(lis6.build_sticker_docx(records))).paragraphs
+    assert [p.text for p in paragraphs] == [
+        "\nLAB-12a (A&E)\nTAN & SONS <ICU> \"Q\" O'NEILL\n01/06 - 08:05 - IC: 850101-14-5678",
+        "\n12345678 ()\n\n01/06 - 08:05 - IC: IC",
+        "\n99 (<Ward>)\nAMPERSAND &amp; ALREADY\n01/06 - 08:05 - IC: 1-2",
+        "\n7 (W1)\nNAME\n01/06 - 08:05 - IC: IC",
+    ]
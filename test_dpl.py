@@ -0,0 +1,60 @@
+# Golden tests for the DPL sticker bytes sent to the Datamax E-4204B.
+# Run with: python -m pytest -q
+
+from datetime import datetime
+
+import pytest
+
+import lis6
+
+NOW = datetime(2025, 6, 1, 8, 5)
+
+GOLDEN = [
+    # all digits: odd-length run, so subset C then one digit in B; 3-dot modules
+    (("508020005", "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354"),
+     b"\x02L\r\nD11\r\n"
+     b"1e3303900360033508020005\r\n"
+     b"131100000220046508020005\r\n"
+     b"121100000220117 (Ward 8)\r\n"
+     b"121100000120028NORSYUHADA BINTI MOHD SABRI\r\n"
+     b"12110000002001301/06 - 08:05 - IC: 010722120354\r\n"
+     b"Q0001\r\nE\r\n"),
+    # mixed letters, dash and lower case: subset B, 2-dot modules
+    (("LAB-12a", "ICU", "TAN AH KOW", "850101-14-5678"),
+     b"\x02L\r\nD11\r\n"
+     b"1e2203900360053LAB-12a\r\n"
+     b"131100000220062LAB-12a\r\n"
+     b"121100000220117 (ICU)\r\n"
+     b"121100000120078TAN AH KOW\r\n"
+     b"12110000002000701/06 - 08:05 - IC: 850101-14-5678\r\n"
+     b"Q0001\r\nE\r\n"),
+    # a name wider than the label starts at column 0 instead of going negative
+    (("12345678", "Ward 12", "MUHAMMAD HAFIZUDDIN BIN ABDUL RAHMAN AL-HAFIZ", "IC"),
+     b"\x02L\r\nD11\r\n"
+     b"1e330390036004912345678\r\n"
+     b"13110000022004712345678\r\n"
+     b"121100000220110 (Ward 12)\r\n"
+     b"121100000120000MUHAMMAD HAFIZUDDIN BIN ABDUL RAHMAN AL-HAFIZ\r\n"
+     b"12110000002004301/06 - 08:05 - IC: IC\r\n"
+     b"Q0001\r\nE\r\n"),
+]
+
+
+@pytest.mark.parametrize("record, expected", GOLDEN, ids=["digits", "mixed", "long-name"])
+def test_sticker_dpl_golden(record, expected):
+    lis6.clear_sticker_cache()
+    assert lis6.build_sticker_dpl(*record, now=NOW) == expected
+    # second call comes from the static-field cache and must not differ
+    assert lis6.build_sticker_dpl(*record, now=NOW) == expected
+
+
+def test_quantity_and_batch():
+    record, expected = GOLDEN[0]
+    assert lis6.build_sticker_dpl(*record, now=NOW, quantity=3) == expected.replace(b"Q0001", b"Q0003")
+    assert lis6.build_stickers_dpl([g[0] for g in GOLDEN], now=NOW) == b"".join(g[1] for g in GOLDEN)
+
+
+@pytest.mark.parametrize("barcode", ["50802é", "AB\x01C"])
+def test_non_code128_barcode_rejected(barcode):
+    with pytest.raises(ValueError):
+        lis6.build_sticker_dpl(barcode, "Ward 8", "NAME", "IC", now=NOW)
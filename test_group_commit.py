@@ -0,0 +1,82 @@
+# Tests for the group-commit TestWriter: durability, per-statement isolation
+# and error delivery.
+# Run with: python -m pytest -q
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import lis6
+
+# Feeds add_test statements through a TestWriter and prints each id as its
+# commit is acknowledged, until it is killed.
+CRASH_WRITER = """
+import sys, lis6
+lis6.DB_PATH = sys.argv[1]
+writer = lis6.start_test_writer()
+def acked(fut):
+    print(fut.result(), flush=True)
+for i in range(1_000_000):
+    writer.submit(*lis6.add_test_statement("CRASH", "FBC", "2025-06-01", str(i), 1.0)).add_done_callback(acked)
+"""
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.stop_test_writer()
+    lis6.close_conn()
+
+
+def test_acknowledged_writes_survive_kill(db):
+    lis6.close_conn()
+    proc = subprocess.Popen([sys.executable, "-c", CRASH_WRITER, lis6.DB_PATH], stdout=subprocess.PIPE,
+                            text=True, cwd=os.path.dirname(os.path.abspath(lis6.__file__)))
+    try:
+        acked = [int(proc.stdout.readline()) for _ in range(2000)]
+    finally:
+        proc.kill()
+        proc.wait()
+    acked += [int(line) for line in proc.stdout.read().split()]  # printed before the kill landed
+
+    check = sqlite3.connect(lis6.DB_PATH)
+    present = {r[0] for r in check.execute("SELECT id FROM tests WHERE barcode_data = 'CRASH'")}
+    check.close()
+    assert len(acked) >= 2000
+    assert set(acked) <= present
+
+
+def test_failing_statement_does_not_undo_its_batch(db):
+    writer = lis6.TestWriter(max_batch=16, max_delay=0.5)  # the three land in one batch
+    try:
+        good1 = writer.submit(*lis6.add_test_statement("B1", "FBC", "2025-06-01", "one", 1.0))
+        bad = writer.submit("INSERT INTO test_prices (test_name, price) VALUES ('X', NULL)")
+        good2 = writer.submit(*lis6.add_test_statement("B1", "FBC", "2025-06-01", "two", 1.0))
+        ids = [good1.result(5), good2.result(5)]
+        with pytest.raises(sqlite3.IntegrityError):
+            bad.result(5)
+    finally:
+        writer.stop()
+
+    assert writer.metrics()["batches"] == 1
+    rows = db.execute("SELECT id, result FROM tests ORDER BY id").fetchall()
+    assert rows == [(ids[0], "one"), (ids[1], "two")]
+    assert db.execute("SELECT COUNT(*) FROM test_prices WHERE test_name = 'X'").fetchone()[0] == 0
+
+
+def test_errors_reach_the_waiting_caller(db):
+    lis6.start_test_writer()
+    test_id = lis6.add_test("B1", "FBC", "2025-06-01", "", 1.0)
+    lis6.update_test(test_id, "GXM", "2025-06-02", "ok")
+    assert db.execute("SELECT test_name, result FROM tests WHERE id = ?", (test_id,)).fetchone() == ("GXM", "ok")
+
+    with pytest.raises(sqlite3.OperationalError):
+        lis6._test_writer.submit("UPDATE no_such_table SET x = 1").result(5)
+    # the writer keeps going after a failure
+    assert lis6.add_test("B1", "FBC", "2025-06-01", "", 1.0) == test_id + 1
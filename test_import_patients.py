@@ -0,0 +1,63 @@
+# Tests for the census file importer.
+# Run with: python -m pytest -q
+
+import os
+
+import pytest
+
+import lis6
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    lis6.upsert_patient("B1", "Ward 1", "AHMAD BIN ALI", "850101-14-5678")
+    yield
+    lis6.close_conn()
+
+
+def census(tmp_path, text):
+    path = tmp_path / "census.csv"
+    path.write_text(text)
+    return str(path)
+
+
+def test_missing_columns_keep_stored_values(db, tmp_path):
+    res = lis6.import_patients(census(tmp_path, "Barcode,Name\nB1,AHMAD ALI\nB2,SITI\n"))
+
+    assert res["imported"] == 2
+    assert lis6.get_patient("B1") == ("B1", "Ward 1", "AHMAD ALI", "850101-14-5678")
+    assert lis6.get_patient("B2") == ("B2", "", "SITI", "")
+
+
+def test_blank_cells_in_present_columns_are_written(db, tmp_path):
+    lis6.import_patients(census(tmp_path, "Barcode,Ward,Name,IC\nB1,,AHMAD BIN ALI,\n"))
+    assert lis6.get_patient("B1") == ("B1", "", "AHMAD BIN ALI", "")
+
+
+@pytest.mark.parametrize("header, missing, bad", [
+    ("Barcode,Ward", "Name", None),
+    ("Barcod,Ward,Name,IC", "Barcode", "'Barcod'"),
+    ("Ward,IC", "Barcode or Name", None),
+])
+def test_bad_header_rejects_file_before_any_row(db, tmp_path, header, missing, bad):
+    path = census(tmp_path, f"{header}\nB1,Ward 9,X,Y\n")
+
+    with pytest.raises(ValueError) as err:
+        lis6.import_patients(path)
+
+    assert f"no {missing} column" in str(err.value)
+    if bad:
+        assert bad in str(err.value)
+    assert lis6.get_patient("B1") == ("B1", "Ward 1", "AHMAD BIN ALI", "850101-14-5678")
+    assert not os.path.exists(path + ".rejected.csv")
+
+
+def test_ic_number_stored_as_given(db, tmp_path):
+    lis6.import_patients(census(tmp_path, "Barcode,Name,IC\nB2,SITI,900202-10-1234\nB3,TAN,A1234567\n"))
+
+    assert lis6.get_patient("B2")[3] == "900202-10-1234"
+    assert lis6.get_patient("B3")[3] == "A1234567"
+    assert [r[0] for r in lis6.search_patients("900202101234")] == ["B2"]
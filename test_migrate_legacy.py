@@ -0,0 +1,118 @@
+# Tests for migrate_legacy.py: the legacy_tests id mapping, resuming and verify().
+# Run with: python -m pytest -q
+
+import random
+import sqlite3
+
+import pytest
+
+import lis6
+import migrate_legacy
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+@pytest.fixture
+def legacy_path(tmp_path):
+    path = str(tmp_path / "lab_info.db")
+    legacy = sqlite3.connect(path)
+    legacy.executescript("""
+        CREATE TABLE patient_tests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, barcode TEXT, ward TEXT, name TEXT, ic TEXT,
+            test_name TEXT, test_date TEXT, result TEXT, price REAL);
+        CREATE TABLE test_prices (test_name TEXT PRIMARY KEY, price REAL);
+    """)
+    rnd = random.Random(9)
+    with legacy:
+        legacy.executemany("INSERT INTO test_prices VALUES (?, ?)", [("GXM", 99.0), ("OLD TEST", 15.0)])
+        legacy.executemany("""
+            INSERT INTO patient_tests (barcode, ward, name, ic, test_name, test_date, result, price)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(rnd.choice([f"L{rnd.randrange(40):03d}", None]), f"Ward {i % 3}", f"PATIENT {i}", "",
+               rnd.choice(["GXM", "OLD TEST"]), f"2024-01-{rnd.randint(1, 28):02d}", f"r{i}",
+               rnd.choice([40.0, 80.0, None]))
+              for i in range(500)])
+        legacy.execute("DELETE FROM patient_tests WHERE id % 7 = 0")  # gaps in the legacy ids
+    legacy.close()
+    return path
+
+
+def mismatched_rows(conn, legacy_path):
+    """Legacy rows whose mapped tests row differs from them (or is missing)."""
+    conn.execute("ATTACH DATABASE ? AS legacy", (legacy_path,))
+    try:
+        return conn.execute("""
+            SELECT l.id FROM legacy.patient_tests l
+            LEFT JOIN legacy_tests m ON m.legacy_id = l.id
+            LEFT JOIN tests t ON t.id = m.test_id
+            WHERE t.id IS NULL
+               OR (t.barcode_data, t.test_name, t.test_date, t.result, t.price)
+                  IS NOT (l.barcode, l.test_name, l.test_date, l.result, l.price)
+        """).fetchall()
+    finally:
+        conn.execute("DETACH DATABASE legacy")
+
+
+def test_mapping_points_at_the_copied_rows(db, legacy_path):
+    # tests already in lis.db: the migrated ids do not start at 1
+    lis6.add_test("L000", "GSH", "2025-01-01", "", 5.0)
+    lis6.upsert_patient("L001", "LIS WARD", "LIS NAME", "LIS IC")
+    lis6.set_all_prices({"GXM": 12.5})
+
+    copied, _ = migrate_legacy.migrate(legacy_path, chunk_rows=37)
+
+    assert copied == db.execute("SELECT COUNT(*) FROM legacy_tests").fetchone()[0] > 400
+    assert mismatched_rows(db, legacy_path) == []
+    assert lis6.get_patient("L001") == ("L001", "LIS WARD", "LIS NAME", "LIS IC")
+    assert lis6.get_current_price("GXM") == 12.5      # LIS prices win
+    assert lis6.get_current_price("OLD TEST") == 15.0  # legacy-only tests are added
+    assert lis6.check_test_summary() == {}
+    assert migrate_legacy.verify(legacy_path) == ([], copied, copied)
+
+
+def test_interrupted_run_resumes(db, legacy_path):
+    class Interrupted(Exception):
+        pass
+
+    def stop_after_two_chunks(done, total, seconds):
+        if done >= 100:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        migrate_legacy.migrate(legacy_path, chunk_rows=50, progress=stop_after_two_chunks)
+    assert db.execute("SELECT COUNT(*) FROM legacy_tests").fetchone()[0] == 100
+    problems, legacy_count, migrated_count = migrate_legacy.verify(legacy_path)
+    assert migrated_count == 100
+    assert problems[0] == f"row count: legacy {legacy_count} vs migrated 100"
+
+    copied, _ = migrate_legacy.migrate(legacy_path, chunk_rows=50)
+    assert copied == legacy_count - 100
+    assert migrate_legacy.migrate(legacy_path)[0] == 0  # nothing left to copy
+    assert mismatched_rows(db, legacy_path) == []
+    assert migrate_legacy.verify(legacy_path) == ([], legacy_count, legacy_count)
+
+
+def test_verify_reports_differences(db, legacy_path):
+    migrate_legacy.migrate(legacy_path)
+    changed, deleted = db.execute("""
+        SELECT MIN(t.id), MAX(t.id) FROM legacy_tests m JOIN tests t ON t.id = m.test_id
+        WHERE t.barcode_data = 'L005'
+    """).fetchone()
+    with db:
+        db.execute("UPDATE tests SET price = price + 1 WHERE id = ?", (changed,))
+        db.execute("UPDATE tests SET price = 1 WHERE id IN (SELECT test_id FROM legacy_tests) "
+                   "AND barcode_data = 'L006'")
+        db.execute("DELETE FROM tests WHERE id = ?", (deleted,))
+
+    problems, legacy_count, migrated_count = migrate_legacy.verify(legacy_path)
+
+    assert migrated_count == legacy_count - 1
+    assert problems[0] == f"row count: legacy {legacy_count} vs migrated {migrated_count}"
+    assert [p.split(":")[0] for p in problems[1:]] == ["L005", "L006"]
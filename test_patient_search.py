@@ -0,0 +1,79 @@
+# Tests for the patients_fts search index: migration, VACUUM and bulk import.
+# Run with: python -m pytest -q
+
+import sqlite3
+
+import pytest
+
+import lis6
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    yield lis6.DB_PATH
+    lis6.close_conn()
+
+
+def barcodes(text):
+    return sorted(row[0] for row in lis6.search_patients(text))
+
+
+def test_search_survives_vacuum(db):
+    lis6.init_db()
+    conn = lis6.get_conn()
+    # patients_fts is keyed by patients.id: an INTEGER PRIMARY KEY is never
+    # renumbered, unlike an implicit rowid (VACUUM, dump/restore)
+    pk = [row[1] for row in conn.execute("PRAGMA table_info(patients)") if row[5]]
+    assert pk == ["id"]
+
+    for i in range(200):
+        lis6.upsert_patient(f"B{i:04d}", "W", f"PATIENT{i:04d}", f"IC{i:04d}")
+    with conn:
+        conn.execute("DELETE FROM patients WHERE barcode_data < 'B0100'")  # leave rowid gaps
+    conn.execute("VACUUM")
+    assert barcodes("patient0150") == ["B0150"]
+    assert barcodes("patient0050") == []
+
+
+def test_migration_keeps_patients_and_index(db):
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE patients (barcode_data TEXT PRIMARY KEY, ward TEXT, name TEXT, "
+                 "ic_number TEXT)")
+    conn.execute("CREATE TABLE tests (id INTEGER PRIMARY KEY AUTOINCREMENT, barcode_data TEXT, "
+                 "test_name TEXT, test_date TEXT, result TEXT, price REAL DEFAULT 0)")
+    conn.executemany("INSERT INTO patients VALUES (?, ?, ?, ?)",
+                     [("B1", "W1", "AHMAD BIN ALI", "850101-14-5678"), ("B2", "W2", "TAN AH KOW", "")])
+    for step, script in enumerate(lis6.MIGRATIONS[:4], start=1):
+        conn.executescript(f"BEGIN; {script}; PRAGMA user_version={step}; COMMIT;")
+    conn.close()
+
+    lis6.init_db()
+    assert lis6.get_patient("B1") == ("B1", "W1", "AHMAD BIN ALI", "850101-14-5678")
+    assert barcodes("ahmad") == ["B1"]
+    assert barcodes("850101145") == ["B1"]
+    lis6.upsert_patient("B2", "W2", "TAN RENAMED", "")
+    assert barcodes("renamed") == ["B2"]
+    assert barcodes("kow") == []
+
+
+def test_import_keeps_index_in_sync(db, tmp_path):
+    lis6.init_db()
+    lis6.upsert_patient("B1", "W1", "OLD NAME", "111")
+    path = tmp_path / "census.csv"
+    path.write_text("Barcode,Ward,Name,IC\n"
+                    "B1,W1,NEW NAME,111\n"
+                    "B2,W2,SITI AMINAH,222\n"
+                    "B2,W2,SITI ZAHRA,222\n")
+
+    res = lis6.import_patients(str(path), chunk_rows=2)
+
+    assert res["imported"] == 3
+    assert barcodes("old") == []
+    assert barcodes("new") == ["B1"]
+    assert barcodes("aminah") == []
+    assert barcodes("zahra") == ["B2"]
+    # the sync triggers are back for ordinary edits
+    lis6.upsert_patient("B3", "W3", "LATE ARRIVAL", "333")
+    assert barcodes("late") == ["B3"]
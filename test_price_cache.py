@@ -0,0 +1,112 @@
+# Tests for the per-thread price cache and its PRAGMA data_version recheck.
+# Run with: python -m pytest -q
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import lis6
+
+RECHECK = 0.05
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    monkeypatch.setattr(lis6, "PRICE_RECHECK_SECONDS", RECHECK)
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+@pytest.fixture
+def statements(db):
+    seen = []
+    db.set_trace_callback(seen.append)
+    yield seen
+    db.set_trace_callback(None)
+
+
+def edit_elsewhere(sql, params=()):
+    other = sqlite3.connect(lis6.DB_PATH)
+    with other:
+        other.execute(sql, params)
+    other.close()
+
+
+def price_loads(statements):
+    return sum("FROM test_prices" in sql for sql in statements)
+
+
+def test_cached_between_rechecks(db, statements):
+    lis6.get_current_price("GXM")
+    time.sleep(RECHECK)
+    statements.clear()
+    for _ in range(100):
+        lis6.get_current_price("GXM")
+    # one data_version check once the interval is up, then nothing at all
+    assert statements == ["PRAGMA data_version"]
+
+
+def test_other_connection_edit_seen_after_recheck(db, statements):
+    assert lis6.get_current_price("GXM") == 0.0
+    edit_elsewhere("UPDATE test_prices SET price=42 WHERE test_name='GXM'")
+    assert lis6.get_current_price("GXM") == 0.0  # within the interval: the cached copy
+    time.sleep(RECHECK)
+    assert lis6.get_current_price("GXM") == 42.0
+    assert price_loads(statements) == 1
+
+
+def test_unrelated_commit_reloads_without_changing_prices(db, statements):
+    edit_elsewhere("INSERT INTO patients (barcode_data, name) VALUES ('B1', 'A')")
+    time.sleep(RECHECK)
+    assert lis6.get_all_prices() == dict.fromkeys(lis6.TEST_CHOICES, 0.0)
+    assert price_loads(statements) == 1  # data_version counts any commit
+
+
+def test_own_edit_seen_at_once(db):
+    lis6.get_current_price("GXM")
+    lis6.set_all_prices({"GXM": 12.5, "NOT A TEST": 1.0})
+    assert lis6.get_current_price("GXM") == 12.5
+    assert lis6.get_current_price("NOT A TEST") == 0.0
+
+
+def test_other_thread_sees_edit_after_recheck(db):
+    cached, edited, prices = threading.Event(), threading.Event(), []
+
+    def reader():
+        prices.append(lis6.get_current_price("GXM"))
+        cached.set()
+        edited.wait()
+        prices.append(lis6.get_current_price("GXM"))
+        time.sleep(RECHECK)
+        prices.append(lis6.get_current_price("GXM"))
+        lis6.close_conn()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    cached.wait()
+    lis6.set_all_prices({"GXM": 9.0})
+    edited.set()
+    thread.join()
+    assert prices == [0.0, 0.0, 9.0]
+
+
+def test_switching_database_reloads(db, tmp_path, monkeypatch):
+    assert lis6.get_current_price("GXM") == 0.0
+    other = str(tmp_path / "other.db")
+
+    def make_other():  # on its own thread, so this thread's cache is left alone
+        lis6.DB_PATH = other
+        lis6.init_db()
+        lis6.set_all_prices({"GXM": 12.5})
+        lis6.close_conn()
+
+    thread = threading.Thread(target=make_other)
+    thread.start()
+    thread.join()
+    assert lis6.DB_PATH == other
+    assert lis6.get_current_price("GXM") == 12.5
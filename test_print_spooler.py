@@ -0,0 +1,147 @@
+# Tests for print_spooler.Spooler: per-printer order, render failures, printer names.
+# Run with: python -m pytest -q
+
+import asyncio
+import re
+import socket
+import threading
+
+import pytest
+
+import lis6
+import print_spooler
+from fake_printer import LABEL_END, LoopbackPrinter
+
+
+@pytest.fixture
+def printers():
+    with LoopbackPrinter() as a, LoopbackPrinter() as b:
+        yield {"a": a, "b": b}
+
+
+@pytest.fixture
+def spooler(printers):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    uris = {name: p.uri for name, p in printers.items()}
+    spooler = asyncio.run_coroutine_threadsafe(
+        print_spooler.Spooler(uris, render_workers=2).start("127.0.0.1", 0), loop).result(60)
+    yield spooler
+
+    async def close():
+        spooler.close()
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}  # the printer loops
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def client(spooler):
+    with lis6.SpoolerClient(f"127.0.0.1:{spooler.port}") as client:
+        yield client
+
+
+def printed_barcodes(printer):
+    with printer.lock:
+        labels = bytes(printer.data).split(LABEL_END)[:-1]
+    return [re.search(rb"S\d{4}", label).group().decode() for label in labels]
+
+
+def records(barcode, n=1):
+    return [(barcode, "Ward 1", f"PATIENT {barcode}", "IC")] * n
+
+
+def test_jobs_print_in_submission_order_per_printer(printers, client):
+    sent = {"a": [], "b": []}
+    jobs = []
+    for i in range(60):
+        name = "ab"[i % 3 == 0]
+        size = 1 + i * 7 % 5  # uneven render times, so renders finish out of order
+        reply = client.submit(records(f"S{i:04d}", size), printer=name)
+        assert reply["state"] == "queued"
+        jobs.append(reply["job"])
+        sent[name] += [f"S{i:04d}"] * size
+    assert jobs == sorted(set(jobs))
+
+    for name, printer in printers.items():
+        printer.wait_for_labels(len(sent[name]))
+        assert printed_barcodes(printer) == sent[name]
+    status = client.status()["printers"]
+    assert status["a"]["jobs_done"] + status["b"]["jobs_done"] == 60
+    assert status["a"]["labels"] == len(sent["a"])
+
+
+def test_concurrent_clients_keep_their_order(spooler, printers):
+    def client(k):
+        with lis6.SpoolerClient(f"127.0.0.1:{spooler.port}") as c:
+            for i in range(50):
+                c.submit(records(f"S{k}{i:03d}"), printer="ab"[i % 2])
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for name, printer in printers.items():
+        printer.wait_for_labels(100)
+        got = printed_barcodes(printer)
+        for k in range(4):
+            mine = [b for b in got if b[1] == str(k)]
+            assert mine == [f"S{k}{i:03d}" for i in range(50) if "ab"[i % 2] == name]
+
+
+def test_render_failure_fails_only_that_job(printers, client):
+    first = client.submit(records("S0001"), printer="a")
+    bad = client.submit(records("S0002"), printer="a", wait=True, BARCODE_WIDTH_CM="wide")
+    last = client.submit(records("S0003"), printer="a", wait=True)
+
+    assert bad["state"] == "failed"
+    assert bad["error"].startswith("render failed: ")
+    assert last["state"] == "done" and last["job"] == first["job"] + 2
+    printers["a"].wait_for_labels(2)
+    assert printed_barcodes(printers["a"]) == ["S0001", "S0003"]
+    status = client.status()["printers"]["a"]
+    assert (status["jobs_done"], status["jobs_failed"]) == (2, 1)
+
+
+def test_dead_printer_fails_its_jobs(spooler, client, monkeypatch):
+    monkeypatch.setattr(spooler, "allow_adhoc", True)
+    with socket.socket() as sock:  # a port nobody listens on
+        sock.bind(("127.0.0.1", 0))
+        dead = f"tcp://127.0.0.1:{sock.getsockname()[1]}"
+    reply = client.submit(records("S0001"), printer=dead, wait=True)
+    assert reply["state"] == "failed"
+    assert "ConnectionRefusedError" in reply["error"]
+    assert client.status()["printers"][dead]["jobs_failed"] == 1
+    assert client.submit(records("S0002"), printer="a", wait=True)["state"] == "done"
+
+
+def test_unknown_printer_is_rejected(spooler, client, tmp_path):
+    target = tmp_path / "written.dpl"
+    for name in ("nope", f"file:{target}"):
+        with pytest.raises(RuntimeError, match="unknown printer"):
+            client.submit(records("S0001"), printer=name)
+    assert not target.exists()
+    assert sorted(client.status()["printers"]) == []
+    # the connection is still good
+    assert client.submit(records("S0001"), printer="b", wait=True)["state"] == "done"
+
+
+def test_adhoc_printers_when_allowed(spooler, client, monkeypatch):
+    monkeypatch.setattr(spooler, "allow_adhoc", True)
+    monkeypatch.setattr(print_spooler, "MAX_PRINTERS", 1)
+    with pytest.raises(RuntimeError, match="Unknown printer URI"):
+        client.submit(records("S0001"), printer="gopher://x")
+    with LoopbackPrinter() as adhoc:
+        assert client.submit(records("S0001"), printer=adhoc.uri, wait=True)["state"] == "done"
+        adhoc.wait_for_labels(1)
+        assert printed_barcodes(adhoc) == ["S0001"]
+    with pytest.raises(RuntimeError, match="too many printers"):
+        client.submit(records("S0001"), printer="tcp://127.0.0.1:9")
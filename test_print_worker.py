@@ -0,0 +1,45 @@
+# Headless tests for the background PrintWorker.
+# Run with: python -m pytest -q
+
+import threading
+
+import lis6
+
+
+def test_500_jobs_complete_in_order_without_blocking():
+    printed = []
+    started, release = threading.Event(), threading.Event()
+
+    def stuck_printer(records):
+        started.set()
+        assert release.wait(10)  # a printer that is busy until the test lets go
+        printed.extend(rec[0] for rec in records)
+
+    worker = lis6.PrintWorker(backend=stuck_printer)
+    ids = [worker.submit([(f"B{i:05d}", "W", "N", "IC")]) for i in range(500)]
+    # every submit() returned while the first job is still stuck in the printer
+    assert started.wait(10)
+    assert printed == [] and worker.poll() == []
+    assert worker.pending() == 499
+    release.set()
+    worker.stop()
+    done = worker.poll()
+
+    assert printed == [f"B{i:05d}" for i in range(500)]
+    assert done == [(job_id, None) for job_id in ids]
+
+
+def test_failed_job_is_reported_and_worker_keeps_going():
+    def flaky_printer(records):
+        if records[0][0] == "BAD":
+            raise OSError("printer offline")
+
+    worker = lis6.PrintWorker(backend=flaky_printer)
+    ids = [worker.submit([(b, "W", "N", "IC")]) for b in ("OK1", "BAD", "OK2")]
+    worker.stop()
+    done = dict(worker.poll())
+
+    assert list(done) == ids
+    assert done[ids[0]] is None and done[ids[2]] is None
+    assert isinstance(done[ids[1]], OSError)
+
@@ -0,0 +1,34 @@
+# Headless tests for PrinterSession's timer-driven flushes.
+# Run with: python -m pytest -q
+
+import time
+
+import pytest
+
+import lis6
+
+
+def test_timer_flush_error_surfaces_on_next_call(tmp_path):
+    out = tmp_path / "spool" / "labels.dpl"  # directory missing: the write fails
+    session = lis6.PrinterSession(f"file:{out}", max_delay=0.01)
+    session.add(b"LABEL1", labels=1)
+    time.sleep(0.2)  # let the timer fire and fail
+
+    assert session.buffered_labels == 1  # nothing lost
+    with pytest.raises(OSError):
+        session.add(b"LABEL2")
+    # the error is reported once; a retry after fixing the cause sends the block
+    out.parent.mkdir()
+    session.flush()
+    session.close()
+    assert out.read_bytes() == b"LABEL1"
+    assert session.labels_sent == 1
+
+
+def test_discard_clears_pending_error(tmp_path):
+    session = lis6.PrinterSession(f"file:{tmp_path / 'missing' / 'x.dpl'}", max_delay=0.01)
+    session.add(b"LABEL1")
+    time.sleep(0.2)
+    session.discard()
+    session.close()  # nothing pending, nothing to send
+    assert session.labels_sent == 0
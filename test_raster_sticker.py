@@ -0,0 +1,53 @@
+# Tests for the 1-bit printer-resolution sticker renderer.
+# Run with: python -m pytest -q
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import lis6
+from test_code128 import decode_code128, raster_modules
+
+NOW = datetime(2025, 6, 1, 8, 5)
+LONG_NAME = "MUHAMMAD HAFIZUDDIN BIN ABDUL RAHMAN AL-HAFIZ"
+
+
+def ink(field, value, dpi=203):
+    """Columns where `value` in `field` puts ink that a sticker with it blank lacks."""
+    rec = dict(barcode_data="12345678", ward="Ward 12", name="TAN AH KOW", ic_number="IC",
+               dpi=dpi, now=NOW)
+    base = ~np.asarray(lis6.render_sticker_image(**dict(rec, **{field: ""})))
+    img = ~np.asarray(lis6.render_sticker_image(**dict(rec, **{field: value})))
+    return np.flatnonzero((img != base).any(axis=0)), img.shape[1]
+
+
+@pytest.mark.parametrize("dpi", [203, 300])
+def test_bars_decode_on_a_pure_1bit_label(dpi):
+    for i in range(200):
+        data = f"L{i:05d}-{i * 7919 % 100000:05d}"
+        img = lis6.render_sticker_image(data, "Ward 8", "NORSYUHADA BINTI MOHD SABRI", "010722120354",
+                                        dpi=dpi, now=NOW)
+        assert img.mode == "1"
+        assert img.size == (round(5.5 / 2.54 * dpi), round(2.0 / 2.54 * dpi))
+        assert decode_code128(raster_modules(img)) == data
+
+
+@pytest.mark.parametrize("dpi", [203, 300])
+def test_long_name_shrinks_to_fit_inside_the_label(dpi):
+    cols, width = ink("name", LONG_NAME, dpi)
+    assert 0 < cols.min() and cols.max() < width - 1  # nothing cut off at either end
+    short, _ = ink("name", "TAN AH KOW", dpi)
+    assert abs((short.min() + short.max()) - (width - 1)) <= 4  # short names stay centred
+
+
+@pytest.mark.parametrize("field, value", [("ward", "PAEDIATRIC INTENSIVE CARE UNIT"),
+                                          ("ic_number", "PASSPORT A12345678 (MALAYSIA)")])
+def test_long_ward_and_ic_lines_fit(field, value):
+    cols, width = ink(field, value)
+    assert 0 < cols.min() and cols.max() < width - 1
+
+
+def test_name_too_long_even_shrunk_starts_at_left_edge():
+    cols, width = ink("name", "ABDUL " * 30)
+    assert cols.min() <= 2  # the start of the name is kept; only the end is cut off
@@ -0,0 +1,143 @@
+# Tests for lis_server.py's error replies and RemoteLIS's retry rules.
+# Run with: python -m pytest -q
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import lis6
+import lis_server
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    srv = asyncio.run_coroutine_threadsafe(lis_server.LISServer("127.0.0.1", 0).start(), loop).result(10)
+    yield srv
+
+    async def close():
+        srv.close()
+
+    asyncio.run_coroutine_threadsafe(close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    lis6.close_conn()
+
+
+def raw_request(port, head):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(head)
+        data = b""
+        while chunk := sock.recv(4096):  # the server closes after answering
+            data += chunk
+    return data
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"12, 12"])
+def test_bad_content_length_is_400(server, length):
+    reply = raw_request(server.port, b"POST /api/get_patient HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}")
+    assert reply.startswith(b"HTTP/1.1 400 ")
+    assert reply.endswith(b'{"error": "bad Content-Length"}')
+
+
+def test_unexpected_error_is_500(server, monkeypatch):
+    def broken(barcode_data):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(lis_server.READS, "get_patient", broken)
+    client = lis6.RemoteLIS(f"127.0.0.1:{server.port}")
+    with pytest.raises(lis6.RemoteError, match="RuntimeError: boom"):
+        client.get_patient("B1")
+    # the connection and the server carry on
+    client.upsert_patient("B1", "W1", "AHMAD", "")
+    assert client.search_patients("ahmad") == [("B1", "W1", "AHMAD", "")]
+    client.close()
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers {"result": n} for the n-th request, or drops the connection
+    without a reply while server.drops is above zero."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(self.path)
+        if self.server.drops:
+            self.server.drops -= 1
+            self.close_connection = True
+            return
+        data = json.dumps({"result": len(self.server.received)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    srv.received = []
+    srv.drops = 0
+    thread = threading.Thread(target=srv.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    client = lis6.RemoteLIS(f"127.0.0.1:{srv.server_address[1]}")
+    yield srv, client
+    client.close()
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_read_is_retried_on_a_reused_connection(flaky):
+    srv, client = flaky
+    client.call("get_patient", barcode_data="B1")
+    srv.drops = 1
+    assert client.call("list_tests", barcode_data="B1") == 3
+    assert srv.received == ["/api/get_patient", "/api/list_tests", "/api/list_tests"]
+
+
+def test_sent_write_is_not_retried(flaky):
+    srv, client = flaky
+    client.call("get_patient", barcode_data="B1")
+    srv.drops = 1
+    with pytest.raises((ConnectionError, http.client.HTTPException)):
+        client.call("add_test", barcode_data="B1", test_name="FBC", test_date="2025-01-01",
+                    result="", price_snapshot=5.0)
+    assert srv.received == ["/api/get_patient", "/api/add_test"]
+    # the next call opens a fresh connection
+    assert client.call("get_patient", barcode_data="B1") == 3
+
+
+def test_write_that_failed_to_send_is_retried(flaky):
+    srv, client = flaky
+    client.call("get_patient", barcode_data="B1")
+
+    def dead_socket(*args, **kwargs):
+        raise BrokenPipeError
+
+    client._conn().request = dead_socket  # only this connection; the retry opens a new one
+    assert client.call("add_test", barcode_data="B1", test_name="FBC", test_date="2025-01-01",
+                       result="", price_snapshot=5.0) == 2
+    assert srv.received == ["/api/get_patient", "/api/add_test"]
+
+
+def test_fresh_connection_is_not_retried(flaky):
+    srv, client = flaky
+    srv.drops = 1
+    with pytest.raises((ConnectionError, http.client.HTTPException)):
+        client.call("get_patient", barcode_data="B1")
+    assert srv.received == ["/api/get_patient"]
@@ -0,0 +1,96 @@
+# Tests for revenue_report() and the test_rollup table behind it.
+# Run with: python -m pytest -q
+
+import itertools
+import random
+
+import pytest
+
+import lis6
+
+NAIVE_KEYS = {
+    "test": "t.test_name",
+    "day": "t.test_date",
+    "month": "substr(t.test_date, 1, 7)",
+    "ward": "COALESCE(p.ward, '')",
+}
+GROUPINGS = [list(g) for n in range(4) for g in itertools.permutations(["month", "ward", "test"], n)]
+GROUPINGS += [["day"], ["day", "ward"]]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+def naive_report(conn, date_from, date_to, group_by):
+    """The report from a plain per-test join, orphans under ward ''."""
+    keys = [NAIVE_KEYS[g] for g in group_by]
+    group = f"GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ""
+    return conn.execute(f"""
+        SELECT {''.join(k + ', ' for k in keys)}COUNT(*), ROUND(COALESCE(SUM(t.price), 0), 2)
+        FROM tests t LEFT JOIN patients p ON p.barcode_data = t.barcode_data
+        WHERE t.test_date BETWEEN ? AND ?
+        {group}
+    """, (date_from, date_to)).fetchall()
+
+
+def assert_reports_match(conn):
+    for date_from, date_to in (("2025-01-01", "2025-12-31"), ("2025-03-10", "2025-04-20")):
+        for group_by in GROUPINGS:
+            _, rows = lis6.revenue_report(date_from, date_to, group_by)
+            assert rows == naive_report(conn, date_from, date_to, group_by), group_by
+
+
+def fill(conn, n_patients=40, n_tests=2000, seed=3):
+    rnd = random.Random(seed)
+    for i in range(n_patients):
+        lis6.upsert_patient(f"B{i:03d}", f"Ward {i % 5}", f"PATIENT {i}", "")
+    rows = [(rnd.choice([f"B{rnd.randrange(n_patients + 10):03d}", None]),  # some orphans
+             rnd.choice(lis6.TEST_CHOICES), f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+             "", rnd.choice([5.0, 12.5, None]))
+            for _ in range(n_tests)]
+    with conn:
+        conn.executemany("INSERT INTO tests (barcode_data, test_name, test_date, result, price) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def test_report_matches_per_test_join_including_orphans(db):
+    fill(db)
+    assert db.execute("SELECT COUNT(*) FROM tests WHERE barcode_data IS NULL "
+                      "OR barcode_data NOT IN (SELECT barcode_data FROM patients)").fetchone()[0] > 0
+    assert_reports_match(db)
+
+
+def test_rollup_follows_test_and_patient_edits(db, tmp_path):
+    fill(db)
+    with db:
+        db.execute("UPDATE tests SET price = price + 1 WHERE id % 7 = 0")
+        db.execute("UPDATE tests SET barcode_data = 'B001' WHERE id % 11 = 0")  # moved to another patient
+        db.execute("UPDATE tests SET test_date = '2025-04-01', test_name = 'GXM' WHERE id % 13 = 0")
+        db.execute("DELETE FROM tests WHERE id % 17 = 0")
+    lis6.upsert_patient("B002", "Ward 9", "PATIENT 2", "")        # ward change
+    lis6.upsert_patient("B045", "Ward 7", "NEW PATIENT", "")      # orphan tests get a ward
+    with db:
+        db.execute("DELETE FROM patients WHERE barcode_data = 'B003'")  # tests become orphans
+        db.execute("UPDATE patients SET barcode_data = 'B046' WHERE barcode_data = 'B004'")
+    census = tmp_path / "census.csv"
+    census.write_text("Barcode,Ward,Name\nB005,Ward 8,PATIENT 5\nB047,Ward 6,LATE\nB005,Ward 2,PATIENT 5\n")
+    lis6.import_patients(str(census))
+
+    assert_reports_match(db)
+    stored = db.execute("SELECT test_date, test_name, ward, test_count, ROUND(revenue, 2) "
+                        "FROM test_rollup WHERE test_count != 0 ORDER BY 1, 2, 3").fetchall()
+    expected = db.execute(f"SELECT * FROM ({lis6._ROLLUP_FROM_TESTS}) ORDER BY 1, 2, 3").fetchall()
+    assert stored == [r[:4] + (round(r[4], 2),) for r in expected]
+
+
+def test_bad_dates_and_groupings_rejected(db):
+    with pytest.raises(ValueError):
+        lis6.revenue_report("2025-13-01", "2025-12-31")
+    with pytest.raises(ValueError):
+        lis6.revenue_report("2025-01-01", "2025-12-31", ["ward", "colour"])
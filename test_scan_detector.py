@@ -0,0 +1,110 @@
+# Tests for ScanDetector: keyboard-wedge scanner bursts versus typing.
+# Run with: python -m pytest -q
+
+import random
+
+import pytest
+
+import lis6
+
+
+def key_stream(text, gap_ms, rnd, t0, jitter_ms=0.0, terminator="Return"):
+    """(keysym, char, time_ms) events for typing text, Shift before capitals."""
+    events, t = [], t0
+    for ch in text:
+        if ch.isupper():
+            events.append(("Shift_L", "", int(t)))
+        events.append((ch, ch, int(t)))
+        t += gap_ms + rnd.uniform(-jitter_ms, jitter_ms)
+    events.append((terminator, "\r" if terminator == "Return" else "\t", int(t)))
+    return events, t
+
+
+def feed(detector, events):
+    return [r for r in (detector.key(*e) for e in events) if r]
+
+
+def scanned(detector, events):
+    return [barcode for barcode, started in feed(detector, events)]
+
+
+@pytest.mark.parametrize("terminator", lis6.SCAN_TERMINATORS)
+def test_scanner_burst_is_a_scan(terminator):
+    events, _ = key_stream("LAB12345X", 5, random.Random(1), 1000, 2, terminator)
+    assert scanned(lis6.ScanDetector(), events) == ["LAB12345X"]
+
+
+def test_typing_is_not_a_scan():
+    rnd = random.Random(2)
+    detector = lis6.ScanDetector()
+    t = 0.0
+    for _ in range(200):
+        events, t = key_stream("5080123456", rnd.uniform(60, 150), rnd, t, 40)
+        assert feed(detector, events) == []
+        t += rnd.uniform(300, 3000)
+
+
+def test_gap_threshold_is_inclusive():
+    gap = lis6.SCAN_MAX_GAP_MS
+    assert scanned(lis6.ScanDetector(), key_stream("50801234", gap, random.Random(), 0)[0]) == ["50801234"]
+    assert scanned(lis6.ScanDetector(), key_stream("50801234", gap + 1, random.Random(), 0)[0]) == []
+
+
+def test_slow_terminator_is_not_a_scan():
+    events, t = key_stream("50801234", 5, random.Random(), 0)
+    events[-1] = ("Return", "\r", events[-2][2] + lis6.SCAN_MAX_GAP_MS + 1)
+    assert scanned(lis6.ScanDetector(), events) == []
+
+
+def test_minimum_length():
+    n = lis6.SCAN_MIN_LENGTH
+    assert scanned(lis6.ScanDetector(), key_stream("7" * n, 5, random.Random(), 0)[0]) == ["7" * n]
+    assert scanned(lis6.ScanDetector(), key_stream("7" * (n - 1), 5, random.Random(), 0)[0]) == []
+
+
+def test_slow_keys_before_a_burst_are_dropped():
+    # a person types "AB", pauses, then scans: only the burst is the barcode
+    slow, t = key_stream("AB", 200, random.Random(), 0)
+    burst, _ = key_stream("50801234", 5, random.Random(), t + 500)
+    assert scanned(lis6.ScanDetector(), slow[:-1] + burst) == ["50801234"]
+
+
+def test_editing_key_ends_the_burst():
+    events, _ = key_stream("50801234", 5, random.Random(), 0)
+    events.insert(6, ("BackSpace", "\b", events[5][2] + 1))
+    assert scanned(lis6.ScanDetector(), events) == []  # "34" is too short to be a scan
+
+
+def test_shift_does_not_break_a_burst():
+    # Shift is pressed in the same millisecond as the capital it precedes
+    events, _ = key_stream("ABCDEFGH", 5, random.Random(), 0)
+    assert sum(keysym == "Shift_L" for keysym, _, _ in events) == 8
+    assert scanned(lis6.ScanDetector(), events) == ["ABCDEFGH"]
+
+
+def test_clock_wraparound_restarts_the_burst():
+    # event times wrap after 2**32 ms: the negative gap counts as slow
+    events, _ = key_stream("50801234", 5, random.Random(), 2**32 - 20)
+    events = [(k, c, t % 2**32) for k, c, t in events]
+    assert scanned(lis6.ScanDetector(), events) == ["1234"]
+
+
+def test_started_is_the_first_character():
+    detector = lis6.ScanDetector()
+    events, _ = key_stream("50801234", 5, random.Random(), 0)
+    before = lis6.time.perf_counter()
+    detector.key(*events[0])
+    after = lis6.time.perf_counter()
+    [(barcode, started)] = feed(detector, events[1:])
+    assert before <= started <= after
+
+
+def test_back_to_back_scans():
+    rnd = random.Random(3)
+    detector = lis6.ScanDetector()
+    t, got = 0.0, []
+    for i in range(100):
+        events, t = key_stream(f"5080{i:06d}", rnd.uniform(2, 15), rnd, t, 1.5)
+        got += scanned(detector, events)
+        t += rnd.uniform(300, 3000)
+    assert got == [f"5080{i:06d}" for i in range(100)]
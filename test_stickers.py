@@ -0,0 +1,30 @@
+# Concurrency tests for in-memory DOCX sticker rendering.
+# Run with: python -m pytest -q
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import lis6
+
+
+def build(rec):
+    doc = lis6.build_sticker_doc([rec])
+    images = [p.blob for p in doc.part.related_parts.values() if p.content_type == "image/png"]
+    return rec[0], doc.paragraphs[0].text, images
+
+
+def test_parallel_stickers_keep_their_own_barcode(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # anything still written to the cwd would show up here
+    lis6.clear_sticker_cache()
+    records = [(f"{500000000 + i}", "Ward 8", f"PATIENT {i}", f"IC{i}") for i in range(50)]
+    expected = {rec[0]: lis6.barcode_png(rec[0]).getvalue() for rec in records}
+    lis6.clear_sticker_cache()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(build, records))
+
+    assert len(results) == len(records)
+    for barcode, text, images in results:
+        assert text.lstrip().startswith(barcode)
+        assert images == [expected[barcode]]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,71 @@
+# Tests for the trigger-maintained test_summary table.
+# Run with: python -m pytest -q
+
+import random
+
+import pytest
+
+import lis6
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+def assert_summary_matches(conn):
+    expected = {b: (n, round(t, 2), d) for b, n, t, d in conn.execute(lis6._SUMMARY_FROM_TESTS)}
+    stored = {b: (n, round(t, 2), d) for b, n, t, d in conn.execute(
+        "SELECT barcode_data, test_count, total_price, last_test_date FROM test_summary WHERE test_count != 0")}
+    assert stored == expected
+    assert lis6.check_test_summary() == {}
+
+
+def test_summary_follows_edits(db):
+    rnd = random.Random(5)
+    barcodes = [f"B{i}" for i in range(8)]
+    ids = []
+
+    def date():
+        return rnd.choice([f"2025-0{rnd.randint(1, 9)}-{rnd.randint(10, 28)}", None])
+
+    def price():
+        return rnd.choice([5.0, 12.5, 0.1, None])
+
+    for step in range(600):
+        op = rnd.random()
+        if op < 0.45 or not ids:
+            ids.append(lis6.add_test(rnd.choice(barcodes), "FBC", date(), "", price()))
+        elif op < 0.65:
+            lis6.update_test(rnd.choice(ids), "GSH", date(), "done", rnd.choice([None, price()]))
+        elif op < 0.8:  # move a test to another patient
+            with db:
+                db.execute("UPDATE tests SET barcode_data=? WHERE id=?", (rnd.choice(barcodes), rnd.choice(ids)))
+        else:
+            lis6.delete_test(ids.pop(rnd.randrange(len(ids))))
+        if step % 50 == 0:
+            assert_summary_matches(db)
+    assert_summary_matches(db)
+
+
+def test_moving_the_only_test(db):
+    test_id = lis6.add_test("B1", "FBC", "2025-03-01", "", 12.5)
+    with db:
+        db.execute("UPDATE tests SET barcode_data='B2' WHERE id=?", (test_id,))
+    assert lis6.get_test_summary("B1") == (0, 0.0, None)
+    assert lis6.get_test_summary("B2") == (1, 12.5, "2025-03-01")
+    assert_summary_matches(db)
+
+
+def test_deleting_the_latest_test(db):
+    lis6.add_test("B1", "FBC", "2025-03-01", "", 5.0)
+    latest = lis6.add_test("B1", "FBC", "2025-04-01", "", 7.5)
+    lis6.delete_test(latest)
+    assert lis6.get_test_summary("B1") == (1, 5.0, "2025-03-01")
+    lis6.update_test(latest - 1, "FBC", "2025-02-01", "", 6.0)
+    assert lis6.get_test_summary("B1") == (1, 6.0, "2025-02-01")
+    assert_summary_matches(db)
@@ -0,0 +1,79 @@
+# Tests for list_tests_page(): keyset paging forward and back over a patient's tests.
+# Run with: python -m pytest -q
+
+import random
+
+import pytest
+
+import lis6
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    lis6.close_conn()
+    monkeypatch.setattr(lis6, "DB_PATH", str(tmp_path / "lis.db"))
+    lis6.init_db()
+    yield lis6.get_conn()
+    lis6.close_conn()
+
+
+def fill(conn, barcode, n, rnd):
+    # repeated dates, and some legacy rows without a date at all
+    dates = [f"2024-01-{d:02d}" for d in range(1, 8)] + [None, None]
+    with conn:
+        conn.executemany("INSERT INTO tests (barcode_data, test_name, test_date, result, price) "
+                         "VALUES (?, 'FBC', ?, '', 10)",
+                         [(barcode, rnd.choice(dates)) for _ in range(n)])
+
+
+def walk_forward(barcode, limit):
+    rows = lis6.list_tests_page(barcode, limit=limit)
+    pages = [rows]
+    while rows:
+        last = rows[-1]
+        rows = lis6.list_tests_page(barcode, after=(last[2], last[0]), limit=limit)
+        pages.append(rows)
+    return pages
+
+
+def walk_back(barcode, last_page, limit):
+    pages = [last_page]
+    rows = last_page
+    while rows:
+        top = rows[0]
+        rows = lis6.list_tests_page(barcode, before=(top[2], top[0]), limit=limit)
+        pages.insert(0, rows)
+    return pages
+
+
+@pytest.mark.parametrize("limit", [1, 7, 25, 1000])
+def test_pages_cover_list_tests(db, limit):
+    fill(db, "B1", 120, random.Random(limit))
+    fill(db, "B2", 30, random.Random(1))  # another patient's rows never leak in
+    expected = lis6.list_tests("B1")
+    assert any(row[2] is None for row in expected)
+
+    pages = walk_forward("B1", limit)
+    assert [row for page in pages for row in page] == expected
+    assert all(len(page) == limit for page in pages[:-2])
+
+    back = walk_back("B1", pages[-2], limit)
+    assert [row for page in back for row in page] == expected
+
+
+def test_undated_tests_list_last(db):
+    fill(db, "B1", 50, random.Random(2))
+    rows = [row for page in walk_forward("B1", 10) for row in page]
+    dated = [row for row in rows if row[2] is not None]
+    undated = [row for row in rows if row[2] is None]
+    assert rows == dated + undated
+    assert [row[0] for row in undated] == sorted((row[0] for row in undated), reverse=True)
+
+
+def test_only_undated_tests(db):
+    with db:
+        db.executemany("INSERT INTO tests (barcode_data, test_name, test_date) VALUES ('B1', 'FBC', NULL)",
+                       [()] * 12)
+    pages = walk_forward("B1", 5)
+    assert [len(page) for page in pages] == [5, 5, 2, 0]
+    assert [row for page in walk_back("B1", pages[-2], 5) for row in page] == lis6.list_tests("B1")